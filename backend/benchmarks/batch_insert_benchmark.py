@@ -0,0 +1,50 @@
+"""
+Batch insert benchmark: N sequential ``POST /notes`` vs one ``POST /notes/batch``.
+
+Runs against a live API (BENCH_API_URL, default http://localhost:8080), so
+every note it creates stays in that API's database.
+
+    cd backend
+    BENCH_API_URL=http://localhost:8080 python -m benchmarks.batch_insert_benchmark
+"""
+
+import asyncio
+import os
+import time
+
+import httpx
+
+SIZES = (10, 100, 1000)
+
+
+def payload(i: int) -> dict:
+    return {"title": f"bench {i}", "content": "batch benchmark", "tags": ["bench"]}
+
+
+async def sequential(client: httpx.AsyncClient, n: int) -> float:
+    start = time.perf_counter()
+    for i in range(n):
+        response = await client.post("/notes", json=payload(i))
+        response.raise_for_status()
+    return time.perf_counter() - start
+
+
+async def batched(client: httpx.AsyncClient, n: int) -> float:
+    start = time.perf_counter()
+    response = await client.post("/notes/batch", json=[payload(i) for i in range(n)])
+    response.raise_for_status()
+    return time.perf_counter() - start
+
+
+async def main() -> None:
+    base_url = os.getenv("BENCH_API_URL", "http://localhost:8080")
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        print(f"{'notes':>6} {'sequential s':>13} {'batch s':>9} {'speedup':>8}")
+        for n in SIZES:
+            seq = await sequential(client, n)
+            batch = await batched(client, n)
+            print(f"{n:>6} {seq:>13.3f} {batch:>9.3f} {seq / batch:>7.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,53 @@
+"""
+Webhook journal append benchmark: fsynced appends per second by number of
+concurrent writers.
+
+Every append waits for its fsync; concurrent appends share one (group
+commit), so throughput grows with concurrency. Writes to a temporary
+directory, or to BENCH_JOURNAL_DIR to measure a specific disk.
+
+    cd backend
+    python -m benchmarks.journal_benchmark
+"""
+
+import asyncio
+import os
+import tempfile
+import time
+
+from models.notes import CreateNote
+from repositories.webhook_journal import WebhookJournal
+
+APPENDS = 2000
+CONCURRENCY = (1, 16, 256)
+
+
+async def run(directory: str, concurrency: int) -> tuple[float, int]:
+    journal = WebhookJournal(directory)
+    await journal.open()
+    note = CreateNote(title="bench", content="journal benchmark", tags=["bench"])
+    per_writer = APPENDS // concurrency
+
+    async def writer(w: int) -> None:
+        for i in range(per_writer):
+            await journal.append(f"{w}-{i}", note)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(writer(w) for w in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    commits = journal.commits
+    await journal.close()
+    return per_writer * concurrency / elapsed, commits
+
+
+async def main() -> None:
+    print(f"{'writers':>8} {'appends/s':>10} {'appends/fsync':>14}")
+    for concurrency in CONCURRENCY:
+        with tempfile.TemporaryDirectory(dir=os.getenv("BENCH_JOURNAL_DIR")) as d:
+            rate, commits = await run(d, concurrency)
+        appends = APPENDS // concurrency * concurrency
+        print(f"{concurrency:>8} {rate:>10.0f} {appends / commits:>14.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
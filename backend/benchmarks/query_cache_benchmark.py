@@ -0,0 +1,72 @@
+"""
+Listing cache benchmark: repeated ``NoteRepository.get_all`` with and without
+the query cache.
+
+Runs in-process against a stand-in session that sleeps LATENCY_MS per
+statement, so it needs no database and measures only what the cache saves.
+
+    cd backend
+    python -m benchmarks.query_cache_benchmark
+"""
+
+import asyncio
+import random
+import time
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock
+
+from models.notes import Note
+from repositories.note_cache import NoteCache
+from repositories.note_repository import NoteRepository
+
+LATENCY_MS = 2
+REQUESTS = 2000
+# a small set of popular listings, as a dashboard or tag page would request
+QUERIES = [
+    {"q": None, "tags": None, "limit": 20},
+    {"q": "milk", "tags": None, "limit": 20},
+    {"q": None, "tags": ["work"], "limit": 20},
+    {"q": None, "tags": ["home", "work"], "limit": 20},
+    {"q": "report", "tags": ["work"], "limit": 20, "search": "fulltext"},
+]
+
+
+def fake_session() -> AsyncMock:
+    notes = [
+        Note(id=i, title=f"Note {i}", created_at=datetime(2026, 1, 1))
+        for i in range(20)
+    ]
+    result = MagicMock()
+    result.all.return_value = notes
+
+    async def exec(statement):
+        await asyncio.sleep(LATENCY_MS / 1000)
+        return result
+
+    session = AsyncMock()
+    session.exec.side_effect = exec
+    return session
+
+
+async def run(cache: NoteCache | None) -> tuple[float, int]:
+    session = fake_session()
+    repo = NoteRepository(session, cache)
+    rng = random.Random(0)
+    start = time.perf_counter()
+    for _ in range(REQUESTS):
+        await repo.get_all(**rng.choice(QUERIES))
+    return time.perf_counter() - start, session.exec.await_count
+
+
+async def main() -> None:
+    print(f"{'cache':>6} {'requests/s':>11} {'queries':>8}")
+    for label, cache in (
+        ("off", None),
+        ("on", NoteCache(maxsize=1000, ttl=60, query_maxsize=1000, query_ttl=10)),
+    ):
+        elapsed, queries = await run(cache)
+        print(f"{label:>6} {REQUESTS / elapsed:>11.0f} {queries:>8}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,82 @@
+"""
+Serialization benchmark for ``GET /notes`` bodies: FastAPI's default
+response pipeline vs the ``NOTES_FAST_JSON`` path.
+
+The default path validates the returned notes against the endpoint's
+response model, converts them to JSON-compatible Python and renders them
+with JSONResponse; the fast path dumps them to bytes with pydantic-core.
+Runs in-process and needs neither a database nor a running API.
+
+    cd backend
+    python -m benchmarks.serialization_benchmark
+"""
+
+import asyncio
+import time
+from datetime import datetime
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute, serialize_response
+
+from controllers.note_controller import _note_list, get_notes
+from main import app
+from models.notes import Note
+
+SIZES = (1, 100, 10_000)
+
+
+def notes(n: int) -> list[Note]:
+    timestamp = datetime(2026, 1, 1, 12, 0, 0)
+    return [
+        Note(
+            id=i,
+            title=f"Note {i}",
+            content="Some content for the serialization benchmark",
+            tags=["bench", "json"],
+            created_at=timestamp,
+            updated_at=timestamp,
+        )
+        for i in range(n)
+    ]
+
+
+def response_field():
+    for route in app.routes:
+        if isinstance(route, APIRoute) and route.endpoint is get_notes:
+            return route.response_field
+    raise LookupError("GET /notes route not found")
+
+
+async def default_path(field, page: list[Note]) -> bytes:
+    content = await serialize_response(field=field, response_content=page)
+    return JSONResponse(content).body
+
+
+async def timed(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        await fn()
+    return (time.perf_counter() - start) / repeat
+
+
+async def main() -> None:
+    field = response_field()
+    print(f"{'notes':>6} {'default ms':>11} {'fast ms':>8} {'speedup':>8}")
+    for n in SIZES:
+        page = notes(n)
+        assert await default_path(field, page) == _note_list.dump_json(page)
+        repeat = max(5, 20_000 // n)
+
+        async def fast() -> bytes:
+            return _note_list.dump_json(page)
+
+        default = await timed(lambda: default_path(field, page), repeat)
+        fast_time = await timed(fast, repeat)
+        print(
+            f"{n:>6} {default * 1000:>11.3f} {fast_time * 1000:>8.3f}"
+            f" {default / fast_time:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,115 @@
+"""
+Rejection throughput for unauthenticated ``POST /webhooks/note`` floods:
+the token check in the endpoint (as before ``WebhookGatekeeper``) vs the
+gatekeeper middleware in front of the application.
+
+The endpoint check only ran after FastAPI had routed the request, decoded
+and validated the JSON body and opened a database session; the gatekeeper
+answers ``401`` from the headers alone. Requests are driven straight
+through the ASGI interface, so the numbers exclude HTTP parsing. Runs
+in-process and needs neither a database nor a running API.
+
+    cd backend
+    python -m benchmarks.webhook_gatekeeper_benchmark
+"""
+
+import asyncio
+import json
+import os
+import time
+from typing import Annotated
+
+from fastapi import Depends, FastAPI, Header, HTTPException
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from controllers.webhook_gatekeeper import WebhookGatekeeper
+from models.webhooks import WebhookNote
+
+REQUESTS = 20_000
+BODY = json.dumps(
+    {"source": "flood", "message": "x" * 200, "tags": ["a", "b", "c"]}
+).encode()
+
+os.environ["WEBHOOK_TOKEN"] = "bench-token"
+# never connects: sessions, like the API's, only check out on first query
+engine = create_async_engine("postgresql+asyncpg://bench@127.0.0.1:1/bench")
+
+
+async def get_session():
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        yield session
+
+
+def endpoint_check_app() -> FastAPI:
+    """The webhook endpoint with its former in-handler token check."""
+    app = FastAPI()
+
+    @app.post("/webhooks/note")
+    async def create_note(
+        note: WebhookNote,
+        x_webhook_token: Annotated[str | None, Header()] = None,
+        session: AsyncSession = Depends(get_session),
+    ):
+        if x_webhook_token != os.getenv("WEBHOOK_TOKEN"):
+            raise HTTPException(status_code=401)
+
+    return app
+
+
+def gatekeeper_app() -> WebhookGatekeeper:
+    async def unreachable(scope, receive, send):
+        raise AssertionError("rejected requests must not reach the app")
+
+    return WebhookGatekeeper(unreachable)
+
+
+async def reject_all(app, n: int) -> float:
+    """Requests per second, asserting every one is answered with 401."""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": "/webhooks/note",
+        "raw_path": b"/webhooks/note",
+        "query_string": b"",
+        "root_path": "",
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(BODY)).encode()),
+            (b"x-webhook-token", b"wrong"),
+        ],
+        "client": ("127.0.0.1", 50000),
+        "server": ("127.0.0.1", 8080),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": BODY, "more_body": False}
+
+    statuses = []
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            statuses.append(message["status"])
+
+    start = time.perf_counter()
+    for _ in range(n):
+        await app(dict(scope), receive, send)
+    elapsed = time.perf_counter() - start
+    assert statuses == [401] * n
+    return n / elapsed
+
+
+async def main() -> None:
+    endpoint = await reject_all(endpoint_check_app(), REQUESTS)
+    gatekeeper = await reject_all(gatekeeper_app(), REQUESTS)
+    print(f"{'path':<16} {'rejections/s':>13}")
+    print(f"{'endpoint check':<16} {endpoint:>13,.0f}")
+    print(f"{'gatekeeper':<16} {gatekeeper:>13,.0f}")
+    print(f"speedup {gatekeeper / endpoint:.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
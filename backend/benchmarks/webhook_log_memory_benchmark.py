@@ -0,0 +1,87 @@
+"""
+Webhook log memory benchmark: 100k entries as dicts in a deque (the
+previous in-memory log) vs records in WebhookLogBuffer, plus the cost of
+serving the newest page from each.
+
+Runs in-process and needs neither a database nor a running API.
+
+    cd backend
+    python -m benchmarks.webhook_log_memory_benchmark
+"""
+
+import time
+import tracemalloc
+from collections import deque
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from config.now import now
+from models.webhooks import WebhookNote
+from repositories.webhook_log_buffer import WebhookLogBuffer, WebhookLogRecord
+
+ENTRIES = 100_000
+PAGE = 100
+SOURCES = ("n8n", "monitoring", "ci", "github", "stripe")
+
+
+def notes() -> list[WebhookNote]:
+    return [
+        WebhookNote(
+            # built per entry, as request parsing would
+            source="".join(SOURCES[i % len(SOURCES)]),
+            message=f"Event {i}: something happened",
+            tags=["alert", f"source:{SOURCES[i % len(SOURCES)]}"],
+        )
+        for i in range(ENTRIES)
+    ]
+
+
+def measure(build) -> tuple[object, float]:
+    tracemalloc.start()
+    log = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return log, size / 1024 / 1024
+
+
+def main() -> None:
+    payloads = notes()
+
+    def dicts():
+        log = deque(maxlen=ENTRIES)
+        for note in payloads:
+            log.append({**note.model_dump(), "datetime": now()})
+        return log
+
+    def records():
+        log = WebhookLogBuffer(ENTRIES)
+        for i, note in enumerate(payloads):
+            log.append(
+                WebhookLogRecord(i, note.source, note.message, note.tags, now())
+            )
+        return log
+
+    dict_log, dict_mb = measure(dicts)
+    record_log, record_mb = measure(records)
+
+    start = time.perf_counter()
+    for _ in range(100):
+        JSONResponse(jsonable_encoder(list(dict_log)[-PAGE:][::-1])).body
+    dict_ms = (time.perf_counter() - start) * 10
+
+    start = time.perf_counter()
+    record_log.page(PAGE)
+    first_ms = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    for _ in range(100):
+        record_log.page(PAGE).body
+    cached_ms = (time.perf_counter() - start) * 10
+
+    print(f"{'log':>8} {'MiB':>7} {'page ms':>8} {'cached page ms':>15}")
+    print(f"{'dicts':>8} {dict_mb:>7.1f} {dict_ms:>8.3f} {'-':>15}")
+    print(f"{'records':>8} {record_mb:>7.1f} {first_ms:>8.3f} {cached_ms:>15.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,54 @@
+import logging
 import os
 
+from sqlalchemy import Connection, text
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
 from sqlmodel import SQLModel
 
+from config.db_pool import InstrumentedAsyncPool
+from config.env import env_bool, env_float, env_int
+from config.query_log import QueryLog
+from models.notes import SEARCH_VECTOR_EXPRESSION
+
+logger = logging.getLogger(__name__)
+
 _engine: AsyncEngine | None = None
 
+# create_all only creates missing tables, so columns added to existing
+# tables are applied here.
+_SCHEMA_UPGRADES = (
+    "ALTER TABLE note ADD COLUMN IF NOT EXISTS search_vector tsvector "
+    f"GENERATED ALWAYS AS ({SEARCH_VECTOR_EXPRESSION}) STORED",
+    # rows that predate the column count as updated when it was added
+    "ALTER TABLE note ADD COLUMN IF NOT EXISTS updated_at timestamp "
+    "NOT NULL DEFAULT LOCALTIMESTAMP",
+)
+
+# Trigram indexes make the ILIKE '%q%' substring search index-assisted. They
+# depend on the pg_trgm extension, so they are not declared on the model.
+_TRIGRAM_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS ix_note_title_trgm "
+    "ON note USING gin (title gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_note_content_trgm "
+    "ON note USING gin (content gin_trgm_ops)",
+)
+
+# Publishes the id of every changed note for other workers' read caches.
+_NOTE_CHANGED_TRIGGER = (
+    """
+    CREATE OR REPLACE FUNCTION note_changed_notify() RETURNS trigger AS $$
+    BEGIN
+        PERFORM pg_notify('note_changed', COALESCE(NEW.id, OLD.id)::text);
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS note_changed ON note",
+    "CREATE TRIGGER note_changed AFTER INSERT OR UPDATE OR DELETE ON note "
+    "FOR EACH ROW EXECUTE FUNCTION note_changed_notify()",
+)
+
 
 def get_engine() -> AsyncEngine:
     global _engine
@@ -12,12 +56,66 @@ def get_engine() -> AsyncEngine:
         db_url = os.getenv("DB_URL")
         if not db_url:
             raise RuntimeError("DB_URL environment variable is not set")
-        _engine = create_async_engine(db_url, echo=True)
+        # DB_LOG_MODE: off (default), echo (every statement and its
+        # parameters) or structured (sampled QueryLog records)
+        log_mode = os.getenv("DB_LOG_MODE", "off")
+        # size against the worker count: every uvicorn worker gets its own
+        # pool of up to pool_size + max_overflow connections
+        _engine = create_async_engine(
+            db_url,
+            echo=log_mode == "echo",
+            poolclass=InstrumentedAsyncPool,
+            pool_size=env_int("DB_POOL_SIZE", 5),
+            max_overflow=env_int("DB_MAX_OVERFLOW", 10),
+            pool_timeout=env_float("DB_POOL_TIMEOUT", 30.0),
+            pool_recycle=env_int("DB_POOL_RECYCLE", -1),
+            pool_pre_ping=env_bool("DB_POOL_PRE_PING", False),
+        )
+        if log_mode == "structured":
+            QueryLog(
+                sample_rate=env_float("DB_LOG_SAMPLE_RATE", 0.01),
+                slow_ms=env_float("DB_LOG_SLOW_MS", 200.0),
+            ).install(_engine.sync_engine)
     return _engine
 
 
+def _create_missing_indexes(conn: Connection) -> None:
+    for table in SQLModel.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+
+async def _create_trigram_indexes(engine: AsyncEngine) -> bool:
+    try:
+        async with engine.begin() as conn:
+            await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+            for statement in _TRIGRAM_INDEXES:
+                await conn.execute(text(statement))
+    except DBAPIError as e:
+        logger.warning("pg_trgm is unavailable, skipping trigram indexes: %s", e.orig)
+        return False
+    return True
+
+
 async def create_db():
     engine = get_engine()
     async with engine.connect() as conn:
         await conn.run_sync(SQLModel.metadata.create_all)
+        for statement in _SCHEMA_UPGRADES:
+            await conn.execute(text(statement))
+        await conn.run_sync(_create_missing_indexes)
+        # never dropped here: a worker started without NOTE_CACHE_NOTIFY
+        # must not turn invalidation off for the workers that rely on it
+        if env_bool("NOTE_CACHE_NOTIFY", False):
+            for statement in _NOTE_CHANGED_TRIGGER:
+                await conn.exec_driver_sql(statement)
         await conn.commit()
+
+    if await _create_trigram_indexes(engine):
+        substring_engine = "pg_trgm (GIN trigram indexes)"
+    else:
+        substring_engine = "ILIKE (sequential scan)"
+    logger.info(
+        "Search engines active: substring=%s, fulltext=tsvector (GIN index)",
+        substring_engine,
+    )
@@ -0,0 +1,89 @@
+import time
+from dataclasses import asdict, dataclass
+
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+
+@dataclass
+class PoolMetrics:
+    """Checkout counters shared by every pool the process creates."""
+
+    checkouts: int = 0
+    timeouts: int = 0
+    wait_seconds_total: float = 0.0
+    wait_seconds_max: float = 0.0
+
+    def record(self, waited: float, timed_out: bool) -> None:
+        if timed_out:
+            self.timeouts += 1
+        else:
+            self.checkouts += 1
+        self.wait_seconds_total += waited
+        self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+
+pool_metrics = PoolMetrics()
+
+
+@dataclass
+class SessionMetrics:
+    """Request sessions that needed a pooled connection, and those that did not."""
+
+    sessions_with_checkout: int = 0
+    sessions_without_checkout: int = 0
+
+    def record(self, checked_out: bool) -> None:
+        if checked_out:
+            self.sessions_with_checkout += 1
+        else:
+            self.sessions_without_checkout += 1
+
+
+session_metrics = SessionMetrics()
+
+# set in Session.info once the session has acquired a connection
+CHECKED_OUT = "checked_out"
+
+
+@event.listens_for(Session, "after_begin")
+def _mark_checked_out(session: Session, transaction, connection) -> None:
+    # sessions connect lazily: this fires with their first statement only
+    session.info[CHECKED_OUT] = True
+
+
+class PoolMetricsMixin:
+    """Times every checkout, including waits for a free connection."""
+
+    def connect(self):
+        start = time.perf_counter()
+        timed_out = False
+        try:
+            return super().connect()
+        except PoolTimeoutError:
+            timed_out = True
+            raise
+        finally:
+            pool_metrics.record(time.perf_counter() - start, timed_out)
+
+
+class InstrumentedAsyncPool(PoolMetricsMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def pool_status(pool: QueuePool) -> dict:
+    metrics = {**asdict(pool_metrics), **asdict(session_metrics)}
+    waits = metrics["checkouts"] + metrics["timeouts"]
+    return {
+        "pool_size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        # QueuePool reports overflow as negative until the pool has filled up
+        "overflow": max(pool.overflow(), 0),
+        "max_overflow": pool._max_overflow,
+        "pool_timeout": pool.timeout(),
+        **metrics,
+        "wait_seconds_avg": metrics["wait_seconds_total"] / waits if waits else 0.0,
+    }
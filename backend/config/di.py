@@ -1,24 +1,119 @@
+import os
+
 from fastapi import Depends, FastAPI
 from sqlmodel.ext.asyncio.session import AsyncSession
 from starlette.requests import Request
 
 from config.db_config import get_engine
+from config.db_pool import CHECKED_OUT, session_metrics
+from config.env import env_float, env_int
+from repositories.idempotency_repository import (
+    IdempotencyStore,
+    create_idempotency_store,
+)
+from repositories.note_cache import NoteCache
 from repositories.note_repository import NoteRepository
-from repositories.webhook_repository import WebhookRepository
+from repositories.webhook_deduper import WebhookDeduper
+from repositories.webhook_ingest_queue import WebhookIngestQueue
+from repositories.webhook_journal import WebhookJournal
+from repositories.webhook_rate_limiter import (
+    WebhookRateLimiter,
+    create_webhook_rate_limiter,
+)
+from repositories.webhook_repository import (
+    WebhookRepository,
+    create_webhook_repository,
+)
 
 
 def register_singletons(app: FastAPI):
-    app.state.webhook_repo = WebhookRepository()
+    app.state.webhook_repo = create_webhook_repository()
+    app.state.idempotency_store = create_idempotency_store()
+    app.state.webhook_rate_limiter = create_webhook_rate_limiter()
+    dedupe_window = env_float("WEBHOOK_DEDUPE_SECONDS", 0)
+    app.state.webhook_deduper = (
+        WebhookDeduper(
+            dedupe_window, maxsize=env_int("WEBHOOK_DEDUPE_MAX_ENTRIES", 10_000)
+        )
+        if dedupe_window > 0
+        else None
+    )
+    # off by default: with several workers, entries are only invalidated
+    # across them when NOTE_CACHE_NOTIFY is set as well
+    note_cache_size = env_int("NOTE_CACHE_SIZE", 0)
+    app.state.note_cache = (
+        NoteCache(
+            note_cache_size,
+            env_float("NOTE_CACHE_TTL_SECONDS", 60),
+            query_maxsize=env_int("NOTE_QUERY_CACHE_SIZE", 1000),
+            query_ttl=env_float("NOTE_QUERY_CACHE_TTL_SECONDS", 10),
+        )
+        if note_cache_size
+        else None
+    )
+    ingest_mode = os.getenv("WEBHOOK_INGEST_MODE", "sync")
+    if ingest_mode not in ("sync", "queue"):
+        raise RuntimeError(f"Unknown WEBHOOK_INGEST_MODE: {ingest_mode}")
+    journal_dir = os.getenv("WEBHOOK_JOURNAL_DIR")
+    app.state.webhook_queue = (
+        WebhookIngestQueue(
+            lambda: AsyncSession(get_engine(), expire_on_commit=False),
+            app.state.note_cache,
+            maxsize=env_int("WEBHOOK_QUEUE_SIZE", 10_000),
+            batch_size=env_int("WEBHOOK_BATCH_SIZE", 500),
+            flush_interval=env_float("WEBHOOK_FLUSH_SECONDS", 0.05),
+            max_attempts=env_int("WEBHOOK_FLUSH_ATTEMPTS", 5),
+            retry_backoff=env_float("WEBHOOK_FLUSH_RETRY_SECONDS", 0.5),
+            journal=(
+                WebhookJournal(
+                    journal_dir,
+                    segment_bytes=env_int("WEBHOOK_JOURNAL_SEGMENT_BYTES", 16 << 20),
+                )
+                if journal_dir
+                else None
+            ),
+        )
+        if ingest_mode == "queue"
+        else None
+    )
 
 
 async def get_session():
-    async with AsyncSession(get_engine()) as session:
-        yield session
+    # notes returned from a request stay readable after its commit
+    async with AsyncSession(get_engine(), expire_on_commit=False) as session:
+        try:
+            yield session
+        finally:
+            # requests answered without a query never take a pooled connection
+            session_metrics.record(session.info.get(CHECKED_OUT, False))
+
+
+def get_note_cache(request: Request) -> NoteCache | None:
+    return request.app.state.note_cache
 
 
-def get_note_repo(session: AsyncSession = Depends(get_session)) -> NoteRepository:
-    return NoteRepository(session)
+def get_note_repo(
+    session: AsyncSession = Depends(get_session),
+    note_cache: NoteCache | None = Depends(get_note_cache),
+) -> NoteRepository:
+    return NoteRepository(session, note_cache)
 
 
 def get_webhook_repo(request: Request) -> WebhookRepository:
     return request.app.state.webhook_repo
+
+
+def get_webhook_queue(request: Request) -> WebhookIngestQueue | None:
+    return request.app.state.webhook_queue
+
+
+def get_webhook_rate_limiter(request: Request) -> WebhookRateLimiter | None:
+    return request.app.state.webhook_rate_limiter
+
+
+def get_webhook_deduper(request: Request) -> WebhookDeduper | None:
+    return request.app.state.webhook_deduper
+
+
+def get_idempotency_store(request: Request) -> IdempotencyStore:
+    return request.app.state.idempotency_store
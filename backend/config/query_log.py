@@ -0,0 +1,57 @@
+import hashlib
+import json
+import logging
+import random
+import re
+import time
+
+from sqlalchemy import Engine, event
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+
+
+def fingerprint(statement: str) -> tuple[str, str]:
+    """Normalized statement and a short stable hash identifying its shape."""
+    normalized = _LITERALS.sub("?", _WHITESPACE.sub(" ", statement).strip())
+    return normalized, hashlib.sha1(normalized.encode()).hexdigest()[:12]
+
+
+class QueryLog:
+    """
+    Structured per-statement log wired through engine cursor events.
+
+    Statements slower than `slow_ms` are always logged at WARNING; the rest
+    are logged at INFO for a `sample_rate` fraction of executions. Bound
+    parameters are never logged.
+    """
+
+    def __init__(self, sample_rate: float, slow_ms: float):
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+
+    def install(self, engine: Engine) -> None:
+        event.listen(engine, "before_cursor_execute", self._before)
+        event.listen(engine, "after_cursor_execute", self._after)
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        context._query_log_start = time.perf_counter()
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        duration_ms = (time.perf_counter() - context._query_log_start) * 1000
+        slow = duration_ms >= self.slow_ms
+        if not slow and random.random() >= self.sample_rate:
+            return
+
+        normalized, digest = fingerprint(statement)
+        record = {
+            "event": "sql",
+            "fingerprint": digest,
+            "statement": normalized[:200],
+            "duration_ms": round(duration_ms, 3),
+            "rows": cursor.rowcount,
+            "slow": slow,
+        }
+        logger.log(logging.WARNING if slow else logging.INFO, json.dumps(record))
@@ -0,0 +1,71 @@
+"""ETag and Last-Modified helpers for conditional GET requests."""
+
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+from starlette import status
+from starlette.datastructures import Headers
+from starlette.responses import Response
+
+from models.notes import Note
+
+
+def note_etag(note_id: int, updated_at: datetime) -> str:
+    return f'"{note_id}-{updated_at:%Y%m%d%H%M%S%f}"'
+
+
+def page_etag(notes: list[Note]) -> str:
+    """Changes whenever a note on the page is added, removed or updated."""
+    digest = hashlib.sha1()
+    for note in notes:
+        digest.update(f"{note.id}-{note.updated_at:%Y%m%d%H%M%S%f};".encode())
+    return f'"{digest.hexdigest()[:20]}"'
+
+
+def _as_utc(value: datetime) -> datetime:
+    # timestamps are stored as naive local time (see config.now)
+    return value.astimezone(timezone.utc).replace(microsecond=0)
+
+
+def http_date(value: datetime) -> str:
+    return format_datetime(_as_utc(value), usegmt=True)
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses weak comparison, so a W/ prefix is ignored
+    return any(
+        tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(",")
+    )
+
+
+def is_not_modified(
+    headers: Headers, etag: str, last_modified: datetime | None = None
+) -> bool:
+    """
+    Whether a GET with these request headers may be answered with 304.
+
+    If-None-Match takes precedence; If-Modified-Since is only consulted
+    when it is absent, as RFC 9110 requires.
+    """
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        return _etag_matches(if_none_match, etag)
+
+    if_modified_since = headers.get("if-modified-since")
+    if if_modified_since is None or last_modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    return _as_utc(last_modified) <= since
+
+
+def not_modified(headers: dict[str, str]) -> Response:
+    """An empty 304 carrying the validators the 200 would have had."""
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
@@ -0,0 +1,187 @@
+import codecs
+import json
+from typing import Any
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\r\n"
+# characters that may complete an item, by the item's first character
+_CLOSERS = {"{": "}", "[": "]", '"': '"'}
+_SCALAR_CLOSERS = ",]" + _WHITESPACE
+
+
+class JsonItemParser:
+    """
+    Incremental parser for a body holding a JSON array or NDJSON lines.
+
+    Bytes are fed as they arrive and each complete item is returned as soon
+    as it is parsed, so only the unparsed tail is ever held. Whether the body
+    is an array is decided by its first character. An item that cannot be
+    parsed, or is longer than `max_item_chars`, is returned as a ValueError
+    in its place: an NDJSON stream continues with the next line, while an
+    array cannot be resynchronized and ends there.
+    """
+
+    def __init__(self, max_item_chars: int):
+        self.max_item_chars = max_item_chars
+        self._text = codecs.getincrementaldecoder("utf-8")()
+        self._array: bool | None = None
+        # array: unparsed text since the last parse attempt, which is only
+        # retried once it doubled or a character that may end the item came
+        self._tail: list[str] = []
+        self._tail_chars = 0
+        self._tried_chars = 0
+        self._closers = ""
+        # array: whether the next token is a value (after `[` or `,`)
+        self._expect_value = True
+        self._values = 0
+        # NDJSON: the unfinished line, and whether it is an oversized one
+        # being discarded up to the next newline
+        self._line: list[str] = []
+        self._line_chars = 0
+        self._skipping = False
+        self._done = False
+
+    def feed(self, data: bytes) -> list[Any]:
+        return self._parse(data, final=False)
+
+    def close(self) -> list[Any]:
+        """Parse what is left once the body has ended."""
+        return self._parse(b"", final=True)
+
+    def _parse(self, data: bytes, final: bool) -> list[Any]:
+        if self._done:
+            return []
+        try:
+            text = self._text.decode(data, final)
+        except UnicodeDecodeError as e:
+            self._done = True
+            return [ValueError(f"Body is not valid UTF-8: {e.reason}")]
+        if self._array is None:
+            text = text.lstrip(_WHITESPACE)
+            if not text:
+                return []
+            self._array = text[0] == "["
+            if self._array:
+                text = text[1:]
+        if self._array:
+            return self._parse_array(text, final)
+        return self._parse_lines(text, final)
+
+    def _parse_lines(self, text: str, final: bool) -> list[Any]:
+        # only the new text is searched for newlines; the unfinished line is
+        # kept in parts and joined once it is complete
+        items = []
+        *ends, rest = text.split("\n")
+        if final:
+            ends.append(rest)
+            rest = ""
+        for end in ends:
+            line = "".join(self._line) + end
+            self._line, self._line_chars = [], 0
+            if self._skipping:
+                # the first newline ends the oversized line
+                self._skipping = False
+                continue
+            line = line.strip(_WHITESPACE)
+            if not line:
+                continue
+            if len(line) > self.max_item_chars:
+                items.append(_too_long(self.max_item_chars))
+                continue
+            try:
+                items.append(json.loads(line))
+            except json.JSONDecodeError as e:
+                items.append(_invalid(e))
+        if self._skipping:
+            return items
+        self._line.append(rest)
+        self._line_chars += len(rest)
+        if self._line_chars > self.max_item_chars:
+            items.append(_too_long(self.max_item_chars))
+            self._line, self._line_chars = [], 0
+            self._skipping = True
+        return items
+
+    def _parse_array(self, text: str, final: bool) -> list[Any]:
+        self._tail.append(text)
+        self._tail_chars += len(text)
+        if not final and not self._worth_parsing(text):
+            if self._tail_chars > self.max_item_chars:
+                self._done = True
+                return [_too_long(self.max_item_chars)]
+            return []
+        items = []
+        buffer = "".join(self._tail)
+        pos = 0
+        self._tried_chars, self._closers = 0, ""
+        while not self._done:
+            pos = _skip_whitespace(buffer, pos)
+            if pos == len(buffer):
+                break
+            if self._expect_value and buffer[pos] == "]" and not self._values:
+                # only an empty array may close right after `[`
+                self._done = True
+                break
+            if not self._expect_value:
+                if buffer[pos] == ",":
+                    self._expect_value = True
+                    pos += 1
+                elif buffer[pos] == "]":
+                    self._done = True
+                else:
+                    items.append(ValueError(f"Expected ',' or ']' at {buffer[pos]!r}"))
+                    self._done = True
+                continue
+            try:
+                value, end = _decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError as e:
+                if final or len(buffer) - pos > self.max_item_chars:
+                    error = _invalid(e) if final else _too_long(self.max_item_chars)
+                    items.append(error)
+                    self._done = True
+                self._wait_for_item(buffer, pos)
+                break
+            # a number at the end of the buffer may continue in the next chunk
+            if not final and _skip_whitespace(buffer, end) == len(buffer):
+                self._wait_for_item(buffer, pos)
+                break
+            if end - pos > self.max_item_chars:
+                items.append(_too_long(self.max_item_chars))
+                self._done = True
+                break
+            items.append(value)
+            self._values += 1
+            self._expect_value = False
+            pos = end
+        self._tail = [buffer[pos:]]
+        self._tail_chars = len(buffer) - pos
+        if final and not self._done:
+            items.append(ValueError("Unterminated JSON array"))
+            self._done = True
+        return items
+
+    def _wait_for_item(self, buffer: str, pos: int) -> None:
+        self._tried_chars = len(buffer) - pos
+        self._closers = _CLOSERS.get(buffer[pos], _SCALAR_CLOSERS)
+
+    def _worth_parsing(self, text: str) -> bool:
+        # retrying raw_decode on every chunk of a long item is quadratic;
+        # doubling bounds the retries, and a closer ends the wait early
+        if self._tail_chars >= 2 * self._tried_chars:
+            return True
+        return any(closer in text for closer in self._closers)
+
+
+def _skip_whitespace(text: str, pos: int) -> int:
+    while pos < len(text) and text[pos] in _WHITESPACE:
+        pos += 1
+    return pos
+
+
+def _invalid(error: json.JSONDecodeError) -> ValueError:
+    # positions refer to the parser's buffer, not to the body
+    return ValueError(f"Invalid JSON: {error.msg}")
+
+
+def _too_long(max_item_chars: int) -> ValueError:
+    return ValueError(f"Item longer than {max_item_chars} characters")
@@ -0,0 +1,58 @@
+from fastapi import APIRouter, Depends
+from starlette.status import HTTP_200_OK
+
+from config.db_config import get_engine
+from config.db_pool import pool_status
+from config.di import (
+    get_note_cache,
+    get_webhook_deduper,
+    get_webhook_queue,
+    get_webhook_rate_limiter,
+)
+from repositories.note_cache import NoteCache
+from repositories.webhook_deduper import WebhookDeduper
+from repositories.webhook_ingest_queue import WebhookIngestQueue
+from repositories.webhook_rate_limiter import WebhookRateLimiter
+
+router = APIRouter(prefix="/metrics")
+
+
+@router.get("/db-pool", status_code=HTTP_200_OK)
+async def get_db_pool_metrics() -> dict:
+    return pool_status(get_engine().pool)
+
+
+@router.get("/note-cache", status_code=HTTP_200_OK)
+async def get_note_cache_metrics(
+    note_cache: NoteCache | None = Depends(get_note_cache),
+) -> dict:
+    if note_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **note_cache.stats()}
+
+
+@router.get("/webhook-queue", status_code=HTTP_200_OK)
+async def get_webhook_queue_metrics(
+    webhook_queue: WebhookIngestQueue | None = Depends(get_webhook_queue),
+) -> dict:
+    if webhook_queue is None:
+        return {"enabled": False}
+    return {"enabled": True, **webhook_queue.stats()}
+
+
+@router.get("/webhook-rate-limits", status_code=HTTP_200_OK)
+async def get_webhook_rate_limit_metrics(
+    rate_limiter: WebhookRateLimiter | None = Depends(get_webhook_rate_limiter),
+) -> dict:
+    if rate_limiter is None:
+        return {"enabled": False}
+    return {"enabled": True, **rate_limiter.stats()}
+
+
+@router.get("/webhook-dedupe", status_code=HTTP_200_OK)
+async def get_webhook_dedupe_metrics(
+    deduper: WebhookDeduper | None = Depends(get_webhook_deduper),
+) -> dict:
+    if deduper is None:
+        return {"enabled": False}
+    return {"enabled": True, **deduper.stats()}
@@ -1,53 +1,269 @@
-from typing import Annotated
+import csv
+import io
+import json
+from typing import Annotated, Any, AsyncIterator, Awaitable, Callable, Literal
 
-from cachetools import TTLCache
-from fastapi import APIRouter, Depends, HTTPException, Header
+from fastapi import (
+    APIRouter,
+    Body,
+    Depends,
+    HTTPException,
+    Header,
+    Request,
+    Response,
+)
 from fastapi.params import Query
+from pydantic import TypeAdapter, ValidationError
 from starlette import status
+from starlette.responses import StreamingResponse
 
-from config.di import get_note_repo
-from models.notes import CreateNote, Note, UpdateNote
+from config.di import get_idempotency_store, get_note_repo
+from controllers.conditional import (
+    http_date,
+    is_not_modified,
+    not_modified,
+    note_etag,
+    page_etag,
+)
+from config.env import env_bool, env_int
+from models.notes import (
+    BatchItemResult,
+    CreateNote,
+    Note,
+    NoteSort,
+    SearchMode,
+    TagMatch,
+    UpdateNote,
+)
+from models.pagination import KeysetCursor
+from repositories.idempotency_repository import (
+    IdempotencyKeyInUse,
+    IdempotencyStore,
+)
 from repositories.note_repository import NoteRepository
 
 router = APIRouter(prefix="/notes")
 
-_create_cache: TTLCache = TTLCache(maxsize=1000, ttl=86400)
-_update_cache: TTLCache = TTLCache(maxsize=1000, ttl=86400)
+MAX_PAGE_SIZE = env_int("NOTES_MAX_PAGE_SIZE", 100)
+MAX_BATCH_SIZE = env_int("NOTES_MAX_BATCH_SIZE", 1000)
+# serialize read responses straight to JSON bytes, skipping response validation
+FAST_JSON = env_bool("NOTES_FAST_JSON", False)
+
+_note_list = TypeAdapter(list[Note])
+
+
+def _json(body: bytes, response: Response) -> Response:
+    """Send already-serialized JSON with the headers set on `response`."""
+    return Response(body, media_type="application/json", headers=response.headers)
 
 
 @router.get("")
 async def get_notes(
+    request: Request,
+    response: Response,
     q: str | None = None,
-    tag: str | None = None,
-    limit: Annotated[int, Query(le=5, ge=0)] = 0,
+    tag: Annotated[list[str] | None, Query()] = None,
+    tag_match: TagMatch = "all",
+    limit: Annotated[int, Query(le=MAX_PAGE_SIZE, ge=1)] = MAX_PAGE_SIZE,
     offset: Annotated[int, Query(ge=0)] = 0,
+    search: SearchMode = "substring",
+    sort: NoteSort | None = None,
+    cursor: str | None = None,
     note_repo: NoteRepository = Depends(get_note_repo),
 ) -> list[Note]:
-    return await note_repo.get_all(q, tag, limit, offset)
+    if sort == "relevance" and not (q and search == "fulltext"):
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_CONTENT,
+            detail="sort=relevance requires q with search=fulltext",
+        )
+
+    after = None
+    if cursor is not None:
+        if offset or sort == "relevance":
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_CONTENT,
+                detail="cursor cannot be combined with offset or sort=relevance",
+            )
+        try:
+            after = KeysetCursor.decode(cursor)
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor"
+            )
+
+    notes = await note_repo.get_all(
+        q,
+        tag,
+        limit,
+        offset,
+        search=search,
+        sort=sort,
+        tag_match=tag_match,
+        cursor=after,
+    )
+
+    if len(notes) == limit and sort != "relevance":
+        last = notes[-1]
+        response.headers["X-Next-Cursor"] = KeysetCursor(
+            position=last.created_at, id=last.id
+        ).encode()
+
+    response.headers["ETag"] = page_etag(notes)
+    if is_not_modified(request.headers, response.headers["ETag"]):
+        return not_modified(dict(response.headers))
+    if FAST_JSON:
+        return _json(_note_list.dump_json(notes), response)
+    return notes
+
+
+async def _ndjson_lines(notes: AsyncIterator[Note]) -> AsyncIterator[str]:
+    async for note in notes:
+        yield note.model_dump_json() + "\n"
+
+
+async def _csv_lines(notes: AsyncIterator[Note]) -> AsyncIterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def drain() -> str:
+        line = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return line
+
+    writer.writerow(("id", "title", "content", "tags", "created_at"))
+    yield drain()
+    async for note in notes:
+        writer.writerow(
+            (
+                note.id,
+                note.title,
+                note.content,
+                json.dumps(note.tags),
+                note.created_at.isoformat(),
+            )
+        )
+        yield drain()
+
+
+@router.get("/export")
+async def export_notes(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    q: str | None = None,
+    tag: Annotated[list[str] | None, Query()] = None,
+    tag_match: TagMatch = "all",
+    search: SearchMode = "substring",
+    note_repo: NoteRepository = Depends(get_note_repo),
+) -> StreamingResponse:
+    notes = note_repo.stream_all(q, tag, search=search, tag_match=tag_match)
+    if format == "csv":
+        return StreamingResponse(
+            _csv_lines(notes),
+            media_type="text/csv",
+            headers={"Content-Disposition": 'attachment; filename="notes.csv"'},
+        )
+    return StreamingResponse(_ndjson_lines(notes), media_type="application/x-ndjson")
+
+
+def _validators(note_id: int, updated_at) -> dict[str, str]:
+    return {
+        "ETag": note_etag(note_id, updated_at),
+        "Last-Modified": http_date(updated_at),
+    }
 
 
 @router.get("/{id}")
-async def get_note(id: int, note_repo: NoteRepository = Depends(get_note_repo)) -> Note:
+async def get_note(
+    id: int,
+    request: Request,
+    response: Response,
+    note_repo: NoteRepository = Depends(get_note_repo),
+) -> Note:
+    not_found = HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND, detail="Note not found"
+    )
+
+    # a revalidating poller only needs updated_at to be answered with 304
+    conditional = "if-none-match" in request.headers or (
+        "if-modified-since" in request.headers
+    )
+    if conditional:
+        updated_at = await note_repo.get_version(id)
+        if updated_at is None:
+            raise not_found
+        validators = _validators(id, updated_at)
+        if is_not_modified(request.headers, validators["ETag"], updated_at):
+            return not_modified(validators)
+
     note = await note_repo.get(id)
     if not note:
+        raise not_found
+    response.headers.update(_validators(note.id, note.updated_at))
+    if FAST_JSON:
+        return _json(note.model_dump_json().encode(), response)
+    return note
+
+
+def _replay(response: bytes, status_code: int) -> Response:
+    """Answer with a stored response body, without re-serializing it."""
+    return Response(response, status_code=status_code, media_type="application/json")
+
+
+async def _idempotent(
+    store: IdempotencyStore,
+    scope: str,
+    key: str,
+    produce: Callable[[], Awaitable[bytes]],
+) -> bytes:
+    try:
+        return await store.get_or_create(scope, key, produce)
+    except IdempotencyKeyInUse:
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail="Note not found"
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A request with this Idempotency-Key is still in progress",
         )
-    return note
 
 
 @router.post("", status_code=status.HTTP_201_CREATED)
 async def create_note(
     note: CreateNote,
     note_repo: NoteRepository = Depends(get_note_repo),
+    idempotency_store: IdempotencyStore = Depends(get_idempotency_store),
     idempotency_key: Annotated[str | None, Header()] = None,
 ) -> Note:
-    if idempotency_key and idempotency_key in _create_cache:
-        return _create_cache[idempotency_key]
+    if not idempotency_key:
+        return await note_repo.create(note)
 
-    res = await note_repo.create(note)
-    _create_cache[idempotency_key] = res
-    return res
+    async def create() -> bytes:
+        return (await note_repo.create(note)).model_dump_json().encode()
+
+    response = await _idempotent(idempotency_store, "create", idempotency_key, create)
+    return _replay(response, status.HTTP_201_CREATED)
+
+
+@router.post("/batch", status_code=status.HTTP_201_CREATED)
+async def create_notes_batch(
+    items: Annotated[list[Any], Body(max_length=MAX_BATCH_SIZE)],
+    response: Response,
+    note_repo: NoteRepository = Depends(get_note_repo),
+) -> list[BatchItemResult]:
+    results: list[BatchItemResult | None] = [None] * len(items)
+    valid: list[tuple[int, CreateNote]] = []
+    for index, item in enumerate(items):
+        try:
+            valid.append((index, CreateNote.model_validate(item)))
+        except ValidationError as e:
+            results[index] = BatchItemResult(
+                index=index, errors=e.errors(include_url=False, include_context=False)
+            )
+
+    created = await note_repo.create_many([note for _, note in valid])
+    for (index, _), note in zip(valid, created):
+        results[index] = BatchItemResult(index=index, note=note)
+
+    if len(valid) < len(items):
+        response.status_code = status.HTTP_207_MULTI_STATUS
+    return results
 
 
 @router.post("/{id}", status_code=status.HTTP_200_OK)
@@ -55,18 +271,27 @@ async def update_note(
     id: int,
     note: UpdateNote,
     note_repo: NoteRepository = Depends(get_note_repo),
+    idempotency_store: IdempotencyStore = Depends(get_idempotency_store),
     idempotency_key: Annotated[str | None, Header()] = None,
 ) -> Note:
-    if idempotency_key and idempotency_key in _update_cache:
-        return _update_cache[idempotency_key]
+    async def update() -> Note:
+        res = await note_repo.update(id, note)
+        if not res:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND, detail="Note not found"
+            )
+        return res
 
-    res = await note_repo.update(id, note)
-    if not res:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail="Note not found"
-        )
-    _update_cache[idempotency_key] = res
-    return res
+    if not idempotency_key:
+        return await update()
+
+    async def update_json() -> bytes:
+        return (await update()).model_dump_json().encode()
+
+    response = await _idempotent(
+        idempotency_store, "update", idempotency_key, update_json
+    )
+    return _replay(response, status.HTTP_200_OK)
 
 
 @router.delete("/{id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -1,45 +1,327 @@
-import os
+import asyncio
+import itertools
+import logging
+import math
+from datetime import datetime
 from typing import Annotated
 
-from fastapi import APIRouter, HTTPException
-from fastapi.params import Depends, Header
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.params import Depends, Query
+from pydantic import ValidationError
 from starlette import status
+from starlette.exceptions import HTTPException as StarletteHTTPException
 from starlette.status import HTTP_200_OK, HTTP_201_CREATED
 
-from config.di import get_note_repo, get_webhook_repo
+from config.di import (
+    get_note_repo,
+    get_webhook_deduper,
+    get_webhook_queue,
+    get_webhook_rate_limiter,
+    get_webhook_repo,
+)
+from config.env import env_int
+from controllers.json_stream import JsonItemParser
+from controllers.webhook_gatekeeper import CREDENTIAL_STATE
 from models.notes import CreateNote, Note
-from models.webhooks import WebhookNote
+from models.pagination import KeysetCursor
+from models.webhooks import WebhookAccepted, WebhookItemResult, WebhookNote
 from repositories.note_repository import NoteRepository
+from repositories.webhook_deduper import WebhookDeduper
+from repositories.webhook_ingest_queue import WebhookIngestQueue
+from repositories.webhook_rate_limiter import WebhookRateLimiter
 from repositories.webhook_repository import WebhookRepository
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(prefix="/webhooks")
 
+MAX_LOG_PAGE_SIZE = env_int("WEBHOOK_LOG_MAX_PAGE_SIZE", 100)
+# one item of POST /webhooks/notes may be as long as a single webhook body
+MAX_BULK_ITEM_CHARS = env_int("WEBHOOK_MAX_BODY_BYTES", 64 * 1024)
+BULK_CHUNK_SIZE = env_int("WEBHOOK_BULK_CHUNK_SIZE", 500)
+
+
+def get_credential(request: Request) -> str | None:
+    """The token WebhookGatekeeper verified, or None for a signed webhook."""
+    return getattr(request.state, CREDENTIAL_STATE, None)
+
+
+def _create_note(note: WebhookNote) -> CreateNote:
+    # the source tag is added to the webhook itself, so its log entry has it too
+    note.tags.append(f"source:{note.source}")
+    return CreateNote(title=note.message[:40], content=note.message, tags=note.tags)
 
-@router.post("/note", status_code=HTTP_201_CREATED)
+
+@router.post(
+    "/note",
+    status_code=HTTP_201_CREATED,
+    responses={
+        status.HTTP_200_OK: {"description": "Duplicate of a recent webhook"},
+        status.HTTP_202_ACCEPTED: {"model": WebhookAccepted},
+    },
+)
 async def create_note(
     note: WebhookNote,
-    x_webhook_token: Annotated[str | None, Header()] = None,
+    response: Response,
     note_repo: NoteRepository = Depends(get_note_repo),
     webhook_repo: WebhookRepository = Depends(get_webhook_repo),
-) -> Note:
-    if x_webhook_token != os.getenv("WEBHOOK_TOKEN"):
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid X-Webhook-Token header",
+    webhook_queue: WebhookIngestQueue | None = Depends(get_webhook_queue),
+    rate_limiter: WebhookRateLimiter | None = Depends(get_webhook_rate_limiter),
+    deduper: WebhookDeduper | None = Depends(get_webhook_deduper),
+    credential: str | None = Depends(get_credential),
+) -> Note | WebhookAccepted:
+    async def ingest() -> Note | WebhookAccepted:
+        return await _ingest(
+            note, note_repo, webhook_repo, webhook_queue, rate_limiter, credential
         )
 
-    tags = note.tags
-    tags.append(f"source:{note.source}")
-    new_note = await note_repo.create(
-        CreateNote(title=note.message[:40], content=note.message, tags=tags)
-    )
+    if deduper is None:
+        result = await ingest()
+    else:
+        result, duplicate = await deduper.get_or_create(note, ingest)
+        if duplicate:
+            # answer as the first one was answered, but nothing was created
+            response.headers["X-Webhook-Duplicate"] = "true"
+            if isinstance(result, Note):
+                response.status_code = status.HTTP_200_OK
+    if isinstance(result, WebhookAccepted):
+        response.status_code = status.HTTP_202_ACCEPTED
+    return result
+
+
+async def _ingest(
+    note: WebhookNote,
+    note_repo: NoteRepository,
+    webhook_repo: WebhookRepository,
+    webhook_queue: WebhookIngestQueue | None,
+    rate_limiter: WebhookRateLimiter | None,
+    credential: str | None,
+) -> Note | WebhookAccepted:
+    if rate_limiter is not None:
+        retry_after = await rate_limiter.check(note.source, credential)
+        if retry_after:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail=f"Rate limit exceeded for source {note.source!r}",
+                headers={"Retry-After": str(math.ceil(retry_after))},
+            )
+
+    new_note = _create_note(note)
+
+    if webhook_queue is not None:
+        try:
+            ingestion_id = await webhook_queue.submit(new_note)
+        except asyncio.QueueFull:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Webhook queue is full",
+                headers={"Retry-After": "1"},
+            )
+        await webhook_repo.log(note)
+        return WebhookAccepted(ingestion_id=ingestion_id)
+
+    created = await note_repo.create(new_note)
+    await webhook_repo.log(note)
+    return created
+
+
+@router.post(
+    "/notes",
+    status_code=HTTP_201_CREATED,
+    responses={status.HTTP_207_MULTI_STATUS: {"model": list[WebhookItemResult]}},
+)
+async def create_notes(
+    request: Request,
+    response: Response,
+    note_repo: NoteRepository = Depends(get_note_repo),
+    webhook_repo: WebhookRepository = Depends(get_webhook_repo),
+    webhook_queue: WebhookIngestQueue | None = Depends(get_webhook_queue),
+    rate_limiter: WebhookRateLimiter | None = Depends(get_webhook_rate_limiter),
+    credential: str | None = Depends(get_credential),
+) -> list[WebhookItemResult]:
+    """
+    Create notes from a JSON array or an NDJSON stream of webhook payloads.
+
+    The body is parsed while it is received and valid items are inserted
+    every BULK_CHUNK_SIZE items with one statement, so only one chunk of
+    notes is held at a time. Each item gets its own result, in body order;
+    invalid or rate-limited items are reported without rejecting the rest
+    (`207 Multi-Status`).
 
-    webhook_repo.log(note)
-    return new_note
+    Chunks are committed as they go, so a body that turns out too large,
+    or a chunk that fails to insert, still gets the results of everything
+    stored before: the items not stored are rejected, and one more result
+    at the index where reading stopped marks the rest of the body as
+    unread. A client retries exactly the items without an id.
+    """
+    results: list[WebhookItemResult] = []
+    pending: list[tuple[int, WebhookNote]] = []
+
+    async def flush() -> None:
+        accepted = []
+        if webhook_queue is not None:
+            ingestion_ids = await webhook_queue.submit_many(
+                [_create_note(note) for _, note in pending]
+            )
+            for (index, note), ingestion_id in itertools.zip_longest(
+                pending, ingestion_ids
+            ):
+                if ingestion_id is None:
+                    results.append(_rejected(index, "queue_full", "Queue is full"))
+                    continue
+                accepted.append(note)
+                results.append(
+                    WebhookItemResult(index=index, ingestion_id=ingestion_id)
+                )
+        else:
+            accepted = [note for _, note in pending]
+            try:
+                created = await note_repo.create_many(
+                    [_create_note(n) for n in accepted]
+                )
+            except Exception as e:
+                logger.exception("Inserting %d webhook notes failed", len(accepted))
+                raise _BulkAborted("insert_failed", "Notes could not be stored") from e
+            for (index, _), db_note in zip(pending, created):
+                results.append(WebhookItemResult(index=index, id=db_note.id))
+        await webhook_repo.log_many(accepted)
+        pending.clear()
+
+    async def accept(index: int, item) -> None:
+        if isinstance(item, ValueError):
+            results.append(_rejected(index, "json_invalid", str(item)))
+            return
+        try:
+            note = WebhookNote.model_validate(item)
+        except ValidationError as e:
+            results.append(
+                WebhookItemResult(
+                    index=index,
+                    errors=e.errors(include_url=False, include_context=False),
+                )
+            )
+            return
+        if rate_limiter is not None:
+            retry_after = await rate_limiter.check(note.source, credential)
+            if retry_after:
+                message = f"Rate limit exceeded for source {note.source!r}"
+                results.append(
+                    _rejected(
+                        index, "rate_limited", message, math.ceil(retry_after)
+                    )
+                )
+                return
+        pending.append((index, note))
+        if len(pending) >= BULK_CHUNK_SIZE:
+            await flush()
+
+    parser = JsonItemParser(MAX_BULK_ITEM_CHARS)
+    indexes = itertools.count()
+    complete = False
+    try:
+        async for chunk in request.stream():
+            for item in parser.feed(chunk):
+                await accept(next(indexes), item)
+        for item in parser.close():
+            await accept(next(indexes), item)
+        complete = True
+        if pending:
+            await flush()
+    except StarletteHTTPException as e:
+        # raised by WebhookGatekeeper once the body passes its limit
+        if e.status_code != status.HTTP_413_CONTENT_TOO_LARGE:
+            raise
+        aborted = _BulkAborted("body_too_large", e.detail)
+    except _BulkAborted as e:
+        aborted = e
+    else:
+        aborted = None
+    if aborted is not None:
+        for pending_index, _ in pending:
+            results.append(_rejected(pending_index, aborted.kind, aborted.message))
+        pending.clear()
+        if not complete:
+            message = f"{aborted.message}; this and later items were not read"
+            results.append(_rejected(next(indexes), aborted.kind, message))
+
+    results.sort(key=lambda result: result.index)
+    if any(result.errors for result in results):
+        response.status_code = status.HTTP_207_MULTI_STATUS
+    return results
+
+
+class _BulkAborted(Exception):
+    """Stops a bulk request; the items not stored yet get this error."""
+
+    def __init__(self, kind: str, message: str):
+        super().__init__(message)
+        self.kind = kind
+        self.message = message
+
+
+def _rejected(
+    index: int, kind: str, message: str, retry_after: int | None = None
+) -> WebhookItemResult:
+    error = {"type": kind, "loc": [], "msg": message}
+    if retry_after is not None:
+        error["retry_after"] = retry_after
+    return WebhookItemResult(index=index, errors=[error])
+
+
+def _local_time(value: datetime | None) -> datetime | None:
+    # entries are stamped with naive local time (see config.now)
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone().replace(tzinfo=None)
 
 
 @router.get("/log", status_code=HTTP_200_OK)
 async def get_logs(
+    response: Response,
+    source: str | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    tag: Annotated[list[str] | None, Query()] = None,
+    limit: Annotated[int, Query(ge=1, le=MAX_LOG_PAGE_SIZE)] = 20,
+    cursor: str | None = None,
     webhook_repo: WebhookRepository = Depends(get_webhook_repo),
+    deduper: WebhookDeduper | None = Depends(get_webhook_deduper),
 ) -> list[dict]:
-    return await webhook_repo.get_all()
+    if deduper is not None:
+        # duplicates are not logged, only counted by this worker
+        response.headers["X-Webhooks-Suppressed"] = str(
+            deduper.suppressed_count(source)
+        )
+    after = None
+    if cursor is not None:
+        try:
+            after = KeysetCursor.decode(cursor)
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor"
+            )
+
+    unfiltered = not (source or since or until or tag or after)
+    page = await webhook_repo.get_page(limit) if unfiltered else None
+    if page is not None:
+        if page.next_cursor:
+            response.headers["X-Next-Cursor"] = page.next_cursor
+        return Response(
+            page.body, media_type="application/json", headers=response.headers
+        )
+
+    entries = await webhook_repo.get_all(
+        source=source,
+        since=_local_time(since),
+        until=_local_time(until),
+        tags=tag,
+        limit=limit,
+        cursor=after,
+    )
+
+    if len(entries) == limit:
+        last = entries[-1]
+        response.headers["X-Next-Cursor"] = KeysetCursor(
+            position=last["datetime"], id=last["id"]
+        ).encode()
+    return entries
@@ -0,0 +1,203 @@
+import hashlib
+import hmac
+import json
+import os
+
+from starlette import status
+from starlette.exceptions import HTTPException
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from config.env import env_int
+
+TOKEN_HEADER = b"x-webhook-token"
+SIGNATURE_HEADER = b"x-webhook-signature"
+SIGNATURE_PREFIX = b"sha256="
+# request state key holding the credential that was verified: the token,
+# or None for a signed request
+CREDENTIAL_STATE = "webhook_credential"
+
+
+class _Secret:
+    """An environment variable as bytes, re-encoded only when it changes."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._raw: str | None = None
+        self._value: bytes | None = None
+
+    def get(self) -> bytes | None:
+        raw = os.environ.get(self.name)
+        if raw != self._raw:
+            self._raw = raw
+            self._value = raw.encode() if raw else None
+        return self._value
+
+
+class WebhookGatekeeper:
+    """
+    ASGI middleware that turns away bad `POST /webhooks/*` requests early.
+
+    A request is let through with a valid `X-Webhook-Token` header, or,
+    when `WEBHOOK_SIGNING_SECRET` is set, with an `X-Webhook-Signature:
+    sha256=<hex>` HMAC of its raw body. Both are compared in constant time.
+    Rejected requests never reach routing, JSON decoding, validation or a
+    database session. Accepted ones carry the credential that was verified
+    in `request.state.webhook_credential`.
+
+    Bodies may be `max_body_bytes` long, or as set in `path_limits` for
+    single paths. Token requests are streamed on to the app and fail with
+    `413` as soon as they pass the limit. Signed requests are read here,
+    since the signature covers the whole body, and so are always held to
+    `max_body_bytes`: a larger path limit would let anyone sending a bogus
+    signature make the server buffer that much before the `401`.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        prefix: str = "/webhooks/",
+        max_body_bytes: int | None = None,
+        path_limits: dict[str, int] | None = None,
+    ):
+        self.app = app
+        self.prefix = prefix
+        self.max_body_bytes = (
+            max_body_bytes
+            if max_body_bytes is not None
+            else env_int("WEBHOOK_MAX_BODY_BYTES", 64 * 1024)
+        )
+        self.path_limits = (
+            path_limits
+            if path_limits is not None
+            else {
+                f"{prefix}notes": env_int("WEBHOOK_BULK_MAX_BODY_BYTES", 64 << 20),
+            }
+        )
+        self._token = _Secret("WEBHOOK_TOKEN")
+        self._signing_secret = _Secret("WEBHOOK_SIGNING_SECRET")
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            scope["type"] != "http"
+            or scope["method"] != "POST"
+            or not scope["path"].startswith(self.prefix)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        limit = self.path_limits.get(scope["path"], self.max_body_bytes)
+        headers = dict(scope["headers"])
+        content_length = headers.get(b"content-length")
+        if content_length is not None and (
+            not content_length.isdigit() or int(content_length) > limit
+        ):
+            await _reject(send, status.HTTP_413_CONTENT_TOO_LARGE)
+            return
+
+        token = self._token.get()
+        provided_token = headers.get(TOKEN_HEADER)
+        if (
+            token is not None
+            and provided_token is not None
+            and hmac.compare_digest(provided_token, token)
+        ):
+            scope.setdefault("state", {})[CREDENTIAL_STATE] = token.decode()
+            await self.app(scope, _limited(receive, limit), send)
+            return
+
+        signing_secret = self._signing_secret.get()
+        signature = headers.get(SIGNATURE_HEADER)
+        if signing_secret is None or signature is None:
+            await _reject(send, status.HTTP_401_UNAUTHORIZED)
+            return
+        body = await _read_body(receive, min(limit, self.max_body_bytes))
+        if body is None:
+            await _reject(send, status.HTTP_413_CONTENT_TOO_LARGE)
+            return
+        if not _valid_signature(signing_secret, body, signature):
+            await _reject(send, status.HTTP_401_UNAUTHORIZED)
+            return
+        scope.setdefault("state", {})[CREDENTIAL_STATE] = None
+        await self.app(scope, _replay(body, receive), send)
+
+
+async def _read_body(receive: Receive, limit: int) -> bytes | None:
+    """The whole body, or None once it exceeds the limit."""
+    chunks = []
+    size = 0
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            break
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        if size > limit:
+            return None
+        chunks.append(chunk)
+        if not message.get("more_body", False):
+            break
+    return b"".join(chunks)
+
+
+def _valid_signature(secret: bytes, body: bytes, signature: bytes) -> bool:
+    if not signature.startswith(SIGNATURE_PREFIX):
+        return False
+    expected = hmac.new(secret, body, hashlib.sha256).hexdigest().encode()
+    return hmac.compare_digest(signature[len(SIGNATURE_PREFIX) :].lower(), expected)
+
+
+def _limited(receive: Receive, limit: int) -> Receive:
+    """Pass on body chunks, failing with 413 once they add up past the limit."""
+    size = 0
+
+    async def limited() -> Message:
+        nonlocal size
+        message = await receive()
+        if message["type"] == "http.request":
+            size += len(message.get("body", b""))
+            if size > limit:
+                raise HTTPException(
+                    status.HTTP_413_CONTENT_TOO_LARGE, "Request body too large"
+                )
+        return message
+
+    return limited
+
+
+def _replay(body: bytes, receive: Receive) -> Receive:
+    """Hand the buffered body to the app, then pass on later messages."""
+    sent = False
+
+    async def replay() -> Message:
+        nonlocal sent
+        if sent:
+            return await receive()
+        sent = True
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    return replay
+
+
+_BODIES = {
+    status.HTTP_401_UNAUTHORIZED: json.dumps(
+        {"detail": "Invalid X-Webhook-Token or X-Webhook-Signature"}
+    ).encode(),
+    status.HTTP_413_CONTENT_TOO_LARGE: json.dumps(
+        {"detail": "Request body too large"}
+    ).encode(),
+}
+
+
+async def _reject(send: Send, status_code: int) -> None:
+    body = _BODIES[status_code]
+    await send(
+        {
+            "type": "http.response.start",
+            "status": status_code,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
@@ -1,3 +1,5 @@
+import logging
+import os
 from contextlib import asynccontextmanager
 
 import uvicorn
@@ -5,22 +7,45 @@ from dotenv import load_dotenv
 from fastapi import FastAPI
 
 from config.di import register_singletons
+from config.env import env_bool
 
 load_dotenv()
+logging.basicConfig(level=logging.INFO)
 
 from config.db_config import create_db
+from controllers.metrics_controller import router as metrics_router
 from controllers.note_controller import router as note_router
 from controllers.webhook_controller import router as webhook_router
+from controllers.webhook_gatekeeper import WebhookGatekeeper
+from repositories.note_cache import NoteChangeListener
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     register_singletons(app)
     await create_db()
+    await app.state.idempotency_store.start()
+    await app.state.webhook_repo.start()
+    listener = None
+    if app.state.note_cache and env_bool("NOTE_CACHE_NOTIFY", False):
+        listener = NoteChangeListener(app.state.note_cache, os.environ["DB_URL"])
+        await listener.start()
+    if app.state.webhook_queue:
+        await app.state.webhook_queue.recover()
+        await app.state.webhook_queue.start()
     yield
+    if app.state.webhook_queue:
+        await app.state.webhook_queue.stop()
+    if listener:
+        await listener.stop()
+    if app.state.webhook_rate_limiter:
+        await app.state.webhook_rate_limiter.stop()
+    await app.state.webhook_repo.stop()
+    await app.state.idempotency_store.stop()
 
 
 app = FastAPI(lifespan=lifespan)
+app.add_middleware(WebhookGatekeeper)
 
 
 @app.get("/")
@@ -30,6 +55,7 @@ async def root():
 
 app.include_router(note_router)
 app.include_router(webhook_router)
+app.include_router(metrics_router)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,11 @@
+from datetime import datetime
+
+from sqlmodel import Field, SQLModel
+
+
+class IdempotencyRecord(SQLModel, table=True):
+    __tablename__ = "idempotency_key"
+
+    key: str = Field(primary_key=True)
+    response: bytes
+    expires_at: datetime = Field(index=True)
@@ -1,10 +1,20 @@
 from datetime import datetime
-from typing import Optional
+from typing import Any, Literal, Optional
 
-from sqlalchemy import Column, VARCHAR
-from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy import Column, Computed, Index, VARCHAR, text
+from sqlalchemy.dialects.postgresql import ARRAY, TSVECTOR
 from sqlmodel import Field, SQLModel
 
+SEARCH_CONFIG = "english"
+SEARCH_VECTOR_EXPRESSION = (
+    f"to_tsvector('{SEARCH_CONFIG}', "
+    "coalesce(title, '') || ' ' || coalesce(content, ''))"
+)
+
+SearchMode = Literal["substring", "fulltext"]
+NoteSort = Literal["relevance"]
+TagMatch = Literal["any", "all"]
+
 
 class NoteBase(SQLModel):
     title: str = Field(min_length=1, max_length=100)
@@ -21,5 +31,31 @@ class CreateNote(NoteBase):
 
 
 class Note(NoteBase, table=True):
+    # search_vector lives only in the table: it is maintained by Postgres and
+    # never loaded into or serialized from the model.
+    __table_args__ = (
+        Column(
+            "search_vector",
+            TSVECTOR,
+            Computed(SEARCH_VECTOR_EXPRESSION, persisted=True),
+        ),
+        Index("ix_note_search_vector", "search_vector", postgresql_using="gin"),
+        Index("ix_note_tags", "tags", postgresql_using="gin"),
+        Index("ix_note_created_at_id", "created_at", "id"),
+    )
+    __mapper_args__ = {"exclude_properties": ["search_vector"]}
+
     id: Optional[int] = Field(default=None, primary_key=True)
     created_at: datetime
+    # same default as the column added to older tables by create_db
+    updated_at: datetime = Field(
+        sa_column_kwargs={"server_default": text("LOCALTIMESTAMP")}
+    )
+
+
+class BatchItemResult(SQLModel):
+    """Outcome of one item of a batch create: the note or its errors."""
+
+    index: int
+    note: Note | None = None
+    errors: list[dict[str, Any]] | None = None
@@ -0,0 +1,29 @@
+import base64
+from typing import Annotated
+
+from pydantic import BaseModel, Field, NaiveDatetime
+
+# ids are Postgres integer (int4) primary keys
+MAX_ID = 2**31 - 1
+
+
+class KeysetCursor(BaseModel):
+    """
+    Opaque position in a listing ordered by (timestamp, id).
+
+    Cursors come back from clients, so both fields are checked against
+    the columns they are compared with: naive timestamps, int4 ids.
+    """
+
+    position: NaiveDatetime
+    id: Annotated[int, Field(ge=1, le=MAX_ID)]
+
+    def encode(self) -> str:
+        raw = self.model_dump_json().encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+    @classmethod
+    def decode(cls, cursor: str) -> "KeysetCursor":
+        """Raises ValueError when the cursor is malformed."""
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        return cls.model_validate_json(raw)
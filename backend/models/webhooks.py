@@ -1,7 +1,57 @@
-from pydantic import BaseModel, Field
+from datetime import datetime
+from typing import Any, Optional
+
+from pydantic import BaseModel
+from sqlalchemy import Column, Index, VARCHAR
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlmodel import Field, SQLModel
 
 
 class WebhookNote(BaseModel):
     source: str = Field(min_length=1)
     message: str = Field(min_length=1)
     tags: list[str] = []
+
+
+class WebhookAccepted(BaseModel):
+    """Answer to a webhook that was queued instead of inserted right away."""
+
+    ingestion_id: str
+
+
+class WebhookItemResult(BaseModel):
+    """
+    Outcome of one item of `POST /webhooks/notes`: the created note's id,
+    the ingestion id if it was queued, or why it was rejected.
+    """
+
+    index: int
+    id: int | None = None
+    ingestion_id: str | None = None
+    errors: list[dict[str, Any]] | None = None
+
+
+class WebhookLogEntry(SQLModel, table=True):
+    __tablename__ = "webhook_log"
+    __table_args__ = (
+        # newest-first listings, unfiltered or by source, are index range scans
+        Index("ix_webhook_log_received_at_id", "received_at", "id"),
+        Index("ix_webhook_log_source_received_at_id", "source", "received_at", "id"),
+        Index("ix_webhook_log_tags", "tags", postgresql_using="gin"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    source: str
+    message: str
+    tags: list[str] = Field(default=[], sa_column=Column(ARRAY(VARCHAR)))
+    received_at: datetime
+
+    def as_log(self) -> dict[str, Any]:
+        """The entry as served by GET /webhooks/log."""
+        return {
+            "id": self.id,
+            "source": self.source,
+            "message": self.message,
+            "tags": self.tags,
+            "datetime": self.received_at,
+        }
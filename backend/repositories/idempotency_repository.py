@@ -0,0 +1,353 @@
+import asyncio
+import logging
+import os
+from datetime import timedelta
+from typing import Awaitable, Callable
+
+from cachetools import TTLCache
+from sqlalchemy import delete, or_, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import col
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from config.db_config import get_engine
+from config.env import env_float, env_int
+from config.now import now
+from models.idempotency import IdempotencyRecord
+
+logger = logging.getLogger(__name__)
+
+# stored in place of a response while the key's request is still running
+PENDING = b""
+
+
+class IdempotencyKeyInUse(Exception):
+    """Another worker is still producing the response for the key."""
+
+
+class IdempotencyStore:
+    """
+    Remembers the response body produced for an Idempotency-Key.
+
+    This base class is the in-memory backend. Shared backends override
+    `_load`, `_claim`, `_release` and `_save`; hits are still answered from
+    the bounded local TTL cache first, so repeated retries never leave the
+    process.
+
+    A shared key is claimed with a pending placeholder before the response
+    is produced, so a retry reaching another worker meanwhile waits for it
+    (up to `wait` seconds, then IdempotencyKeyInUse) instead of creating
+    again. A failed request releases its claim; a claim left by a worker
+    that died expires after `pending_ttl` seconds.
+    """
+
+    def __init__(
+        self,
+        maxsize: int,
+        ttl: float,
+        pending_ttl: float = 60,
+        wait: float = 10,
+        poll_interval: float = 0.05,
+    ):
+        self.ttl = ttl
+        self.pending_ttl = pending_ttl
+        self.wait = wait
+        self.poll_interval = poll_interval
+        self._local: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._in_flight: dict[tuple[str, str], asyncio.Future] = {}
+
+    async def get_or_create(
+        self, scope: str, key: str, create: Callable[[], Awaitable[bytes]]
+    ) -> bytes:
+        """
+        Return the stored response for the key, or produce it exactly once.
+
+        Concurrent callers with the same key while `create` is running await
+        its result (or exception) instead of running `create` themselves.
+        """
+        while (flight := self._in_flight.get((scope, key))) is not None:
+            try:
+                return await asyncio.shield(flight)
+            except asyncio.CancelledError:
+                if not flight.cancelled():
+                    raise
+                # the request producing the response went away; take over
+
+        response = await self.get(scope, key)
+        if response is not None:
+            return response
+        if (scope, key) in self._in_flight:
+            return await self.get_or_create(scope, key, create)
+
+        flight = asyncio.get_running_loop().create_future()
+        self._in_flight[(scope, key)] = flight
+        try:
+            response = await self._produce(scope, key, create)
+        except asyncio.CancelledError:
+            flight.cancel()
+            raise
+        except Exception as e:
+            flight.set_exception(e)
+            # mark it retrieved so a flight without followers does not warn
+            flight.exception()
+            raise
+        else:
+            flight.set_result(response)
+            return response
+        finally:
+            del self._in_flight[(scope, key)]
+
+    async def _produce(
+        self, scope: str, key: str, create: Callable[[], Awaitable[bytes]]
+    ) -> bytes:
+        """Claim the key and create the response, or wait for another claim."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.wait
+        while not await self._claim(scope, key):
+            if loop.time() >= deadline:
+                raise IdempotencyKeyInUse(key)
+            await asyncio.sleep(self.poll_interval)
+            response = await self.get(scope, key)
+            if response is not None:
+                return response
+        try:
+            response = await create()
+        except BaseException:
+            await self._release(scope, key)
+            raise
+        # a failed save keeps the claim, so retries wait rather than create
+        await self.put(scope, key, response)
+        return response
+
+    async def get(self, scope: str, key: str) -> bytes | None:
+        response = self._local.get((scope, key))
+        if response is None:
+            response = await self._load(scope, key)
+            if response is not None:
+                self._local[(scope, key)] = response
+        return response
+
+    async def put(self, scope: str, key: str, response: bytes) -> None:
+        self._local[(scope, key)] = response
+        await self._save(scope, key, response)
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    async def _load(self, scope: str, key: str) -> bytes | None:
+        """The stored response; None while the key is missing or pending."""
+        return None
+
+    async def _claim(self, scope: str, key: str) -> bool:
+        """Mark the key pending; False if another request holds it."""
+        return True
+
+    async def _release(self, scope: str, key: str) -> None:
+        pass
+
+    async def _save(self, scope: str, key: str, response: bytes) -> None:
+        pass
+
+
+class PostgresIdempotencyStore(IdempotencyStore):
+    """Keys shared by all workers through the idempotency_key table."""
+
+    def __init__(
+        self,
+        session_factory: Callable[[], AsyncSession],
+        maxsize: int,
+        ttl: float,
+        sweep_interval: float,
+        **kwargs,
+    ):
+        super().__init__(maxsize, ttl, **kwargs)
+        self.session_factory = session_factory
+        self.sweep_interval = sweep_interval
+        self._sweeper: asyncio.Task | None = None
+
+    async def _load(self, scope: str, key: str) -> bytes | None:
+        statement = select(IdempotencyRecord.response).where(
+            col(IdempotencyRecord.key) == f"{scope}:{key}",
+            col(IdempotencyRecord.expires_at) > now(),
+            col(IdempotencyRecord.response) != PENDING,
+        )
+        async with self.session_factory() as session:
+            return await session.scalar(statement)
+
+    async def _claim(self, scope: str, key: str) -> bool:
+        # a pending row is inserted, or takes over an expired one
+        statement = self._upsert(
+            scope,
+            key,
+            PENDING,
+            self.pending_ttl,
+            where=col(IdempotencyRecord.expires_at) <= now(),
+        )
+        async with self.session_factory() as session:
+            claimed = await session.scalar(statement)
+            await session.commit()
+        return claimed is not None
+
+    async def _release(self, scope: str, key: str) -> None:
+        statement = delete(IdempotencyRecord).where(
+            col(IdempotencyRecord.key) == f"{scope}:{key}",
+            col(IdempotencyRecord.response) == PENDING,
+        )
+        async with self.session_factory() as session:
+            await session.execute(statement)
+            await session.commit()
+
+    async def _save(self, scope: str, key: str, response: bytes) -> None:
+        # the first response stored for a key wins, as with the local cache
+        statement = self._upsert(
+            scope,
+            key,
+            response,
+            self.ttl,
+            where=or_(
+                col(IdempotencyRecord.response) == PENDING,
+                col(IdempotencyRecord.expires_at) <= now(),
+            ),
+        )
+        async with self.session_factory() as session:
+            await session.execute(statement)
+            await session.commit()
+
+    @staticmethod
+    def _upsert(scope: str, key: str, response: bytes, ttl: float, where):
+        """
+        Insert the row, or overwrite the existing one where `where` holds;
+        returns the key if a row was written.
+        """
+        statement = insert(IdempotencyRecord).values(
+            key=f"{scope}:{key}",
+            response=response,
+            expires_at=now() + timedelta(seconds=ttl),
+        )
+        return statement.on_conflict_do_update(
+            index_elements=["key"],
+            set_={
+                "response": statement.excluded.response,
+                "expires_at": statement.excluded.expires_at,
+            },
+            where=where,
+        ).returning(col(IdempotencyRecord.key))
+
+    async def sweep(self) -> int:
+        """Delete expired keys; returns how many were removed."""
+        statement = delete(IdempotencyRecord).where(
+            col(IdempotencyRecord.expires_at) <= now()
+        )
+        async with self.session_factory() as session:
+            result = await session.execute(statement)
+            await session.commit()
+        return result.rowcount
+
+    async def start(self) -> None:
+        self._sweeper = asyncio.create_task(self._sweep_forever())
+
+    async def stop(self) -> None:
+        if self._sweeper:
+            self._sweeper.cancel()
+
+    async def _sweep_forever(self) -> None:
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                await self.sweep()
+            except Exception:
+                logger.exception("Sweeping expired idempotency keys failed")
+
+
+# stores a response unless one (not a pending claim) is already there
+SAVE_SCRIPT = """
+local current = redis.call('GET', KEYS[1])
+if current and current ~= '' then
+  return 0
+end
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+return 1
+"""
+
+# drops the key only while it is still a pending claim
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == '' then
+  redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class RedisIdempotencyStore(IdempotencyStore):
+    """
+    Keys shared through Redis (or any client with the same get/set/eval API).
+
+    Expiry is delegated to Redis via SET ... EX, so no sweeper is needed.
+    Claims are set with NX, so only one worker holds a key at a time.
+    """
+
+    def __init__(self, client, maxsize: int, ttl: float, **kwargs):
+        super().__init__(maxsize, ttl, **kwargs)
+        self.client = client
+
+    async def _load(self, scope: str, key: str) -> bytes | None:
+        response = await self.client.get(f"idempotency:{scope}:{key}")
+        return response or None
+
+    async def _claim(self, scope: str, key: str) -> bool:
+        return bool(
+            await self.client.set(
+                f"idempotency:{scope}:{key}",
+                PENDING,
+                ex=max(1, int(self.pending_ttl)),
+                nx=True,
+            )
+        )
+
+    async def _release(self, scope: str, key: str) -> None:
+        await self.client.eval(RELEASE_SCRIPT, 1, f"idempotency:{scope}:{key}")
+
+    async def _save(self, scope: str, key: str, response: bytes) -> None:
+        await self.client.eval(
+            SAVE_SCRIPT, 1, f"idempotency:{scope}:{key}", response, int(self.ttl)
+        )
+
+    async def stop(self) -> None:
+        await self.client.aclose()
+
+
+def create_idempotency_store() -> IdempotencyStore:
+    """Build the backend selected by IDEMPOTENCY_BACKEND (memory by default)."""
+    backend = os.getenv("IDEMPOTENCY_BACKEND", "memory")
+    maxsize = env_int("IDEMPOTENCY_MAX_ENTRIES", 100_000)
+    ttl = env_float("IDEMPOTENCY_TTL_SECONDS", 86400)
+    claim = {
+        "pending_ttl": env_float("IDEMPOTENCY_PENDING_SECONDS", 60),
+        "wait": env_float("IDEMPOTENCY_WAIT_SECONDS", 10),
+    }
+
+    if backend == "memory":
+        return IdempotencyStore(maxsize, ttl)
+    if backend == "postgres":
+        return PostgresIdempotencyStore(
+            lambda: AsyncSession(get_engine()),
+            maxsize,
+            ttl,
+            sweep_interval=env_float("IDEMPOTENCY_SWEEP_SECONDS", 300),
+            **claim,
+        )
+    if backend == "redis":
+        try:
+            from redis.asyncio import Redis
+        except ImportError as e:
+            raise RuntimeError(
+                "IDEMPOTENCY_BACKEND=redis requires the redis package"
+            ) from e
+        redis_url = os.getenv("REDIS_URL")
+        if not redis_url:
+            raise RuntimeError("REDIS_URL environment variable is not set")
+        return RedisIdempotencyStore(Redis.from_url(redis_url), maxsize, ttl, **claim)
+    raise RuntimeError(f"Unknown IDEMPOTENCY_BACKEND: {backend}")
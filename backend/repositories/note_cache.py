@@ -0,0 +1,159 @@
+import asyncio
+import logging
+from typing import Hashable
+
+import asyncpg
+from cachetools import TTLCache
+from sqlalchemy import make_url
+
+from models.notes import Note
+
+logger = logging.getLogger(__name__)
+
+NOTE_CHANGED_CHANNEL = "note_changed"
+
+
+class _EvictionCountingCache(TTLCache):
+    def __init__(self, maxsize: int, ttl: float):
+        super().__init__(maxsize=maxsize, ttl=ttl)
+        self.evictions = 0
+
+    def popitem(self):
+        # called only when the cache is full and must drop its LRU entry
+        self.evictions += 1
+        return super().popitem()
+
+
+class NoteCache:
+    """
+    Bounded per-process read cache of notes by id, with LRU and TTL eviction,
+    plus a cache of listing results keyed by their normalized parameters.
+
+    Every write calls `invalidate`, which also bumps `version`. Readers pass
+    the version they saw before querying to `put`, so a row read before a
+    concurrent write can never be cached after that write invalidated it.
+    Listing results are stored under the version they were read at, so one
+    bump makes every cached listing unreachable; LRU evicts them later.
+    """
+
+    def __init__(
+        self,
+        maxsize: int,
+        ttl: float,
+        query_maxsize: int = 1000,
+        query_ttl: float = 10,
+    ):
+        self._notes = _EvictionCountingCache(maxsize, ttl)
+        self._queries = _EvictionCountingCache(query_maxsize, query_ttl)
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self.query_hits = 0
+        self.query_misses = 0
+        self.invalidations = 0
+
+    def get(self, note_id: int) -> Note | None:
+        note = self._notes.get(note_id)
+        if note is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return note
+
+    def put(self, note: Note, version: int) -> None:
+        if version == self.version:
+            self._notes[note.id] = note
+
+    def get_query(self, key: Hashable) -> list[Note] | None:
+        notes = self._queries.get((self.version, key))
+        if notes is None:
+            self.query_misses += 1
+        else:
+            self.query_hits += 1
+        return notes
+
+    def put_query(self, key: Hashable, notes: list[Note], version: int) -> None:
+        if version == self.version and self._queries.maxsize:
+            self._queries[(version, key)] = notes
+
+    def invalidate(self, note_id: int) -> None:
+        self.version += 1
+        self.invalidations += 1
+        self._notes.pop(note_id, None)
+
+    def clear(self) -> None:
+        self.version += 1
+        self._notes.clear()
+        self._queries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._notes),
+            "maxsize": self._notes.maxsize,
+            "ttl_seconds": self._notes.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self._notes.evictions,
+            "invalidations": self.invalidations,
+            "queries": {
+                "size": len(self._queries),
+                "maxsize": self._queries.maxsize,
+                "ttl_seconds": self._queries.ttl,
+                "hits": self.query_hits,
+                "misses": self.query_misses,
+                "evictions": self._queries.evictions,
+            },
+        }
+
+
+class NoteChangeListener:
+    """
+    Applies note changes made by other workers to the local NoteCache.
+
+    A trigger on the note table (installed by create_db when NOTE_CACHE_NOTIFY
+    is on) sends the id of every changed row on NOTE_CHANGED_CHANNEL. While
+    the dedicated LISTEN connection is down the cache may miss changes, so it
+    is cleared on reconnect.
+    """
+
+    def __init__(self, cache: NoteCache, db_url: str, reconnect_delay: float = 1.0):
+        self.cache = cache
+        self.dsn = make_url(db_url).set(drivername="postgresql").render_as_string(
+            hide_password=False
+        )
+        self.reconnect_delay = reconnect_delay
+        self._conn: asyncpg.Connection | None = None
+        self._reconnect: asyncio.Task | None = None
+        self._stopped = False
+
+    async def start(self) -> None:
+        self._conn = await asyncpg.connect(self.dsn)
+        await self._conn.add_listener(NOTE_CHANGED_CHANNEL, self._on_notify)
+        self._conn.add_termination_listener(self._on_terminated)
+
+    async def stop(self) -> None:
+        self._stopped = True
+        if self._reconnect:
+            self._reconnect.cancel()
+        if self._conn and not self._conn.is_closed():
+            await self._conn.close()
+
+    def _on_notify(self, conn, pid: int, channel: str, payload: str) -> None:
+        self.cache.invalidate(int(payload))
+
+    def _on_terminated(self, conn) -> None:
+        if not self._stopped:
+            logger.warning("Note cache LISTEN connection lost, reconnecting")
+            self._reconnect = asyncio.create_task(self._reconnect_forever())
+
+    async def _reconnect_forever(self) -> None:
+        while not self._stopped:
+            await asyncio.sleep(self.reconnect_delay)
+            try:
+                await self.start()
+            except (OSError, asyncpg.PostgresError):
+                continue
+            self.cache.clear()
+            return
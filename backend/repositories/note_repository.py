@@ -1,35 +1,136 @@
-from typing import Optional
+from datetime import datetime
+from typing import AsyncIterator, Optional
 
+from sqlalchemy import delete, func, insert, tuple_, update
 from sqlmodel import col, or_, select
+from sqlmodel.sql.expression import SelectOfScalar
 from sqlmodel.ext.asyncio.session import AsyncSession
 
 from config.now import now
-from models.notes import CreateNote, Note, UpdateNote
+from models.notes import (
+    SEARCH_CONFIG,
+    CreateNote,
+    Note,
+    NoteSort,
+    SearchMode,
+    TagMatch,
+    UpdateNote,
+)
+from models.pagination import KeysetCursor
+from repositories.note_cache import NoteCache
+
+search_vector = Note.__table__.c.search_vector
+
+# rows fetched per round trip when streaming through a server-side cursor
+STREAM_BATCH_SIZE = 500
+
+
+def _tsquery(q: str):
+    return func.websearch_to_tsquery(SEARCH_CONFIG, q)
+
+
+def _query_key(
+    q: str | None,
+    tags: list[str] | None,
+    limit: int,
+    offset: int,
+    search: SearchMode,
+    sort: NoteSort | None,
+    tag_match: TagMatch,
+    cursor: KeysetCursor | None,
+) -> tuple:
+    """Identical for every parameter combination that selects the same page."""
+    unique_tags = tuple(sorted(set(tags))) if tags else ()
+    return (
+        # both ILIKE and websearch_to_tsquery ignore case
+        q.lower() if q else None,
+        search if q else None,
+        sort if q and search == "fulltext" else None,
+        unique_tags,
+        tag_match if len(unique_tags) > 1 else None,
+        limit,
+        offset,
+        (cursor.position, cursor.id) if cursor else None,
+    )
 
 
 class NoteRepository:
-    def __init__(self, session: AsyncSession):
+    def __init__(self, session: AsyncSession, cache: NoteCache | None = None):
         self.session = session
+        self.cache = cache
 
     async def get(self, note_id: int) -> Optional[Note]:
-        return await self.session.get(Note, note_id)
+        if self.cache is None:
+            return await self.session.get(Note, note_id)
+
+        note = self.cache.get(note_id)
+        if note is None:
+            version = self.cache.version
+            note = await self.session.get(Note, note_id)
+            if note is not None:
+                self.cache.put(note, version)
+        return note
+
+    async def get_version(self, note_id: int) -> Optional[datetime]:
+        """updated_at of a note, without loading the rest of the row."""
+        if self.cache is not None:
+            note = self.cache.get(note_id)
+            if note is not None:
+                return note.updated_at
+        return await self.session.scalar(
+            select(col(Note.updated_at)).where(col(Note.id) == note_id)
+        )
 
     async def get_all(
         self,
         q: str | None = None,
-        tag: str | None = None,
+        tags: list[str] | None = None,
         limit: int = 3,
         offset: int = 0,
+        search: SearchMode = "substring",
+        sort: NoteSort | None = None,
+        tag_match: TagMatch = "all",
+        cursor: KeysetCursor | None = None,
     ) -> list[Note]:
-        statement = select(Note)
+        if self.cache is not None:
+            key = _query_key(q, tags, limit, offset, search, sort, tag_match, cursor)
+            notes = self.cache.get_query(key)
+            if notes is None:
+                version = self.cache.version
+                notes = await self._get_all(
+                    q, tags, limit, offset, search, sort, tag_match, cursor
+                )
+                self.cache.put_query(key, notes, version)
+            return list(notes)
+        return await self._get_all(
+            q, tags, limit, offset, search, sort, tag_match, cursor
+        )
 
-        if tag:
-            statement = statement.where(col(Note.tags).contains([tag]))
+    async def _get_all(
+        self,
+        q: str | None,
+        tags: list[str] | None,
+        limit: int,
+        offset: int,
+        search: SearchMode,
+        sort: NoteSort | None,
+        tag_match: TagMatch,
+        cursor: KeysetCursor | None,
+    ) -> list[Note]:
+        statement = self._filtered(q, tags, search, tag_match)
 
-        if q:
-            statement = statement.where(
-                or_(col(Note.title).ilike(f"%{q}%"), col(Note.content).ilike(f"%{q}%"))
+        if sort == "relevance" and q and search == "fulltext":
+            statement = statement.order_by(
+                func.ts_rank(search_vector, _tsquery(q)).desc(), col(Note.id)
             )
+        else:
+            # matches ix_note_created_at_id, so a cursor page is an index range scan
+            statement = statement.order_by(col(Note.created_at), col(Note.id))
+            if cursor:
+                statement = statement.where(
+                    tuple_(col(Note.created_at), col(Note.id))
+                    > tuple_(cursor.position, cursor.id)
+                )
 
         if limit:
             statement = statement.offset(offset).limit(limit)
@@ -37,27 +138,97 @@ class NoteRepository:
         notes = await self.session.exec(statement)
         return list(notes.all())
 
+    async def stream_all(
+        self,
+        q: str | None = None,
+        tags: list[str] | None = None,
+        search: SearchMode = "substring",
+        tag_match: TagMatch = "all",
+    ) -> AsyncIterator[Note]:
+        """Yield every matching note through a server-side cursor."""
+        statement = (
+            self._filtered(q, tags, search, tag_match)
+            .order_by(col(Note.created_at), col(Note.id))
+            .execution_options(yield_per=STREAM_BATCH_SIZE)
+        )
+        notes = await self.session.stream_scalars(statement)
+        async for note in notes:
+            yield note
+
+    @staticmethod
+    def _filtered(
+        q: str | None,
+        tags: list[str] | None,
+        search: SearchMode,
+        tag_match: TagMatch,
+    ) -> SelectOfScalar[Note]:
+        statement = select(Note)
+
+        # @> (all) and && (any) are both served by the GIN index on tags
+        if tags and tag_match == "any":
+            statement = statement.where(col(Note.tags).overlap(tags))
+        elif tags:
+            statement = statement.where(col(Note.tags).contains(tags))
+
+        if q and search == "fulltext":
+            statement = statement.where(search_vector.op("@@")(_tsquery(q)))
+        elif q:
+            statement = statement.where(
+                or_(col(Note.title).ilike(f"%{q}%"), col(Note.content).ilike(f"%{q}%"))
+            )
+
+        return statement
+
     async def create(self, note: CreateNote) -> Note:
-        db_note = Note(**note.model_dump(), created_at=now())
-        self.session.add(db_note)
+        timestamp = now()
+        statement = (
+            insert(Note)
+            .values(**note.model_dump(), created_at=timestamp, updated_at=timestamp)
+            .returning(Note)
+        )
+        db_note = (await self.session.scalars(statement)).one()
         await self.session.commit()
-        await self.session.refresh(db_note)
+        self._invalidate(db_note.id)
         return db_note
 
+    async def create_many(self, notes: list[CreateNote]) -> list[Note]:
+        """Insert all notes with one INSERT ... RETURNING in one transaction."""
+        if not notes:
+            return []
+        timestamp = now()
+        statement = insert(Note).returning(Note, sort_by_parameter_order=True)
+        created = await self.session.scalars(
+            statement,
+            [
+                {**note.model_dump(), "created_at": timestamp, "updated_at": timestamp}
+                for note in notes
+            ],
+        )
+        db_notes = list(created.all())
+        await self.session.commit()
+        for db_note in db_notes:
+            self._invalidate(db_note.id)
+        return db_notes
+
     async def update(self, note_id: int, note: UpdateNote) -> Optional[Note]:
-        found_note = await self.get(note_id)
-        if not found_note:
-            return None
-        found_note.sqlmodel_update(note.model_dump(exclude_unset=True))
-        self.session.add(found_note)
+        statement = (
+            update(Note)
+            .where(col(Note.id) == note_id)
+            .values(**note.model_dump(exclude_unset=True), updated_at=now())
+            .returning(Note)
+        )
+        db_note = (await self.session.scalars(statement)).one_or_none()
         await self.session.commit()
-        await self.session.refresh(found_note)
-        return found_note
+        self._invalidate(note_id)
+        return db_note
 
     async def delete(self, note_id: int) -> bool:
-        note = await self.get(note_id)
-        if not note:
-            return False
-        await self.session.delete(note)
+        statement = delete(Note).where(col(Note.id) == note_id).returning(col(Note.id))
+        deleted_id = await self.session.scalar(statement)
         await self.session.commit()
-        return True
+        self._invalidate(note_id)
+        return deleted_id is not None
+
+    def _invalidate(self, note_id: int) -> None:
+        if self.cache is not None:
+            self.cache.invalidate(note_id)
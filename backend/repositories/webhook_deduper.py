@@ -0,0 +1,93 @@
+import asyncio
+import hashlib
+import json
+import time
+from collections import Counter
+from typing import Awaitable, Callable, TypeVar
+
+from cachetools import TTLCache
+
+from models.webhooks import WebhookNote
+
+T = TypeVar("T")
+
+
+def dedupe_key(note: WebhookNote) -> bytes:
+    """Content hash of the webhook; tag order does not matter."""
+    content = json.dumps([note.source, note.message, sorted(note.tags)])
+    return hashlib.blake2b(content.encode(), digest_size=16).digest()
+
+
+class WebhookDeduper:
+    """
+    Suppresses webhooks identical to one received in the last `window`
+    seconds (same source, message and tags) and hands back what the first
+    one produced instead.
+
+    Results are kept per content hash in a TTL cache of at most `maxsize`
+    entries, so memory stays bounded; under more distinct webhooks than
+    that per window, the least recently seen are forgotten early. A
+    duplicate that arrives while the first is still being created waits
+    for its result. Suppressions are counted per source.
+    """
+
+    def __init__(
+        self,
+        window: float,
+        maxsize: int = 10_000,
+        timer: Callable[[], float] = time.monotonic,
+    ):
+        self.window = window
+        self._seen: TTLCache = TTLCache(maxsize=maxsize, ttl=window, timer=timer)
+        self.suppressed: Counter[str] = Counter()
+
+    async def get_or_create(
+        self, note: WebhookNote, create: Callable[[], Awaitable[T]]
+    ) -> tuple[T, bool]:
+        """The result for the webhook, and whether it was a duplicate."""
+        key = dedupe_key(note)
+        while (first := self._seen.get(key)) is not None:
+            try:
+                result = await asyncio.shield(first)
+            except asyncio.CancelledError:
+                if not first.cancelled():
+                    raise
+                # the request creating it went away; take over
+                continue
+            self.suppressed[note.source] += 1
+            return result, True
+
+        first = asyncio.get_running_loop().create_future()
+        self._seen[key] = first
+        try:
+            result = await create()
+        except asyncio.CancelledError:
+            self._forget(key, first)
+            first.cancel()
+            raise
+        except Exception as e:
+            # a failed webhook is not remembered; the next one is tried again
+            self._forget(key, first)
+            first.set_exception(e)
+            # mark it retrieved so a failure without followers does not warn
+            first.exception()
+            raise
+        first.set_result(result)
+        return result, False
+
+    def _forget(self, key: bytes, first: asyncio.Future) -> None:
+        if self._seen.get(key) is first:
+            del self._seen[key]
+
+    def suppressed_count(self, source: str | None = None) -> int:
+        if source is not None:
+            return self.suppressed[source]
+        return self.suppressed.total()
+
+    def stats(self) -> dict:
+        return {
+            "window_seconds": self.window,
+            "entries": len(self._seen),
+            "suppressed": self.suppressed_count(),
+            "suppressed_by_source": dict(self.suppressed),
+        }
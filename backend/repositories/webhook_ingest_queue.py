@@ -0,0 +1,217 @@
+import asyncio
+import logging
+import uuid
+from typing import Callable
+
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from models.notes import CreateNote
+from repositories.note_cache import NoteCache
+from repositories.note_repository import NoteRepository
+from repositories.webhook_journal import WebhookJournal
+
+logger = logging.getLogger(__name__)
+
+# longest wait between two attempts at the same batch
+MAX_RETRY_BACKOFF = 30.0
+
+
+class WebhookIngestQueue:
+    """
+    Write-behind buffer for webhook notes.
+
+    `submit` only enqueues and returns an ingestion id; a background worker
+    inserts queued notes with one multi-row INSERT per batch. A batch is
+    flushed once it holds `batch_size` notes or `flush_interval` seconds
+    after its first note arrived, whichever comes first. The queue is
+    bounded: when it is full `submit` raises `asyncio.QueueFull`, and
+    `submit_many` only queues the notes that fit.
+
+    With a `journal`, `submit` returns only after the note is on disk, and
+    notes journaled but never inserted are inserted again by `recover` on
+    the next start. Delivery is then at least once: a crash between the
+    INSERT and marking its notes persisted replays them.
+
+    A batch that fails to insert is retried up to `max_attempts` times in
+    all, waiting `retry_backoff` seconds and doubling that after every
+    failure, so a short database outage does not lose accepted notes.
+    Meanwhile the queue fills up and pushes back on new submits. After the
+    last attempt the notes are dead-lettered: moved to the journal's
+    dead-letter file, or without a journal, logged in full.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], AsyncSession],
+        note_cache: NoteCache | None = None,
+        maxsize: int = 10_000,
+        batch_size: int = 500,
+        flush_interval: float = 0.05,
+        journal: WebhookJournal | None = None,
+        max_attempts: int = 5,
+        retry_backoff: float = 0.5,
+    ):
+        self.session_factory = session_factory
+        self.note_cache = note_cache
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.journal = journal
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self._queue: asyncio.Queue[tuple[str, CreateNote]] = asyncio.Queue(maxsize)
+        self._worker: asyncio.Task | None = None
+        # submits waiting for their journal append, counted against maxsize
+        self._reserved = 0
+        self.accepted = 0
+        self.rejected = 0
+        self.inserted = 0
+        self.retries = 0
+        self.failed = 0
+        self.batches = 0
+
+    async def submit(self, note: CreateNote) -> str:
+        ingestion_ids = await self.submit_many([note])
+        if not ingestion_ids:
+            raise asyncio.QueueFull
+        return ingestion_ids[0]
+
+    async def submit_many(self, notes: list[CreateNote]) -> list[str]:
+        """
+        Queue as many of `notes` as fit, in order, and return their ingestion
+        ids; the notes past the end of the returned list were rejected. With
+        a journal they are all written with a single fsync.
+        """
+        capacity = self._queue.maxsize
+        fitting = len(notes)
+        if capacity:
+            free = capacity - self._queue.qsize() - self._reserved
+            fitting = max(0, min(fitting, free))
+        self.rejected += len(notes) - fitting
+        records = [(uuid.uuid4().hex, note) for note in notes[:fitting]]
+        if self.journal is not None and records:
+            self._reserved += len(records)
+            try:
+                await self.journal.append_many(records)
+            finally:
+                self._reserved -= len(records)
+        for record in records:
+            self._queue.put_nowait(record)
+        self.accepted += len(records)
+        return [ingestion_id for ingestion_id, _ in records]
+
+    async def recover(self) -> int:
+        """Insert the notes a previous process journaled but never inserted."""
+        if self.journal is None:
+            return 0
+        recovered = await self.journal.open()
+        for start in range(0, len(recovered), self.batch_size):
+            await self.flush(recovered[start : start + self.batch_size])
+        if recovered:
+            logger.info("Replayed %d journaled webhook notes", len(recovered))
+        return len(recovered)
+
+    async def start(self) -> None:
+        self._worker = asyncio.create_task(self._flush_forever())
+
+    async def stop(self) -> None:
+        """
+        Flush everything still queued, then stop the worker.
+
+        Call it once no more notes are submitted; the last batch is flushed
+        at most `flush_interval` seconds after the queue ran empty.
+        """
+        if self._worker is None:
+            return
+        await self._queue.join()
+        self._worker.cancel()
+        await asyncio.gather(self._worker, return_exceptions=True)
+        self._worker = None
+        if self.journal is not None:
+            await self.journal.close()
+
+    async def _flush_forever(self) -> None:
+        while True:
+            batch = await self._next_batch()
+            try:
+                await self.flush(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _next_batch(self) -> list[tuple[str, CreateNote]]:
+        batch = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.flush_interval
+        while len(batch) < self.batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except TimeoutError:
+                break
+        return batch
+
+    async def flush(self, batch: list[tuple[str, CreateNote]]) -> None:
+        delay = self.retry_backoff
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                async with self.session_factory() as session:
+                    await NoteRepository(session, self.note_cache).create_many(
+                        [note for _, note in batch]
+                    )
+                break
+            except Exception:
+                if attempt == self.max_attempts:
+                    logger.exception(
+                        "Inserting %d queued webhook notes failed %d times, "
+                        "dead-lettering them",
+                        len(batch),
+                        attempt,
+                    )
+                    await self._dead_letter(batch)
+                    return
+                logger.warning(
+                    "Inserting %d queued webhook notes failed, retrying in %.2fs",
+                    len(batch),
+                    delay,
+                    exc_info=True,
+                )
+                self.retries += 1
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, MAX_RETRY_BACKOFF)
+        self.inserted += len(batch)
+        self.batches += 1
+        if self.journal is not None:
+            self.journal.mark_persisted([ingestion_id for ingestion_id, _ in batch])
+
+    async def _dead_letter(self, batch: list[tuple[str, CreateNote]]) -> None:
+        self.failed += len(batch)
+        if self.journal is not None:
+            try:
+                await self.journal.dead_letter(batch)
+                return
+            except Exception:
+                # still unacknowledged in the journal, so replayed on restart
+                logger.exception("Dead-lettering %d webhook notes failed", len(batch))
+                return
+        for ingestion_id, note in batch:
+            logger.error(
+                "Dropped webhook note %s: %s", ingestion_id, note.model_dump_json()
+            )
+
+    def stats(self) -> dict:
+        return {
+            "depth": self._queue.qsize(),
+            "capacity": self._queue.maxsize,
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "inserted": self.inserted,
+            "retries": self.retries,
+            "failed": self.failed,
+            "batches": self.batches,
+            "journal": self.journal.stats() if self.journal is not None else None,
+        }
@@ -0,0 +1,254 @@
+import asyncio
+import json
+import logging
+import os
+import zlib
+from pathlib import Path
+from typing import BinaryIO
+
+from models.notes import CreateNote
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_PREFIX = "segment-"
+SEGMENT_SUFFIX = ".log"
+# notes given up on, kept for inspection and never replayed
+DEAD_LETTER_FILE = "dead-letter.log"
+
+
+def _encode(record: dict) -> bytes:
+    payload = json.dumps(record, separators=(",", ":")).encode()
+    return b"%08x %s\n" % (zlib.crc32(payload), payload)
+
+
+def _decode(line: bytes) -> dict:
+    """Raises ValueError for a torn or corrupted line."""
+    checksum, _, payload = line.rstrip(b"\n").partition(b" ")
+    if not line.endswith(b"\n") or int(checksum, 16) != zlib.crc32(payload):
+        raise ValueError("checksum mismatch")
+    return json.loads(payload)
+
+
+class WebhookJournal:
+    """
+    Append-only on-disk journal of accepted webhook notes.
+
+    Records go to numbered segment files, one line each, with a CRC so a
+    write torn by a crash is detected on replay. `append` returns only once
+    its record is fsynced, `append_many` once all of its records are.
+    Appends that arrive while an fsync is running are written and synced
+    together with the next one (group commit).
+
+    `mark_persisted` is called once notes are in Postgres and journals an
+    acknowledgement for them. Acknowledgements are always written after
+    their records, so segments are deleted oldest first, and only once
+    every record in them is persisted. Whatever was not acknowledged is
+    returned by `open` on the next start.
+    """
+
+    def __init__(self, directory: str | Path, segment_bytes: int = 16 * 1024 * 1024):
+        self.directory = Path(directory)
+        self.segment_bytes = segment_bytes
+        self._file: BinaryIO | None = None
+        self._active = 0
+        self._active_size = 0
+        # a write to the active segment failed part way
+        self._torn = False
+        # segment number → records not persisted yet, and the reverse lookup
+        self._unpersisted: dict[int, int] = {}
+        self._segment_of: dict[str, int] = {}
+        # acknowledgements are written without a waiting future
+        self._pending: list[tuple[str | None, bytes, asyncio.Future | None]] = []
+        self._wakeup = asyncio.Event()
+        self._committer: asyncio.Task | None = None
+        self._closing = False
+        self.appends = 0
+        self.commits = 0
+        self.dead_lettered = 0
+
+    def _path(self, segment: int) -> Path:
+        return self.directory / f"{SEGMENT_PREFIX}{segment:012d}{SEGMENT_SUFFIX}"
+
+    def _segments(self) -> list[int]:
+        return sorted(
+            int(path.name[len(SEGMENT_PREFIX) : -len(SEGMENT_SUFFIX)])
+            for path in self.directory.glob(f"{SEGMENT_PREFIX}*{SEGMENT_SUFFIX}")
+        )
+
+    async def open(self) -> list[tuple[str, CreateNote]]:
+        """Start the journal and return the records never marked persisted."""
+        recovered = await asyncio.to_thread(self._open)
+        self._committer = asyncio.create_task(self._commit_forever())
+        return recovered
+
+    def _open(self) -> list[tuple[str, CreateNote]]:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        notes: dict[str, tuple[int, CreateNote]] = {}
+        segments = self._segments()
+        for segment in segments:
+            self._unpersisted[segment] = 0
+            for record in self._read(segment):
+                if "note" in record:
+                    notes[record["id"]] = (segment, record["note"])
+                for ingestion_id in record.get("persisted", ()):
+                    notes.pop(ingestion_id, None)
+
+        recovered = []
+        for ingestion_id, (segment, note) in notes.items():
+            self._segment_of[ingestion_id] = segment
+            self._unpersisted[segment] += 1
+            recovered.append((ingestion_id, CreateNote.model_validate(note)))
+        self._compact()
+        # never append to a recovered segment: its tail may be torn
+        self._roll((segments[-1] if segments else 0) + 1)
+        return recovered
+
+    def _read(self, segment: int) -> list[dict]:
+        records = []
+        with open(self._path(segment), "rb") as file:
+            for number, line in enumerate(file, start=1):
+                try:
+                    records.append(_decode(line))
+                except ValueError:
+                    logger.warning(
+                        "Ignoring the rest of %s from line %d: torn record",
+                        self._path(segment).name,
+                        number,
+                    )
+                    break
+        return records
+
+    def _roll(self, segment: int) -> None:
+        if self._file is not None:
+            self._file.close()
+        # unbuffered: a failed write leaves nothing behind to be flushed later
+        self._file = open(self._path(segment), "ab", buffering=0)
+        self._active = segment
+        self._active_size = 0
+        self._torn = False
+        self._unpersisted.setdefault(segment, 0)
+        # make the new file's directory entry durable too
+        directory = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(directory)
+        finally:
+            os.close(directory)
+
+    async def append(self, ingestion_id: str, note: CreateNote) -> None:
+        """Return once the record is on disk."""
+        await self.append_many([(ingestion_id, note)])
+
+    async def append_many(self, records: list[tuple[str, CreateNote]]) -> None:
+        """Return once all the records are on disk, written with one fsync."""
+        future = asyncio.get_running_loop().create_future()
+        for ingestion_id, note in records:
+            line = _encode({"id": ingestion_id, "note": note.model_dump()})
+            self._pending.append((ingestion_id, line, future))
+        self._wakeup.set()
+        await future
+
+    async def _commit_forever(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            batch, self._pending = self._pending, []
+            if batch:
+                await self._commit(batch)
+            if self._closing and not self._pending:
+                return
+
+    async def _commit(self, batch: list) -> None:
+        try:
+            segment = await asyncio.to_thread(
+                self._write, b"".join(line for _, line, _ in batch)
+            )
+        except Exception as e:
+            logger.exception("Writing %d journal records failed", len(batch))
+            for _, _, future in batch:
+                if future is not None and not future.done():
+                    future.set_exception(e)
+            return
+        self.commits += 1
+        for ingestion_id, _, future in batch:
+            if future is None:
+                continue
+            self.appends += 1
+            self._unpersisted[segment] += 1
+            self._segment_of[ingestion_id] = segment
+            if not future.done():
+                future.set_result(None)
+        # the write may have rolled over from a segment that is fully persisted
+        self._compact()
+
+    def _write(self, data: bytes) -> int:
+        if self._torn or self._active_size >= self.segment_bytes:
+            self._roll(self._active + 1)
+        try:
+            view = memoryview(data)
+            while view:
+                view = view[self._file.write(view) :]
+            os.fsync(self._file.fileno())
+        except BaseException:
+            # part of the data may be in the file: replay stops at that torn
+            # line, so nothing more may be appended after it
+            self._torn = True
+            raise
+        self._active_size += len(data)
+        return self._active
+
+    def mark_persisted(self, ingestion_ids: list[str]) -> None:
+        for ingestion_id in ingestion_ids:
+            segment = self._segment_of.pop(ingestion_id, None)
+            if segment is not None:
+                self._unpersisted[segment] -= 1
+        # written with the next group commit; if a crash loses it, they replay
+        self._pending.append((None, _encode({"persisted": ingestion_ids}), None))
+        self._wakeup.set()
+        self._compact()
+
+    async def dead_letter(self, records: list[tuple[str, CreateNote]]) -> None:
+        """
+        Move records that cannot be inserted to the dead-letter file, in the
+        same format as the segments, and take them out of replay.
+        """
+        data = b"".join(
+            _encode({"id": ingestion_id, "note": note.model_dump()})
+            for ingestion_id, note in records
+        )
+        await asyncio.to_thread(self._write_dead_letters, data)
+        self.dead_lettered += len(records)
+        self.mark_persisted([ingestion_id for ingestion_id, _ in records])
+
+    def _write_dead_letters(self, data: bytes) -> None:
+        with open(self.directory / DEAD_LETTER_FILE, "ab") as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+
+    def _compact(self) -> None:
+        """Delete the oldest segments while they are fully persisted."""
+        for segment in sorted(self._unpersisted):
+            if segment == self._active or self._unpersisted[segment]:
+                break
+            del self._unpersisted[segment]
+            self._path(segment).unlink(missing_ok=True)
+
+    async def close(self) -> None:
+        """Finish every append already started, then close the segment."""
+        if self._committer is not None:
+            self._closing = True
+            self._wakeup.set()
+            await self._committer
+            self._committer = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def stats(self) -> dict:
+        return {
+            "segments": len(self._unpersisted),
+            "unpersisted": len(self._segment_of),
+            "appends": self.appends,
+            "commits": self.commits,
+            "dead_lettered": self.dead_lettered,
+        }
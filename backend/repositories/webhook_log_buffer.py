@@ -0,0 +1,127 @@
+import json
+import sys
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Iterator
+
+from models.pagination import KeysetCursor
+from models.webhooks import WebhookLogEntry
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def to_micros(value: datetime) -> int:
+    return (value - _EPOCH) // _MICROSECOND
+
+
+def from_micros(value: int) -> datetime:
+    return _EPOCH + value * _MICROSECOND
+
+
+class WebhookLogRecord:
+    """One log entry: interned source and tags, timestamp in microseconds."""
+
+    __slots__ = ("id", "source", "message", "tags", "received_us")
+
+    def __init__(
+        self, id: int, source: str, message: str, tags: list[str], received_at: datetime
+    ):
+        self.id = id
+        # sources and tags repeat across entries, so each is stored once
+        self.source = sys.intern(source)
+        self.message = message
+        self.tags = tuple(sys.intern(tag) for tag in tags)
+        self.received_us = to_micros(received_at)
+
+    @classmethod
+    def from_entry(cls, entry: WebhookLogEntry) -> "WebhookLogRecord":
+        return cls(entry.id, entry.source, entry.message, entry.tags, entry.received_at)
+
+    def as_log(self) -> dict:
+        """The entry as served by GET /webhooks/log."""
+        return {
+            "id": self.id,
+            "source": self.source,
+            "message": self.message,
+            "tags": list(self.tags),
+            "datetime": from_micros(self.received_us),
+        }
+
+
+@dataclass(frozen=True)
+class LogPage:
+    """A serialized page of the log and the cursor of the page after it."""
+
+    body: bytes
+    next_cursor: str | None
+
+
+class WebhookLogBuffer:
+    """
+    Fixed-capacity ring buffer of log records; the oldest is overwritten.
+
+    Iteration walks the slots in place, newest first, without copying.
+    Serialized unfiltered pages are kept until the next append, so repeated
+    `GET /webhooks/log` calls between webhooks only return cached bytes.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._slots: list[WebhookLogRecord | None] = [None] * capacity
+        self._next = 0
+        self._size = 0
+        self._pages: dict[int, LogPage] = {}
+
+    def __len__(self) -> int:
+        return self._size
+
+    def append(self, record: WebhookLogRecord) -> None:
+        if not self.capacity:
+            return
+        self._slots[self._next] = record
+        self._next = (self._next + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+        self._pages.clear()
+
+    def newest_first(self) -> Iterator[WebhookLogRecord]:
+        for offset in range(1, self._size + 1):
+            yield self._slots[(self._next - offset) % self.capacity]
+
+    def page(self, limit: int) -> LogPage:
+        """The newest `limit` entries as the JSON body FastAPI would send."""
+        page = self._pages.get(limit)
+        if page is None:
+            records = []
+            for record in self.newest_first():
+                if len(records) == limit:
+                    break
+                records.append(record)
+            next_cursor = None
+            if records and len(records) == limit:
+                last = records[-1]
+                next_cursor = KeysetCursor(
+                    position=from_micros(last.received_us), id=last.id
+                ).encode()
+            page = LogPage(_dump(records), next_cursor)
+            self._pages[limit] = page
+        return page
+
+
+def _dump(records: list[WebhookLogRecord]) -> bytes:
+    # same encoding as FastAPI's JSONResponse for the equivalent dicts
+    return json.dumps(
+        [
+            {
+                "id": record.id,
+                "source": record.source,
+                "message": record.message,
+                "tags": record.tags,
+                "datetime": from_micros(record.received_us).isoformat(),
+            }
+            for record in records
+        ],
+        ensure_ascii=False,
+        allow_nan=False,
+        separators=(",", ":"),
+    ).encode()
@@ -0,0 +1,274 @@
+import hashlib
+import os
+import time
+from dataclasses import dataclass
+from typing import Callable
+
+from config.env import env_float, env_int
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    """`rate` tokens per second, up to `burst` saved for bursts."""
+
+    rate: float
+    burst: float
+
+    def __post_init__(self):
+        if self.rate <= 0 or self.burst < 1:
+            raise ValueError("rate must be positive and burst at least 1")
+
+
+def parse_limits(value: str) -> dict[str, RateLimit]:
+    """
+    Parse per-source limits written as `source=rate/burst,...`; the burst
+    defaults to the rate (at least 1).
+    """
+    limits = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        source, _, limit = item.partition("=")
+        rate, _, burst = limit.partition("/")
+        try:
+            rate = float(rate)
+            burst = float(burst) if burst else max(rate, 1)
+            limits[source.strip()] = RateLimit(rate, burst)
+        except ValueError as e:
+            raise RuntimeError(f"Invalid webhook rate limit: {item!r}") from e
+    return limits
+
+
+class _Bucket:
+    __slots__ = ("tokens", "updated", "limit")
+
+    def __init__(self, tokens: float, updated: float, limit: RateLimit):
+        self.tokens = tokens
+        self.updated = updated
+        self.limit = limit
+
+    def level(self, at: float) -> float:
+        refill = (at - self.updated) * self.limit.rate
+        return min(self.limit.burst, self.tokens + refill)
+
+
+class WebhookRateLimiter:
+    """
+    Token buckets per webhook source and per credential.
+
+    Every webhook takes one token from the bucket of its `source` and one
+    from the bucket of the token (or signature) it authenticated with.
+    Buckets refill continuously at their rate and hold at most their burst.
+    A bucket is a dict entry updated in O(1); the `max_buckets` least
+    recently used are kept, since an evicted bucket was likely refilled.
+
+    A token is only taken when both buckets have one, so a webhook turned
+    away by its credential's limit leaves the source's bucket alone.
+
+    This base class keeps buckets per worker process. Shared backends
+    override `_take`; the local buckets then only mirror the levels they
+    last reported, for `stats`.
+    """
+
+    def __init__(
+        self,
+        source_limit: RateLimit | None,
+        credential_limit: RateLimit | None = None,
+        source_limits: dict[str, RateLimit] | None = None,
+        max_buckets: int = 10_000,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.source_limit = source_limit
+        self.credential_limit = credential_limit
+        self.source_limits = source_limits or {}
+        self.max_buckets = max_buckets
+        self.clock = clock
+        self._buckets: dict[str, _Bucket] = {}
+        self.allowed = 0
+        self.limited = 0
+
+    async def check(self, source: str, credential: str | None) -> float:
+        """
+        Take a token for the webhook, or return the seconds until there is
+        one. `credential` is the verified token, or None for signed webhooks.
+        """
+        buckets = []
+        source_limit = self.source_limits.get(source, self.source_limit)
+        if source_limit is not None:
+            buckets.append((f"source:{source}", source_limit))
+        if self.credential_limit is not None:
+            buckets.append((_credential_key(credential), self.credential_limit))
+        retry_after = await self._take(buckets) if buckets else 0.0
+        if retry_after:
+            self.limited += 1
+            return retry_after
+        self.allowed += 1
+        return 0.0
+
+    async def _take(self, buckets: list[tuple[str, RateLimit]]) -> float:
+        """
+        Take one token from every bucket, or from none of them when one is
+        empty: a webhook turned away by one limit must not drain the other.
+        Returns the seconds until every bucket has a token (0 if taken).
+        """
+        at = self.clock()
+        entries = [(self._bucket(key, limit, at), limit) for key, limit in buckets]
+        levels = [bucket.level(at) for bucket, _ in entries]
+        retry_after = max(
+            (
+                (1 - tokens) / limit.rate
+                for (_, limit), tokens in zip(entries, levels)
+                if tokens < 1
+            ),
+            default=0.0,
+        )
+        for (bucket, _), tokens in zip(entries, levels):
+            bucket.tokens = tokens if retry_after else tokens - 1
+            bucket.updated = at
+        return retry_after
+
+    def _bucket(self, key: str, limit: RateLimit, at: float) -> _Bucket:
+        """The key's bucket, moved to the most recently used end."""
+        bucket = self._buckets.pop(key, None)
+        if bucket is None:
+            bucket = _Bucket(limit.burst, at, limit)
+            if len(self._buckets) >= self.max_buckets:
+                del self._buckets[next(iter(self._buckets))]
+        bucket.limit = limit
+        self._buckets[key] = bucket
+        return bucket
+
+    async def stop(self) -> None:
+        pass
+
+    def stats(self) -> dict:
+        at = self.clock()
+        return {
+            "allowed": self.allowed,
+            "limited": self.limited,
+            "buckets": {
+                key: {
+                    "tokens": round(bucket.level(at), 3),
+                    "rate": bucket.limit.rate,
+                    "burst": bucket.limit.burst,
+                }
+                for key, bucket in self._buckets.items()
+            },
+        }
+
+
+def _credential_key(credential: str | None) -> str:
+    if credential is None:
+        return "credential:signature"
+    # never keep or expose the token itself
+    return "credential:" + hashlib.sha256(credential.encode()).hexdigest()[:12]
+
+
+# refills the buckets in KEYS and, if every one has a token, takes one from
+# each, atomically with the Redis clock; ARGV holds a rate and a burst per
+# key. Returns the seconds to wait (0 if tokens were taken) and the tokens
+# left per key, as strings since Redis truncates Lua numbers to integers
+TAKE_SCRIPT = """
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local levels = {}
+local retry_after = 0
+for i, key in ipairs(KEYS) do
+  local rate = tonumber(ARGV[2 * i - 1])
+  local burst = tonumber(ARGV[2 * i])
+  local state = redis.call('HMGET', key, 'tokens', 'updated')
+  local tokens = tonumber(state[1]) or burst
+  local updated = tonumber(state[2]) or now
+  tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+  if tokens < 1 then
+    retry_after = math.max(retry_after, (1 - tokens) / rate)
+  end
+  levels[i] = tokens
+end
+local result = {tostring(retry_after)}
+for i, key in ipairs(KEYS) do
+  local rate = tonumber(ARGV[2 * i - 1])
+  local burst = tonumber(ARGV[2 * i])
+  local tokens = levels[i]
+  if retry_after == 0 then
+    tokens = tokens - 1
+  end
+  redis.call('HSET', key, 'tokens', tostring(tokens), 'updated', tostring(now))
+  redis.call('PEXPIRE', key, math.ceil(burst / rate * 1000) + 1000)
+  result[i + 1] = tostring(tokens)
+end
+return result
+"""
+
+
+class RedisWebhookRateLimiter(WebhookRateLimiter):
+    """
+    Buckets shared by all workers through Redis (or any client with the same
+    eval API). Each check is one EVAL of TAKE_SCRIPT over both of its
+    buckets, so concurrent workers never race on a bucket, and idle buckets
+    expire once they are full.
+    """
+
+    def __init__(self, client, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.client = client
+
+    async def _take(self, buckets: list[tuple[str, RateLimit]]) -> float:
+        limits = [value for _, limit in buckets for value in (limit.rate, limit.burst)]
+        retry_after, *levels = await self.client.eval(
+            TAKE_SCRIPT,
+            len(buckets),
+            *(f"webhook-rate:{key}" for key, _ in buckets),
+            *limits,
+        )
+        at = self.clock()
+        for (key, limit), tokens in zip(buckets, levels):
+            bucket = self._bucket(key, limit, at)
+            bucket.tokens, bucket.updated = float(tokens), at
+        return float(retry_after)
+
+    async def stop(self) -> None:
+        await self.client.aclose()
+
+
+def create_webhook_rate_limiter() -> WebhookRateLimiter | None:
+    """
+    Build the limiter configured by WEBHOOK_SOURCE_RATE, WEBHOOK_SOURCE_LIMITS
+    and WEBHOOK_CREDENTIAL_RATE; None if none of them is set.
+    """
+    source_rate = env_float("WEBHOOK_SOURCE_RATE", 0)
+    source_limit = (
+        RateLimit(source_rate, env_float("WEBHOOK_SOURCE_BURST", max(source_rate, 1)))
+        if source_rate > 0
+        else None
+    )
+    credential_rate = env_float("WEBHOOK_CREDENTIAL_RATE", 0)
+    credential_limit = (
+        RateLimit(
+            credential_rate,
+            env_float("WEBHOOK_CREDENTIAL_BURST", max(credential_rate, 1)),
+        )
+        if credential_rate > 0
+        else None
+    )
+    source_limits = parse_limits(os.getenv("WEBHOOK_SOURCE_LIMITS", ""))
+    if source_limit is None and credential_limit is None and not source_limits:
+        return None
+    args = (source_limit, credential_limit, source_limits)
+    max_buckets = env_int("WEBHOOK_RATE_MAX_BUCKETS", 10_000)
+
+    backend = os.getenv("WEBHOOK_RATE_BACKEND", "memory")
+    if backend == "memory":
+        return WebhookRateLimiter(*args, max_buckets=max_buckets)
+    if backend == "redis":
+        try:
+            from redis.asyncio import Redis
+        except ImportError as e:
+            raise RuntimeError(
+                "WEBHOOK_RATE_BACKEND=redis requires the redis package"
+            ) from e
+        redis_url = os.getenv("REDIS_URL")
+        if not redis_url:
+            raise RuntimeError("REDIS_URL environment variable is not set")
+        return RedisWebhookRateLimiter(
+            Redis.from_url(redis_url), *args, max_buckets=max_buckets
+        )
+    raise RuntimeError(f"Unknown WEBHOOK_RATE_BACKEND: {backend}")
@@ -1,15 +1,353 @@
+import asyncio
+import logging
+import os
+import time
 from collections import deque
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import Callable, Iterable
 
+from sqlalchemy import delete, insert, tuple_
+from sqlmodel import col, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from config.db_config import get_engine
+from config.env import env_float, env_int
 from config.now import now
-from models.webhooks import WebhookNote
+from models.pagination import KeysetCursor
+from models.webhooks import WebhookLogEntry, WebhookNote
+from repositories.webhook_log_buffer import (
+    LogPage,
+    WebhookLogBuffer,
+    WebhookLogRecord,
+    to_micros,
+)
+
+logger = logging.getLogger(__name__)
+
+# expired entries deleted per statement, so a sweep never holds long locks
+SWEEP_BATCH_SIZE = 10_000
+
+
+def _matching(
+    records: Iterable[WebhookLogRecord],
+    source: str | None,
+    since: datetime | None,
+    until: datetime | None,
+    tags: list[str] | None,
+    cursor: KeysetCursor | None,
+) -> Iterable[WebhookLogRecord]:
+    """Filter newest-first log records like the webhook_log query does."""
+    since_us = to_micros(since) if since is not None else None
+    until_us = to_micros(until) if until is not None else None
+    after = (to_micros(cursor.position), cursor.id) if cursor else None
+    for record in records:
+        if source is not None and record.source != source:
+            continue
+        if since_us is not None and record.received_us < since_us:
+            continue
+        if until_us is not None and record.received_us >= until_us:
+            continue
+        if tags and not set(tags).issubset(record.tags):
+            continue
+        if after and (record.received_us, record.id) >= after:
+            continue
+        yield record
 
 
 class WebhookRepository:
-    def __init__(self):
-        self.logs: deque = deque(maxlen=20)
+    """
+    Log of received webhooks, newest first.
+
+    This base class keeps only the last `capacity` entries of this process
+    in memory; PostgresWebhookRepository persists every entry.
+    """
+
+    def __init__(self, capacity: int = 20):
+        self.logs = WebhookLogBuffer(capacity)
+        self._next_id = 1
+
+    async def log(self, note: WebhookNote) -> None:
+        self.logs.append(
+            WebhookLogRecord(self._next_id, note.source, note.message, note.tags, now())
+        )
+        self._next_id += 1
+
+    async def log_many(self, notes: list[WebhookNote]) -> None:
+        for note in notes:
+            await self.log(note)
+
+    async def get_all(
+        self,
+        source: str | None = None,
+        since: datetime | None = None,
+        until: datetime | None = None,
+        tags: list[str] | None = None,
+        limit: int = 20,
+        cursor: KeysetCursor | None = None,
+    ) -> list[dict]:
+        newest = self.logs.newest_first()
+        records = _matching(newest, source, since, until, tags, cursor)
+        return [record.as_log() for record in islice(records, limit)]
+
+    async def get_page(self, limit: int) -> LogPage | None:
+        """The newest `limit` entries, serialized, if they are in memory."""
+        return self.logs.page(limit)
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+
+class PostgresWebhookRepository(WebhookRepository):
+    """
+    Webhook log shared by all workers through the webhook_log table.
+
+    The newest `tail_size` entries are also kept in memory (the hot tail),
+    reloaded from the table at most every `tail_ttl` seconds and extended
+    by this worker's own writes in between. A listing without a cursor is
+    answered from the tail whenever the tail holds its whole page, so the
+    common "what came in lately" request does not touch the database;
+    entries written by other workers show up there after at most
+    `tail_ttl` seconds. Entries older than `retention` seconds are swept.
+
+    Logging never waits for the database: entries are buffered and a
+    background task inserts them with one multi-row INSERT per batch of
+    up to `batch_size`, at the latest `flush_interval` seconds after the
+    first one was logged. A failed insert is retried with the next flush.
+    At most `max_pending` entries wait; beyond that the oldest are dropped
+    and counted, since the log is not worth failing or slowing a webhook.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], AsyncSession],
+        tail_size: int = 1000,
+        tail_ttl: float = 5,
+        retention: float = 30 * 86400,
+        sweep_interval: float = 3600,
+        batch_size: int = 500,
+        flush_interval: float = 0.5,
+        max_pending: int = 10_000,
+    ):
+        super().__init__(tail_size)
+        self.session_factory = session_factory
+        self.tail_ttl = tail_ttl
+        self.retention = retention
+        self.sweep_interval = sweep_interval
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending: deque[dict] = deque()
+        self._wakeup = asyncio.Event()
+        self._flusher: asyncio.Task | None = None
+        self.dropped = 0
+        self._tail_loaded_at: float | None = None
+        # whether the tail held the entire table when it was loaded
+        self._tail_complete = False
+        self._tail_lock = asyncio.Lock()
+        self._sweeper: asyncio.Task | None = None
+
+    async def log(self, note: WebhookNote) -> None:
+        self._buffer([note])
+
+    async def log_many(self, notes: list[WebhookNote]) -> None:
+        self._buffer(notes)
+
+    def _buffer(self, notes: list[WebhookNote]) -> None:
+        received_at = now()
+        for note in notes:
+            if len(self._pending) >= self.max_pending:
+                self._pending.popleft()
+                self.dropped += 1
+            self._pending.append({**note.model_dump(), "received_at": received_at})
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+
+    async def flush(self) -> None:
+        """Insert the buffered entries, one INSERT ... RETURNING per batch."""
+        while self._pending:
+            batch = [
+                self._pending.popleft()
+                for _ in range(min(self.batch_size, len(self._pending)))
+            ]
+            try:
+                await self._insert(batch)
+            except BaseException:
+                # back in front of anything logged meanwhile, for the next flush
+                self._pending.extendleft(reversed(batch))
+                while len(self._pending) > self.max_pending:
+                    self._pending.popleft()
+                    self.dropped += 1
+                raise
+
+    async def _insert(self, rows: list[dict]) -> None:
+        statement = insert(WebhookLogEntry).returning(
+            WebhookLogEntry, sort_by_parameter_order=True
+        )
+        async with self.session_factory() as session:
+            entries = await session.scalars(statement, rows)
+            records = [WebhookLogRecord.from_entry(entry) for entry in entries.all()]
+            await session.commit()
+        for record in records:
+            self.logs.append(record)
+
+    async def _flush_forever(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception(
+                    "Inserting %d webhook log entries failed", len(self._pending)
+                )
+
+    async def get_all(
+        self,
+        source: str | None = None,
+        since: datetime | None = None,
+        until: datetime | None = None,
+        tags: list[str] | None = None,
+        limit: int = 20,
+        cursor: KeysetCursor | None = None,
+    ) -> list[dict]:
+        if cursor is None and limit <= self.logs.capacity:
+            await self._refresh_tail()
+            page = await super().get_all(source, since, until, tags, limit)
+            # a short page is only final if nothing older was left out
+            if len(page) == limit or self._tail_is_complete():
+                return page
+
+        statement = select(WebhookLogEntry)
+        if source is not None:
+            statement = statement.where(col(WebhookLogEntry.source) == source)
+        if since is not None:
+            statement = statement.where(col(WebhookLogEntry.received_at) >= since)
+        if until is not None:
+            statement = statement.where(col(WebhookLogEntry.received_at) < until)
+        if tags:
+            statement = statement.where(col(WebhookLogEntry.tags).contains(tags))
+        if cursor is not None:
+            statement = statement.where(
+                tuple_(col(WebhookLogEntry.received_at), col(WebhookLogEntry.id))
+                < tuple_(cursor.position, cursor.id)
+            )
+        statement = statement.order_by(
+            col(WebhookLogEntry.received_at).desc(), col(WebhookLogEntry.id).desc()
+        ).limit(limit)
+        async with self.session_factory() as session:
+            entries = await session.exec(statement)
+            return [entry.as_log() for entry in entries.all()]
+
+    async def get_page(self, limit: int) -> LogPage | None:
+        if limit > self.logs.capacity:
+            return None
+        await self._refresh_tail()
+        if len(self.logs) >= limit or self._tail_is_complete():
+            return self.logs.page(limit)
+        return None
+
+    def _tail_is_complete(self) -> bool:
+        """Whether the tail still holds every row the table had at load."""
+        return self._tail_complete and len(self.logs) < self.logs.capacity
+
+    async def _refresh_tail(self) -> None:
+        async with self._tail_lock:
+            loaded_at = self._tail_loaded_at
+            if loaded_at is not None and time.monotonic() - loaded_at < self.tail_ttl:
+                return
+            statement = (
+                select(WebhookLogEntry)
+                .order_by(
+                    col(WebhookLogEntry.received_at).desc(),
+                    col(WebhookLogEntry.id).desc(),
+                )
+                .limit(self.logs.capacity)
+            )
+            async with self.session_factory() as session:
+                entries = (await session.exec(statement)).all()
+            tail = WebhookLogBuffer(self.logs.capacity)
+            for entry in reversed(entries):
+                tail.append(WebhookLogRecord.from_entry(entry))
+            self.logs = tail
+            self._tail_complete = len(entries) < tail.capacity
+            self._tail_loaded_at = time.monotonic()
+
+    async def sweep(self) -> int:
+        """Delete entries past the retention period; returns how many."""
+        cutoff = now() - timedelta(seconds=self.retention)
+        expired = (
+            select(col(WebhookLogEntry.id))
+            .where(col(WebhookLogEntry.received_at) < cutoff)
+            .limit(SWEEP_BATCH_SIZE)
+        )
+        statement = delete(WebhookLogEntry).where(
+            col(WebhookLogEntry.id).in_(expired.scalar_subquery())
+        )
+        removed = 0
+        while True:
+            async with self.session_factory() as session:
+                result = await session.execute(statement)
+                await session.commit()
+            removed += result.rowcount
+            if result.rowcount < SWEEP_BATCH_SIZE:
+                break
+        cutoff_us = to_micros(cutoff)
+        tail = WebhookLogBuffer(self.logs.capacity)
+        for record in reversed(list(self.logs.newest_first())):
+            if record.received_us >= cutoff_us:
+                tail.append(record)
+        self.logs = tail
+        return removed
+
+    async def start(self) -> None:
+        self._flusher = asyncio.create_task(self._flush_forever())
+        if self.retention > 0:
+            self._sweeper = asyncio.create_task(self._sweep_forever())
+
+    async def stop(self) -> None:
+        if self._sweeper:
+            self._sweeper.cancel()
+        if self._flusher:
+            self._flusher.cancel()
+            await asyncio.gather(self._flusher, return_exceptions=True)
+            self._flusher = None
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception(
+                "Dropping %d unwritten webhook log entries", len(self._pending)
+            )
+
+    async def _sweep_forever(self) -> None:
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                await self.sweep()
+            except Exception:
+                logger.exception("Sweeping expired webhook log entries failed")
 
-    def log(self, note: WebhookNote) -> None:
-        self.logs.append({**note.model_dump(), "datetime": now()})
 
-    async def get_all(self) -> list[dict]:
-        return list(self.logs)
+def create_webhook_repository() -> WebhookRepository:
+    """Build the log selected by WEBHOOK_LOG_BACKEND (postgres by default)."""
+    backend = os.getenv("WEBHOOK_LOG_BACKEND", "postgres")
+    if backend == "memory":
+        return WebhookRepository(env_int("WEBHOOK_LOG_CAPACITY", 20))
+    if backend == "postgres":
+        return PostgresWebhookRepository(
+            lambda: AsyncSession(get_engine()),
+            tail_size=env_int("WEBHOOK_LOG_TAIL_SIZE", 1000),
+            tail_ttl=env_float("WEBHOOK_LOG_TAIL_TTL_SECONDS", 5),
+            retention=env_float("WEBHOOK_LOG_RETENTION_DAYS", 30) * 86400,
+            sweep_interval=env_float("WEBHOOK_LOG_SWEEP_SECONDS", 3600),
+            batch_size=env_int("WEBHOOK_LOG_BATCH_SIZE", 500),
+            flush_interval=env_float("WEBHOOK_LOG_FLUSH_SECONDS", 0.5),
+            max_pending=env_int("WEBHOOK_LOG_BUFFER_SIZE", 10_000),
+        )
+    raise RuntimeError(f"Unknown WEBHOOK_LOG_BACKEND: {backend}")
@@ -0,0 +1,39 @@
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from models.notes import Note
+
+# AsyncSession methods that each cost one database round trip
+ROUND_TRIP_METHODS = ("exec", "execute", "scalars", "scalar", "get", "refresh")
+
+
+@pytest.fixture()
+def recording_session():
+    """
+    AsyncSession stand-in for a real NoteRepository that counts round trips.
+
+    Every statement returns the same stored note; `session.round_trips()`
+    is the number of statements issued so far (commits not included).
+    """
+    note = Note(
+        id=1,
+        title="Stored",
+        content="",
+        tags=[],
+        created_at=datetime(2026, 1, 1, 12, 0, 0),
+        updated_at=datetime(2026, 1, 1, 12, 0, 0),
+    )
+    result = MagicMock()
+    result.one.return_value = note
+    result.one_or_none.return_value = note
+
+    session = AsyncMock()
+    session.get.return_value = note
+    session.scalars.return_value = result
+    session.scalar.return_value = note.id
+    session.round_trips = lambda: sum(
+        getattr(session, name).await_count for name in ROUND_TRIP_METHODS
+    )
+    return session
@@ -0,0 +1,248 @@
+import json
+import logging
+import sqlite3
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+from config.db_config import _create_trigram_indexes, create_db
+from config.db_pool import (
+    CHECKED_OUT,
+    PoolMetricsMixin,
+    pool_metrics,
+    pool_status,
+    session_metrics,
+)
+from config.di import (
+    get_note_cache,
+    get_webhook_deduper,
+    get_webhook_queue,
+    get_webhook_rate_limiter,
+    get_webhook_repo,
+)
+from config.query_log import QueryLog, fingerprint
+from main import app
+
+
+def engine_with(conn) -> MagicMock:
+    """AsyncEngine mock whose begin() yields the given connection."""
+    engine = MagicMock()
+    engine.begin.return_value.__aenter__.return_value = conn
+    return engine
+
+
+class TestTrigramIndexes:
+
+    # extension available → extension and both indexes are created
+    @pytest.mark.asyncio
+    async def test_creates_extension_and_indexes(self):
+        conn = AsyncMock()
+
+        assert await _create_trigram_indexes(engine_with(conn)) is True
+
+        statements = [str(call.args[0]) for call in conn.execute.await_args_list]
+        assert statements[0] == "CREATE EXTENSION IF NOT EXISTS pg_trgm"
+        assert any("title gin_trgm_ops" in s for s in statements)
+        assert any("content gin_trgm_ops" in s for s in statements)
+
+    # extension cannot be installed → fall back to plain ILIKE
+    @pytest.mark.asyncio
+    async def test_falls_back_when_extension_unavailable(self, caplog):
+        conn = AsyncMock()
+        conn.execute.side_effect = DBAPIError(
+            "CREATE EXTENSION", None, Exception("permission denied")
+        )
+
+        assert await _create_trigram_indexes(engine_with(conn)) is False
+        assert "pg_trgm is unavailable" in caplog.text
+
+
+class TestNoteChangedTrigger:
+
+    @staticmethod
+    async def statements(environ: dict) -> list[str]:
+        conn = AsyncMock()
+        engine = engine_with(AsyncMock())
+        engine.connect.return_value.__aenter__.return_value = conn
+        with (
+            patch.dict("os.environ", environ),
+            patch("config.db_config.get_engine", return_value=engine),
+        ):
+            await create_db()
+        return [call.args[0] for call in conn.exec_driver_sql.await_args_list]
+
+    # NOTE_CACHE_NOTIFY installs the trigger
+    @pytest.mark.asyncio
+    async def test_installs_trigger_when_enabled(self):
+        statements = await self.statements({"NOTE_CACHE_NOTIFY": "true"})
+
+        assert any(s.startswith("CREATE TRIGGER note_changed") for s in statements)
+
+    # a worker without the flag leaves the trigger alone for the others
+    @pytest.mark.asyncio
+    async def test_leaves_trigger_when_disabled(self):
+        statements = await self.statements({"NOTE_CACHE_NOTIFY": "false"})
+
+        assert not any("note_changed" in s for s in statements)
+
+
+class InstrumentedQueuePool(PoolMetricsMixin, QueuePool):
+    """Synchronous pool with the same instrumentation, for tests."""
+
+
+@pytest.fixture()
+def pool():
+    """One-connection pool with no overflow and a very short timeout."""
+    pool = InstrumentedQueuePool(
+        lambda: sqlite3.connect(":memory:"), pool_size=1, max_overflow=0, timeout=0.01
+    )
+    yield pool
+    pool.dispose()
+
+
+class TestPoolMetrics:
+
+    # checkouts and a timed-out wait are both counted
+    def test_records_checkouts_and_timeouts(self, pool):
+        checkouts, timeouts = pool_metrics.checkouts, pool_metrics.timeouts
+
+        conn = pool.connect()
+        with pytest.raises(PoolTimeoutError):
+            pool.connect()
+
+        assert pool_metrics.checkouts == checkouts + 1
+        assert pool_metrics.timeouts == timeouts + 1
+        assert pool_metrics.wait_seconds_max >= 0.01
+        conn.close()
+
+    # the status reflects connections currently in use
+    def test_status_reports_checked_out_connections(self, pool):
+        conn = pool.connect()
+
+        status = pool_status(pool)
+
+        assert status["pool_size"] == 1
+        assert status["checked_out"] == 1
+        assert status["max_overflow"] == 0
+        conn.close()
+        assert pool_status(pool)["checked_out"] == 0
+
+    # the pool is exposed over HTTP
+    def test_metrics_endpoint(self, pool):
+        engine = MagicMock(pool=pool)
+        with patch("controllers.metrics_controller.get_engine", return_value=engine):
+            response = TestClient(app).get("/metrics/db-pool")
+
+        assert response.status_code == 200
+        assert response.json()["pool_size"] == 1
+
+
+class TestSessionMetrics:
+
+    # a session is flagged once its first statement checks out a connection
+    def test_flags_session_on_first_statement(self, sqlite_engine):
+        with Session(sqlite_engine) as session:
+            assert CHECKED_OUT not in session.info
+            session.execute(text("SELECT 1"))
+            assert session.info[CHECKED_OUT] is True
+
+    # an invalid webhook payload opens a request session but never checks out
+    def test_rejected_webhook_counts_without_checkout(self, monkeypatch):
+        monkeypatch.setenv("WEBHOOK_TOKEN", "secret")
+        # never connects: asyncpg would fail on the first checkout
+        engine = create_async_engine("postgresql+asyncpg://nobody@127.0.0.1:1/none")
+        app.dependency_overrides[get_note_cache] = lambda: None
+        app.dependency_overrides[get_webhook_repo] = lambda: None
+        app.dependency_overrides[get_webhook_queue] = lambda: None
+        app.dependency_overrides[get_webhook_rate_limiter] = lambda: None
+        app.dependency_overrides[get_webhook_deduper] = lambda: None
+        before = (
+            session_metrics.sessions_with_checkout,
+            session_metrics.sessions_without_checkout,
+        )
+        try:
+            with patch("config.di.get_engine", return_value=engine):
+                response = TestClient(app).post(
+                    "/webhooks/note",
+                    json={"source": "ci"},
+                    headers={"X-Webhook-Token": "secret"},
+                )
+        finally:
+            app.dependency_overrides.clear()
+
+        assert response.status_code == 422
+        assert session_metrics.sessions_with_checkout == before[0]
+        assert session_metrics.sessions_without_checkout == before[1] + 1
+        assert engine.sync_engine.pool.checkedout() == 0
+
+    # the counts are part of the pool status
+    def test_status_reports_session_counts(self, pool):
+        status = pool_status(pool)
+
+        assert "sessions_with_checkout" in status
+        assert "sessions_without_checkout" in status
+
+
+@pytest.fixture()
+def sqlite_engine():
+    engine = create_engine("sqlite://")
+    yield engine
+    engine.dispose()
+
+
+def logged_queries(caplog) -> list[dict]:
+    return [
+        json.loads(record.message)
+        for record in caplog.records
+        if record.name == "config.query_log"
+    ]
+
+
+class TestQueryLog:
+
+    # sampled statements are logged as JSON with fingerprint, timing and rows
+    def test_logs_structured_record(self, sqlite_engine, caplog):
+        QueryLog(sample_rate=1.0, slow_ms=10_000).install(sqlite_engine)
+
+        with caplog.at_level(logging.INFO), sqlite_engine.connect() as conn:
+            conn.execute(text("SELECT 1 WHERE 'secret' = 'secret'"))
+
+        [record] = logged_queries(caplog)
+        assert record["statement"] == "SELECT ? WHERE ? = ?"
+        assert len(record["fingerprint"]) == 12
+        assert record["duration_ms"] >= 0
+        assert record["slow"] is False
+        assert "rows" in record
+
+    # with sampling off, only slow statements are logged
+    def test_unsampled_fast_queries_are_skipped(self, sqlite_engine, caplog):
+        QueryLog(sample_rate=0.0, slow_ms=10_000).install(sqlite_engine)
+
+        with caplog.at_level(logging.INFO), sqlite_engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+
+        assert logged_queries(caplog) == []
+
+    # slow statements bypass sampling and are logged as warnings
+    def test_slow_queries_are_always_logged(self, sqlite_engine, caplog):
+        QueryLog(sample_rate=0.0, slow_ms=0).install(sqlite_engine)
+
+        with caplog.at_level(logging.INFO), sqlite_engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+
+        [record] = logged_queries(caplog)
+        assert record["slow"] is True
+        assert caplog.records[-1].levelno == logging.WARNING
+
+    # statements differing only in literals share a fingerprint
+    def test_fingerprint_ignores_literals_and_whitespace(self):
+        assert fingerprint("SELECT *  FROM note WHERE id = 1")[1] == fingerprint(
+            "SELECT * FROM note\nWHERE id = 42"
+        )[1]
@@ -0,0 +1,373 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from sqlalchemy.dialects.postgresql.asyncpg import dialect as asyncpg_dialect
+
+from repositories.idempotency_repository import (
+    PENDING,
+    RELEASE_SCRIPT,
+    IdempotencyKeyInUse,
+    IdempotencyStore,
+    PostgresIdempotencyStore,
+    RedisIdempotencyStore,
+    create_idempotency_store,
+)
+
+
+class FakeRedis:
+    """Local stand-in for the subset of redis.asyncio.Redis the store uses."""
+
+    def __init__(self):
+        self.data: dict[str, bytes] = {}
+        self.expiry: dict[str, int] = {}
+
+    async def get(self, name: str) -> bytes | None:
+        return self.data.get(name)
+
+    async def set(self, name: str, value: bytes, ex: int, nx: bool) -> bool | None:
+        if nx and name in self.data:
+            return None
+        self.data[name] = value
+        self.expiry[name] = ex
+        return True
+
+    async def eval(self, script: str, numkeys: int, name: str, *args) -> int:
+        """SAVE_SCRIPT or RELEASE_SCRIPT, applied to the data kept here."""
+        current = self.data.get(name)
+        if script == RELEASE_SCRIPT:
+            if current == PENDING:
+                del self.data[name]
+            return 0
+        if current:
+            return 0
+        response, ex = args
+        self.data[name] = response
+        self.expiry[name] = ex
+        return 1
+
+    async def aclose(self) -> None:
+        pass
+
+
+@pytest.fixture()
+def session():
+    """AsyncSession mock handed out by the store's session factory."""
+    session = AsyncMock()
+    session.__aenter__.return_value = session
+    return session
+
+
+def sql(statement) -> str:
+    return str(statement.compile(dialect=asyncpg_dialect()))
+
+
+class TestInMemoryStore:
+
+    # a stored response is returned for the same scope and key only
+    @pytest.mark.asyncio
+    async def test_get_returns_stored_response(self):
+        store = IdempotencyStore(maxsize=10, ttl=60)
+
+        await store.put("create", "k1", b'{"id": 1}')
+
+        assert await store.get("create", "k1") == b'{"id": 1}'
+        assert await store.get("update", "k1") is None
+        assert await store.get("create", "k2") is None
+
+    # memory is bounded by maxsize
+    @pytest.mark.asyncio
+    async def test_store_is_bounded(self):
+        store = IdempotencyStore(maxsize=2, ttl=60)
+
+        for i in range(3):
+            await store.put("create", f"k{i}", b"{}")
+
+        assert len(store._local) == 2
+
+    # entries expire after ttl
+    @pytest.mark.asyncio
+    async def test_entries_expire(self):
+        store = IdempotencyStore(maxsize=10, ttl=0.01)
+
+        await store.put("create", "k1", b"{}")
+        await asyncio.sleep(0.02)
+
+        assert await store.get("create", "k1") is None
+
+
+class TestRedisStore:
+
+    # a key stored by one worker is visible to another
+    @pytest.mark.asyncio
+    async def test_keys_are_shared_between_workers(self):
+        redis = FakeRedis()
+        worker_a = RedisIdempotencyStore(redis, maxsize=10, ttl=60)
+        worker_b = RedisIdempotencyStore(redis, maxsize=10, ttl=60)
+
+        await worker_a.put("create", "k1", b'{"id": 1}')
+
+        assert await worker_b.get("create", "k1") == b'{"id": 1}'
+        assert redis.expiry["idempotency:create:k1"] == 60
+
+    # the first response stored for a key wins
+    @pytest.mark.asyncio
+    async def test_first_response_wins(self):
+        redis = FakeRedis()
+
+        await RedisIdempotencyStore(redis, 10, 60).put("create", "k1", b"first")
+        await RedisIdempotencyStore(redis, 10, 60).put("create", "k1", b"second")
+
+        store = RedisIdempotencyStore(redis, 10, 60)
+        assert await store.get("create", "k1") == b"first"
+
+    # hits after the first lookup are served locally
+    @pytest.mark.asyncio
+    async def test_hits_are_cached_locally(self):
+        redis = FakeRedis()
+        await RedisIdempotencyStore(redis, 10, 60).put("create", "k1", b"{}")
+        store = RedisIdempotencyStore(redis, 10, 60)
+
+        await store.get("create", "k1")
+        redis.data.clear()
+
+        assert await store.get("create", "k1") == b"{}"
+
+
+class TestSharedClaims:
+
+    @staticmethod
+    def slow_create(release: asyncio.Event, calls: list, response: bytes = b"{}"):
+        async def create() -> bytes:
+            calls.append(1)
+            await release.wait()
+            return response
+
+        return create
+
+    # a retry on another worker waits for the first request's response
+    @pytest.mark.asyncio
+    async def test_retry_on_other_worker_waits(self):
+        redis = FakeRedis()
+        worker_a = RedisIdempotencyStore(redis, 10, 60, poll_interval=0.001)
+        worker_b = RedisIdempotencyStore(redis, 10, 60, poll_interval=0.001)
+        release, calls = asyncio.Event(), []
+        create = self.slow_create(release, calls, b'{"id": 1}')
+
+        first = asyncio.create_task(worker_a.get_or_create("create", "k1", create))
+        await asyncio.sleep(0)
+        retry = asyncio.create_task(worker_b.get_or_create("create", "k1", create))
+        await asyncio.sleep(0.01)
+        release.set()
+
+        assert await first == await retry == b'{"id": 1}'
+        assert calls == [1]
+
+    # a retry gives up once the claim is held longer than `wait`
+    @pytest.mark.asyncio
+    async def test_retry_gives_up_after_wait(self):
+        redis = FakeRedis()
+        redis.data["idempotency:create:k1"] = PENDING
+        store = RedisIdempotencyStore(redis, 10, 60, wait=0.01, poll_interval=0.001)
+        calls = []
+
+        with pytest.raises(IdempotencyKeyInUse):
+            await store.get_or_create(
+                "create", "k1", self.slow_create(asyncio.Event(), calls)
+            )
+        assert calls == []
+
+    # a failed request releases its claim, so the retry creates
+    @pytest.mark.asyncio
+    async def test_failure_releases_claim(self):
+        redis = FakeRedis()
+        store = RedisIdempotencyStore(redis, 10, 60)
+
+        async def fail() -> bytes:
+            raise ValueError("insert failed")
+
+        with pytest.raises(ValueError):
+            await store.get_or_create("create", "k1", fail)
+        assert "idempotency:create:k1" not in redis.data
+
+        release = asyncio.Event()
+        release.set()
+        assert await store.get_or_create(
+            "create", "k1", self.slow_create(release, [])
+        ) == b"{}"
+
+    # a failed save keeps the claim, so a retry elsewhere cannot create again
+    @pytest.mark.asyncio
+    async def test_failed_save_keeps_claim(self):
+        redis = FakeRedis()
+        store = RedisIdempotencyStore(redis, 10, 60)
+        redis.eval = AsyncMock(side_effect=ConnectionError("redis went away"))
+        release, calls = asyncio.Event(), []
+        release.set()
+
+        with pytest.raises(ConnectionError):
+            await store.get_or_create("create", "k1", self.slow_create(release, calls))
+
+        assert redis.data["idempotency:create:k1"] == PENDING
+        other = RedisIdempotencyStore(redis, 10, 60, wait=0.01, poll_interval=0.001)
+        with pytest.raises(IdempotencyKeyInUse):
+            await other.get_or_create("create", "k1", self.slow_create(release, calls))
+        assert calls == [1]
+
+
+class TestPostgresStore:
+
+    # a response only replaces a pending claim or an expired row
+    @pytest.mark.asyncio
+    async def test_put_fills_pending_claim(self, session):
+        store = PostgresIdempotencyStore(lambda: session, 10, 60, sweep_interval=60)
+
+        await store.put("create", "k1", b"{}")
+
+        statement = session.execute.await_args.args[0]
+        assert "ON CONFLICT (key) DO UPDATE" in sql(statement)
+        assert "WHERE idempotency_key.response = " in sql(statement)
+        assert statement.compile().params["key"] == "create:k1"
+        session.commit.assert_awaited_once()
+
+    # a claim inserts a pending row or takes over an expired one
+    @pytest.mark.asyncio
+    async def test_claim_inserts_pending_row(self, session):
+        session.scalar.return_value = None
+        store = PostgresIdempotencyStore(lambda: session, 10, 60, sweep_interval=60)
+
+        assert not await store._claim("create", "k1")
+        statement = session.scalar.await_args.args[0]
+        assert "ON CONFLICT (key) DO UPDATE" in sql(statement)
+        assert "WHERE idempotency_key.expires_at <= " in sql(statement)
+        assert statement.compile().params["response"] == PENDING
+
+    # a local miss reads the unexpired row from the table
+    @pytest.mark.asyncio
+    async def test_get_reads_unexpired_row(self, session):
+        session.scalar.return_value = b'{"id": 1}'
+        store = PostgresIdempotencyStore(lambda: session, 10, 60, sweep_interval=60)
+
+        assert await store.get("create", "k1") == b'{"id": 1}'
+        assert "idempotency_key.expires_at > " in sql(session.scalar.await_args.args[0])
+
+    # the sweeper deletes expired rows
+    @pytest.mark.asyncio
+    async def test_sweep_deletes_expired_rows(self, session):
+        session.execute.return_value = MagicMock(rowcount=3)
+        store = PostgresIdempotencyStore(lambda: session, 10, 60, sweep_interval=60)
+
+        assert await store.sweep() == 3
+        statement = session.execute.await_args.args[0]
+        assert sql(statement).startswith("DELETE FROM idempotency_key WHERE")
+
+
+class TestCreateStore:
+
+    # memory is the default backend
+    def test_memory_is_default(self):
+        with patch.dict("os.environ", {}, clear=True):
+            store = create_idempotency_store()
+
+        assert type(store) is IdempotencyStore
+
+    # postgres backend is selected by configuration
+    def test_postgres_backend(self):
+        with patch.dict("os.environ", {"IDEMPOTENCY_BACKEND": "postgres"}):
+            store = create_idempotency_store()
+
+        assert isinstance(store, PostgresIdempotencyStore)
+
+    # unknown backend fails at startup
+    def test_unknown_backend_raises(self):
+        with patch.dict("os.environ", {"IDEMPOTENCY_BACKEND": "etcd"}):
+            with pytest.raises(RuntimeError):
+                create_idempotency_store()
+
+
+class TestSingleFlight:
+
+    @staticmethod
+    def slow_create(release: asyncio.Event, calls: list, response: bytes = b"{}"):
+        async def create() -> bytes:
+            calls.append(1)
+            await release.wait()
+            return response
+
+        return create
+
+    # concurrent requests with one key share a single create
+    @pytest.mark.asyncio
+    async def test_concurrent_requests_are_coalesced(self):
+        store = IdempotencyStore(maxsize=10, ttl=60)
+        release, calls = asyncio.Event(), []
+        create = self.slow_create(release, calls, b'{"id": 1}')
+
+        tasks = [
+            asyncio.create_task(store.get_or_create("create", "k1", create))
+            for _ in range(5)
+        ]
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*tasks)
+
+        assert calls == [1]
+        assert results == [b'{"id": 1}'] * 5
+        assert await store.get("create", "k1") == b'{"id": 1}'
+
+    # followers see the leader's failure; nothing is stored
+    @pytest.mark.asyncio
+    async def test_failure_propagates_to_followers(self):
+        store = IdempotencyStore(maxsize=10, ttl=60)
+        release = asyncio.Event()
+
+        async def fail() -> bytes:
+            await release.wait()
+            raise ValueError("insert failed")
+
+        tasks = [
+            asyncio.create_task(store.get_or_create("create", "k1", fail))
+            for _ in range(3)
+        ]
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+
+        assert all(isinstance(r, ValueError) for r in results)
+        assert await store.get("create", "k1") is None
+        assert store._in_flight == {}
+
+    # a cancelled leader hands over to a waiting follower
+    @pytest.mark.asyncio
+    async def test_cancelled_leader_is_replaced(self):
+        store = IdempotencyStore(maxsize=10, ttl=60)
+        release, calls = asyncio.Event(), []
+        create = self.slow_create(release, calls)
+
+        leader = asyncio.create_task(store.get_or_create("create", "k1", create))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(store.get_or_create("create", "k1", create))
+        await asyncio.sleep(0)
+        leader.cancel()
+        await asyncio.sleep(0)
+        release.set()
+
+        assert await follower == b"{}"
+        assert calls == [1, 1]
+
+    # different keys do not wait for each other
+    @pytest.mark.asyncio
+    async def test_different_keys_run_independently(self):
+        store = IdempotencyStore(maxsize=10, ttl=60)
+        release, calls = asyncio.Event(), []
+        create = self.slow_create(release, calls)
+
+        tasks = [
+            asyncio.create_task(store.get_or_create("create", key, create))
+            for key in ("k1", "k2")
+        ]
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(*tasks)
+
+        assert calls == [1, 1]
@@ -0,0 +1,126 @@
+import json
+
+import pytest
+
+from controllers import json_stream
+from controllers.json_stream import JsonItemParser
+
+
+def parse(body: bytes, chunk_size: int, max_item_chars: int = 100) -> list:
+    parser = JsonItemParser(max_item_chars)
+    items = []
+    for start in range(0, len(body), chunk_size):
+        items += parser.feed(body[start : start + chunk_size])
+    return items + parser.close()
+
+
+def errors(items: list) -> list[int]:
+    return [i for i, item in enumerate(items) if isinstance(item, ValueError)]
+
+
+class TestJsonArray:
+
+    # items come out the same however the body is split, even mid-character
+    @pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 1000])
+    def test_any_chunking(self, chunk_size):
+        body = ' [ {"a": 1}, {"b": "é"} , 12, [1, 2] ] '.encode()
+
+        assert parse(body, chunk_size) == [{"a": 1}, {"b": "é"}, 12, [1, 2]]
+
+    # items are returned as soon as they are complete
+    def test_items_are_returned_early(self):
+        parser = JsonItemParser(100)
+
+        assert parser.feed(b'[{"a": 1}, {"b"') == [{"a": 1}]
+        assert parser.feed(b': 2}]') == [{"b": 2}]
+        assert parser.close() == []
+
+    # a number is not cut short by the end of a chunk
+    def test_number_split_across_chunks(self):
+        parser = JsonItemParser(100)
+
+        assert parser.feed(b"[12") == []
+        assert parser.feed(b"34]") == [1234]
+
+    # an empty array or body has no items
+    @pytest.mark.parametrize("body", [b"[]", b" [ ] ", b"", b"  \n"])
+    def test_empty(self, body):
+        assert parse(body, 1) == []
+
+    # a syntax error ends the array with an error in that item's place
+    @pytest.mark.parametrize("body", [b"[1,]", b"[1 2]", b"[1,", b"[1, {]"])
+    def test_malformed(self, body):
+        items = parse(body, 1)
+
+        assert items[0] == 1
+        assert errors(items) == [1]
+
+    # an item over the limit is an error, not an unbounded buffer
+    @pytest.mark.parametrize("chunk_size", [1, 10, 1000])
+    def test_item_too_long(self, chunk_size):
+        body = b'[{"a": 1}, {"a": "' + b"x" * 200 + b'"}, {"a": 3}]'
+
+        items = parse(body, chunk_size, max_item_chars=50)
+
+        assert items[0] == {"a": 1}
+        assert errors(items) == [1]
+        assert "longer than 50" in str(items[1])
+
+    # small chunks of a long item do not each re-parse the whole item
+    def test_small_chunks_parse_rarely(self, monkeypatch):
+        attempts = []
+
+        class CountingDecoder(json.JSONDecoder):
+            def raw_decode(self, s, idx=0):
+                attempts.append(idx)
+                return super().raw_decode(s, idx)
+
+        monkeypatch.setattr(json_stream, "_decoder", CountingDecoder())
+        body = b'[{"text": "' + b"x" * 10_000 + b'"}, 1, {"a": [2]}]'
+
+        items = parse(body, 1, max_item_chars=20_000)
+
+        assert items == [{"text": "x" * 10_000}, 1, {"a": [2]}]
+        assert len(attempts) < 50
+
+    # invalid UTF-8 ends the body
+    def test_invalid_utf8(self):
+        assert errors(parse(b'[{"a": "\xff"}]', 4)) == [0]
+
+
+class TestNdjson:
+
+    # one item per line; blank lines are skipped
+    @pytest.mark.parametrize("chunk_size", [1, 5, 1000])
+    def test_lines(self, chunk_size):
+        body = b'{"a": 1}\n\n{"b": 2}\r\n{"c": 3}'
+
+        assert parse(body, chunk_size) == [{"a": 1}, {"b": 2}, {"c": 3}]
+
+    # a long line fed in small chunks is still one item
+    def test_long_line_in_small_chunks(self):
+        body = b'{"text": "' + b"x" * 5_000 + b'"}\n{"b": 2}'
+
+        items = parse(body, 1, max_item_chars=10_000)
+
+        assert items == [{"text": "x" * 5_000}, {"b": 2}]
+
+    # a bad line is reported and the stream goes on
+    def test_bad_line_continues(self):
+        items = parse(b'{"a": 1}\nnot json\n{"b": 2}\n', 3)
+
+        assert items[0] == {"a": 1}
+        assert errors(items) == [1]
+        assert str(items[1]).startswith("Invalid JSON")
+        assert items[2] == {"b": 2}
+
+    # an overlong line is skipped up to the next newline
+    @pytest.mark.parametrize("chunk_size", [1, 7, 1000])
+    def test_line_too_long(self, chunk_size):
+        body = b'{"a": 1}\n' + b"x" * 150 + b'\n{"b": 2}\n'
+
+        items = parse(body, chunk_size)
+
+        assert items[0] == {"a": 1}
+        assert errors(items) == [1]
+        assert items[2] == {"b": 2}
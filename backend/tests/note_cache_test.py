@@ -0,0 +1,261 @@
+from datetime import datetime
+from unittest.mock import MagicMock
+
+import pytest
+from fastapi.testclient import TestClient
+
+from config.di import get_idempotency_store, get_note_cache, get_session
+from main import app
+from models.notes import CreateNote, Note, UpdateNote
+from repositories.idempotency_repository import IdempotencyStore
+from repositories.note_cache import NoteCache, NoteChangeListener
+from repositories.note_repository import NoteRepository
+
+
+def make_note(note_id: int) -> Note:
+    timestamp = datetime(2026, 1, 1)
+    return Note(
+        id=note_id,
+        title=f"Note {note_id}",
+        created_at=timestamp,
+        updated_at=timestamp,
+    )
+
+
+@pytest.fixture()
+def cache():
+    return NoteCache(maxsize=2, ttl=60)
+
+
+class TestNoteCache:
+
+    # lookups are counted as hits or misses
+    def test_counts_hits_and_misses(self, cache):
+        cache.put(make_note(1), cache.version)
+
+        assert cache.get(1).id == 1
+        assert cache.get(2) is None
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    # a full cache evicts its least recently used entry
+    def test_evicts_least_recently_used(self, cache):
+        for note_id in (1, 2):
+            cache.put(make_note(note_id), cache.version)
+        cache.get(1)
+
+        cache.put(make_note(3), cache.version)
+
+        assert cache.get(2) is None
+        assert cache.get(1) is not None
+        assert cache.stats()["evictions"] == 1
+
+    # a row read before a write must not be cached after it
+    def test_rejects_fill_started_before_invalidation(self, cache):
+        version = cache.version
+        cache.invalidate(1)
+
+        cache.put(make_note(1), version)
+
+        assert cache.get(1) is None
+
+    # stats report size and ratios
+    def test_stats(self, cache):
+        cache.put(make_note(1), cache.version)
+        cache.get(1)
+
+        stats = cache.stats()
+
+        assert stats["size"] == 1
+        assert stats["maxsize"] == 2
+        assert stats["hit_ratio"] == 1.0
+
+
+class TestCachedNoteRepository:
+
+    # repeated reads of a note hit the database once
+    @pytest.mark.asyncio
+    async def test_get_is_read_through(self, cache, recording_session):
+        repo = NoteRepository(recording_session, cache)
+
+        first = await repo.get(1)
+        second = await repo.get(1)
+
+        assert first is second
+        assert recording_session.round_trips() == 1
+
+    # missing notes are not cached
+    @pytest.mark.asyncio
+    async def test_missing_note_is_not_cached(self, cache, recording_session):
+        recording_session.get.return_value = None
+        repo = NoteRepository(recording_session, cache)
+
+        assert await repo.get(1) is None
+        assert await repo.get(1) is None
+        assert recording_session.round_trips() == 2
+
+    # update drops the cached copy
+    @pytest.mark.asyncio
+    async def test_update_invalidates(self, cache, recording_session):
+        repo = NoteRepository(recording_session, cache)
+        await repo.get(1)
+
+        await repo.update(1, UpdateNote(title="Changed"))
+
+        assert cache.get(1) is None
+
+    # delete drops the cached copy
+    @pytest.mark.asyncio
+    async def test_delete_invalidates(self, cache, recording_session):
+        repo = NoteRepository(recording_session, cache)
+        await repo.get(1)
+
+        await repo.delete(1)
+
+        assert cache.get(1) is None
+
+    # creates (including webhook notes) count as writes
+    @pytest.mark.asyncio
+    async def test_create_bumps_version(self, cache, recording_session):
+        version = cache.version
+
+        await NoteRepository(recording_session, cache).create(
+            CreateNote(title="New")
+        )
+
+        assert cache.version == version + 1
+
+
+class TestNoteChangeListener:
+
+    # a notification from another worker invalidates the local copy
+    def test_notification_invalidates(self, cache):
+        listener = NoteChangeListener(cache, "postgresql+asyncpg://u:p@db:5432/notes")
+        cache.put(make_note(7), cache.version)
+
+        listener._on_notify(None, 1234, "note_changed", "7")
+
+        assert cache.get(7) is None
+        assert listener.dsn == "postgresql://u:p@db:5432/notes"
+
+
+class TestNoteCacheEndpoints:
+
+    @pytest.fixture()
+    def client(self, cache, recording_session):
+        app.dependency_overrides[get_session] = lambda: recording_session
+        app.dependency_overrides[get_note_cache] = lambda: cache
+        app.dependency_overrides[get_idempotency_store] = lambda: IdempotencyStore(
+            maxsize=10, ttl=60
+        )
+        yield TestClient(app)
+        app.dependency_overrides.clear()
+
+    # GET /notes/{id} is served from the cache after the first request
+    def test_get_note_uses_cache(self, client, recording_session):
+        client.get("/notes/1")
+        response = client.get("/notes/1")
+
+        assert response.status_code == 200
+        assert recording_session.round_trips() == 1
+
+    # an update through the API is visible on the next read
+    def test_update_then_get_reads_database(self, client, recording_session):
+        client.get("/notes/1")
+        client.post("/notes/1", json={"title": "Changed"})
+        client.get("/notes/1")
+
+        assert recording_session.get.await_count == 2
+
+    # counters are exposed for monitoring
+    def test_metrics_endpoint(self, client):
+        client.get("/notes/1")
+        client.get("/notes/1")
+
+        stats = client.get("/metrics/note-cache").json()
+
+        assert stats["enabled"] is True
+        assert (stats["hits"], stats["misses"]) == (1, 1)
+
+    # a disabled cache is reported as such
+    def test_metrics_endpoint_when_disabled(self, client):
+        app.dependency_overrides[get_note_cache] = lambda: None
+
+        assert client.get("/metrics/note-cache").json() == {"enabled": False}
+
+
+class TestQueryCache:
+
+    @pytest.fixture()
+    def session(self, recording_session):
+        result = MagicMock()
+        result.all.return_value = [make_note(1)]
+        recording_session.exec.return_value = result
+        return recording_session
+
+    # a repeated listing is answered without a query
+    @pytest.mark.asyncio
+    async def test_repeated_listing_hits_cache(self, cache, session):
+        repo = NoteRepository(session, cache)
+
+        first = await repo.get_all(q="milk", tags=["a"], limit=10)
+        second = await repo.get_all(q="milk", tags=["a"], limit=10)
+
+        assert [n.id for n in first] == [n.id for n in second] == [1]
+        assert session.round_trips() == 1
+        assert (cache.query_hits, cache.query_misses) == (1, 1)
+
+    # equivalent parameters share one entry
+    @pytest.mark.asyncio
+    async def test_equivalent_parameters_share_entry(self, cache, session):
+        repo = NoteRepository(session, cache)
+
+        await repo.get_all(q="Milk", tags=["b", "a", "a"], limit=10)
+        await repo.get_all(q="milk", tags=["a", "b"], limit=10)
+        await repo.get_all(q="milk", tags=["a", "b"], limit=10, sort="relevance")
+        await repo.get_all(tags=["a"], tag_match="any", limit=10, search="fulltext")
+        await repo.get_all(tags=["a"], limit=10)
+
+        assert session.round_trips() == 2
+
+    # different pages are different entries
+    @pytest.mark.asyncio
+    async def test_different_pages_are_separate(self, cache, session):
+        repo = NoteRepository(session, cache)
+
+        await repo.get_all(limit=10)
+        await repo.get_all(limit=10, offset=10)
+        await repo.get_all(q="milk ", limit=10)
+
+        assert session.round_trips() == 3
+
+    # any write bumps the generation, so the next listing is re-read
+    @pytest.mark.asyncio
+    async def test_write_invalidates_listings(self, cache, session):
+        repo = NoteRepository(session, cache)
+        await repo.get_all(limit=10)
+
+        await repo.create(CreateNote(title="New"))
+        await repo.get_all(limit=10)
+
+        assert session.exec.await_count == 2
+
+    # callers get their own list, not the cached one
+    @pytest.mark.asyncio
+    async def test_returns_copy_of_cached_list(self, cache, session):
+        repo = NoteRepository(session, cache)
+
+        (await repo.get_all(limit=10)).clear()
+
+        assert len(await repo.get_all(limit=10)) == 1
+
+    # the number of cached listings is bounded
+    @pytest.mark.asyncio
+    async def test_listing_cache_is_bounded(self, session):
+        cache = NoteCache(maxsize=10, ttl=60, query_maxsize=2)
+        repo = NoteRepository(session, cache)
+
+        for offset in range(3):
+            await repo.get_all(limit=10, offset=offset)
+
+        assert cache.stats()["queries"]["size"] == 2
+        assert cache.stats()["queries"]["evictions"] == 1
@@ -0,0 +1,257 @@
+import os
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from sqlalchemy.dialects.postgresql.asyncpg import dialect as asyncpg_dialect
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.schema import CreateTable
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from models.notes import CreateNote, Note, UpdateNote
+from models.pagination import KeysetCursor
+from repositories.note_repository import STREAM_BATCH_SIZE, NoteRepository
+
+TEST_DB_URL = os.getenv("TEST_DB_URL")
+
+
+@pytest.fixture()
+def session():
+    """AsyncSession mock that records executed statements."""
+    session = AsyncMock()
+    result = MagicMock()
+    result.all.return_value = []
+    session.exec.return_value = result
+    return session
+
+
+def compiled_sql(session) -> str:
+    """SQL of the last statement passed to session.exec, as sent to asyncpg."""
+    statement = session.exec.await_args.args[0]
+    return str(statement.compile(dialect=asyncpg_dialect()))
+
+
+class TestGetAllSearch:
+
+    # substring search keeps the ILIKE infix semantics
+    @pytest.mark.asyncio
+    async def test_substring_search_uses_ilike(self, session):
+        await NoteRepository(session).get_all(q="milk")
+
+        sql = compiled_sql(session)
+        assert "ILIKE" in sql
+        assert "websearch_to_tsquery" not in sql
+
+    # fulltext search matches the indexed tsvector column
+    @pytest.mark.asyncio
+    async def test_fulltext_search_uses_tsvector(self, session):
+        await NoteRepository(session).get_all(q="milk", search="fulltext")
+
+        sql = compiled_sql(session)
+        assert "note.search_vector @@ websearch_to_tsquery" in sql
+        assert "ILIKE" not in sql
+        assert "ts_rank" not in sql
+
+    # sort=relevance orders by ts_rank, highest first
+    @pytest.mark.asyncio
+    async def test_fulltext_relevance_orders_by_rank(self, session):
+        await NoteRepository(session).get_all(
+            q="milk", search="fulltext", sort="relevance"
+        )
+
+        assert "ORDER BY ts_rank(note.search_vector" in compiled_sql(session)
+
+    # the tsvector is never selected into the Note model
+    @pytest.mark.asyncio
+    async def test_search_vector_is_not_selected(self, session):
+        await NoteRepository(session).get_all(q="milk", search="fulltext")
+
+        select_clause = compiled_sql(session).split("FROM")[0]
+        assert "search_vector" not in select_clause
+
+
+class TestGetAllPagination:
+
+    # listings are ordered by (created_at, id) so pages are stable
+    @pytest.mark.asyncio
+    async def test_orders_by_created_at_and_id(self, session):
+        await NoteRepository(session).get_all(limit=2, offset=4)
+
+        sql = compiled_sql(session)
+        assert "ORDER BY note.created_at, note.id" in sql
+        assert "OFFSET" in sql
+
+    # a cursor becomes a row comparison instead of an OFFSET
+    @pytest.mark.asyncio
+    async def test_cursor_uses_keyset_predicate(self, session):
+        cursor = KeysetCursor(position=datetime(2026, 1, 1), id=7)
+
+        await NoteRepository(session).get_all(limit=2, cursor=cursor)
+
+        sql = compiled_sql(session)
+        assert (
+            "(note.created_at, note.id) > "
+            "($1::TIMESTAMP WITHOUT TIME ZONE, $2::INTEGER)"
+        ) in sql
+        assert "ORDER BY note.created_at, note.id" in sql
+
+
+class TestStreamAll:
+
+    # export reads through a server-side cursor in fixed-size batches
+    @pytest.mark.asyncio
+    async def test_streams_with_yield_per(self, session):
+        async def rows():
+            yield Note(id=1, title="a", created_at=datetime(2026, 1, 1))
+
+        session.stream_scalars.return_value = rows()
+
+        notes = [note async for note in NoteRepository(session).stream_all(q="a")]
+
+        statement = session.stream_scalars.await_args.args[0]
+        assert statement.get_execution_options()["yield_per"] == STREAM_BATCH_SIZE
+        assert [note.id for note in notes] == [1]
+
+
+class TestCreateMany:
+
+    # every note goes into one INSERT ... RETURNING and one commit
+    @pytest.mark.asyncio
+    async def test_single_insert_returning(self, session):
+        created = MagicMock()
+        created.all.return_value = []
+        session.scalars.return_value = created
+
+        await NoteRepository(session).create_many(
+            [CreateNote(title="a"), CreateNote(title="b", tags=["x"])]
+        )
+
+        session.scalars.assert_awaited_once()
+        statement, rows = session.scalars.await_args.args
+        sql = str(statement.compile(dialect=asyncpg_dialect()))
+        assert sql.startswith("INSERT INTO note")
+        assert "RETURNING" in sql
+        assert [row["title"] for row in rows] == ["a", "b"]
+        assert rows[0]["created_at"] == rows[1]["created_at"]
+        assert rows[0]["updated_at"] == rows[0]["created_at"]
+        session.commit.assert_awaited_once()
+
+    # nothing to insert → no round trip at all
+    @pytest.mark.asyncio
+    async def test_empty_batch_skips_database(self, session):
+        assert await NoteRepository(session).create_many([]) == []
+
+        session.scalars.assert_not_awaited()
+        session.commit.assert_not_awaited()
+
+
+class TestGetVersion:
+
+    # a version check selects updated_at only, not the whole row
+    @pytest.mark.asyncio
+    async def test_selects_only_updated_at(self, session):
+        session.scalar.return_value = datetime(2026, 1, 1)
+
+        version = await NoteRepository(session).get_version(1)
+
+        assert version == datetime(2026, 1, 1)
+        statement = session.scalar.await_args.args[0]
+        sql = str(statement.compile(dialect=asyncpg_dialect()))
+        assert sql.startswith("SELECT note.updated_at \nFROM note")
+        session.get.assert_not_awaited()
+
+    # an update stamps updated_at
+    @pytest.mark.asyncio
+    async def test_update_sets_updated_at(self, session):
+        session.scalars.return_value = MagicMock()
+
+        await NoteRepository(session).update(1, UpdateNote(title="a"))
+
+        statement = session.scalars.await_args.args[0]
+        assert "updated_at" in str(statement.compile(dialect=asyncpg_dialect()))
+
+
+class TestGetAllTags:
+
+    # default tag_match=all uses array containment (@>)
+    @pytest.mark.asyncio
+    async def test_all_tags_uses_contains(self, session):
+        await NoteRepository(session).get_all(tags=["a", "b"])
+
+        assert "note.tags @> $1::VARCHAR[]" in compiled_sql(session)
+
+    # tag_match=any uses array overlap (&&)
+    @pytest.mark.asyncio
+    async def test_any_tag_uses_overlap(self, session):
+        await NoteRepository(session).get_all(tags=["a", "b"], tag_match="any")
+
+        assert "note.tags && $1::VARCHAR[]" in compiled_sql(session)
+
+
+class TestNoteTable:
+
+    # fresh tables default updated_at like the column added to older ones
+    def test_updated_at_defaults_like_upgrade(self):
+        ddl = str(CreateTable(Note.__table__).compile(dialect=asyncpg_dialect()))
+
+        assert "updated_at TIMESTAMP WITHOUT TIME ZONE DEFAULT LOCALTIMESTAMP" in ddl
+
+
+@pytest.mark.skipif(not TEST_DB_URL, reason="TEST_DB_URL is not set")
+class TestGetAllQueryPlan:
+    """Runs EXPLAIN against a real Postgres database (set TEST_DB_URL)."""
+
+    @staticmethod
+    async def explain(tags: list[str], tag_match: str) -> str:
+        engine = create_async_engine(TEST_DB_URL)
+        try:
+            async with engine.connect() as conn:
+                await conn.run_sync(SQLModel.metadata.create_all)
+                await conn.execute(
+                    Note.__table__.insert(),
+                    [
+                        {
+                            "title": f"note {i}",
+                            "content": "",
+                            "tags": [f"tag{i % 10}"],
+                            "created_at": datetime(2026, 1, 1),
+                            "updated_at": datetime(2026, 1, 1),
+                        }
+                        for i in range(100)
+                    ],
+                )
+                # the planner prefers a seq scan on tiny tables; forbid it so
+                # the plan shows whether the index can serve the filter at all
+                await conn.exec_driver_sql("SET LOCAL enable_seqscan = off")
+
+                session = AsyncMock()
+                session.exec.return_value = MagicMock()
+                await NoteRepository(session).get_all(tags=tags, tag_match=tag_match)
+                compiled = session.exec.await_args.args[0].compile(
+                    dialect=conn.dialect
+                )
+                params = tuple(compiled.params[name] for name in compiled.positiontup)
+
+                raw = await conn.get_raw_connection()
+                plan = await raw.driver_connection.fetch(
+                    "EXPLAIN " + compiled.string, *params
+                )
+                await conn.rollback()
+        finally:
+            await engine.dispose()
+        return "\n".join(row[0] for row in plan)
+
+    # tag=a&tag=b (all) is answered from the GIN index
+    @pytest.mark.asyncio
+    async def test_all_tags_uses_gin_index(self):
+        plan = await self.explain(["tag1", "tag2"], "all")
+
+        assert "ix_note_tags" in plan
+
+    # tag_match=any is answered from the GIN index
+    @pytest.mark.asyncio
+    async def test_any_tag_uses_gin_index(self):
+        plan = await self.explain(["tag1", "tag2"], "any")
+
+        assert "ix_note_tags" in plan
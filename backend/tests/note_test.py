@@ -1,21 +1,36 @@
+import asyncio
+import base64
+import csv
+import io
+import json
 from datetime import datetime
 from unittest.mock import AsyncMock
 
+import httpx
 import pytest
 from fastapi.testclient import TestClient
 
-from config.di import get_note_repo
-from controllers.note_controller import _create_cache
+from config.di import (
+    get_idempotency_store,
+    get_note_cache,
+    get_note_repo,
+    get_session,
+)
+from controllers import note_controller
+from controllers.note_controller import MAX_BATCH_SIZE, MAX_PAGE_SIZE
 from main import app
 from models.notes import Note
+from models.pagination import KeysetCursor
+from repositories.idempotency_repository import IdempotencyStore
 
 
 @pytest.fixture(autouse=True)
-def clear_idempotency_cache():
-    """Clean idempotency cache before and after every test."""
-    _create_cache.clear()
-    yield
-    _create_cache.clear()
+def idempotency_store():
+    """Fresh in-memory idempotency store for every test."""
+    store = IdempotencyStore(maxsize=1000, ttl=86400)
+    app.dependency_overrides[get_idempotency_store] = lambda: store
+    yield store
+    app.dependency_overrides.clear()
 
 
 @pytest.fixture()
@@ -28,6 +43,7 @@ def mock_repo():
         content="Some content",
         tags=["tag1"],
         created_at=datetime(2026, 1, 1, 12, 0, 0),
+        updated_at=datetime(2026, 1, 1, 12, 0, 0),
     )
     return repo
 
@@ -94,6 +110,7 @@ class TestCreateNoteSuccess:
             content="",
             tags=[],
             created_at=datetime(2026, 1, 1, 12, 0, 0),
+            updated_at=datetime(2026, 1, 1, 12, 0, 0),
         )
 
         response = client.post("/notes", json={"title": "Only Title"})
@@ -109,6 +126,7 @@ class TestCreateNoteSuccess:
             content="body",
             tags=[],
             created_at=datetime(2026, 1, 1, 12, 0, 0),
+            updated_at=datetime(2026, 1, 1, 12, 0, 0),
         )
 
         response = client.post(
@@ -213,6 +231,22 @@ class TestCreateNoteIdempotency:
 
         assert mock_repo.create.await_count == 2
 
+    # key still claimed by a request on another worker → 409, nothing created
+    def test_key_in_use_returns_conflict(
+        self, client: TestClient, mock_repo, idempotency_store
+    ):
+        idempotency_store._claim = AsyncMock(return_value=False)
+        idempotency_store.wait = 0
+
+        response = client.post(
+            "/notes",
+            json={"title": "Test Note", "content": "Some content"},
+            headers={"idempotency-key": "busy-key"},
+        )
+
+        assert response.status_code == 409
+        mock_repo.create.assert_not_awaited()
+
     # no header → note is created normally
     def test_no_idempotency_key_still_works(self, client: TestClient, mock_repo):
         response = client.post(
@@ -238,6 +272,7 @@ class TestCreateAndRetrieveNote:
             content="Some content",
             tags=["tag1"],
             created_at=datetime(2026, 1, 1, 12, 0, 0),
+            updated_at=datetime(2026, 1, 1, 12, 0, 0),
         )
         mock_repo.create.return_value = created_note
         mock_repo.get.return_value = created_note
@@ -271,3 +306,535 @@ class TestCreateAndRetrieveNote:
         response = client.get("/notes/999")
 
         assert response.status_code == 404
+
+
+class TestConditionalGet:
+
+    @staticmethod
+    def note(updated_at: datetime = datetime(2026, 1, 2, 8, 30, 0)) -> Note:
+        return Note(
+            id=1,
+            title="Polled",
+            created_at=datetime(2026, 1, 1, 12, 0, 0),
+            updated_at=updated_at,
+        )
+
+    # a plain GET carries both validators
+    def test_get_note_sets_validators(self, client: TestClient, mock_repo):
+        mock_repo.get.return_value = self.note()
+
+        response = client.get("/notes/1")
+
+        assert response.status_code == 200
+        assert response.headers["ETag"]
+        assert response.headers["Last-Modified"].endswith(" GMT")
+
+    # an unchanged note → 304 from the version check alone, no row fetch
+    def test_matching_etag_returns_304(self, client: TestClient, mock_repo):
+        mock_repo.get.return_value = self.note()
+        etag = client.get("/notes/1").headers["ETag"]
+        mock_repo.get.reset_mock()
+        mock_repo.get_version.return_value = self.note().updated_at
+
+        response = client.get("/notes/1", headers={"If-None-Match": etag})
+
+        assert response.status_code == 304
+        assert response.content == b""
+        assert response.headers["ETag"] == etag
+        mock_repo.get.assert_not_awaited()
+
+    # weak and listed ETags match too
+    def test_weak_etag_in_list_returns_304(self, client: TestClient, mock_repo):
+        mock_repo.get.return_value = self.note()
+        etag = client.get("/notes/1").headers["ETag"]
+        mock_repo.get_version.return_value = self.note().updated_at
+
+        response = client.get(
+            "/notes/1", headers={"If-None-Match": f'"other", W/{etag}'}
+        )
+
+        assert response.status_code == 304
+
+    # a changed note → full 200 with the new ETag
+    def test_stale_etag_returns_note(self, client: TestClient, mock_repo):
+        mock_repo.get.return_value = self.note()
+        etag = client.get("/notes/1").headers["ETag"]
+        changed = self.note(updated_at=datetime(2026, 1, 3))
+        mock_repo.get.return_value = changed
+        mock_repo.get_version.return_value = changed.updated_at
+
+        response = client.get("/notes/1", headers={"If-None-Match": etag})
+
+        assert response.status_code == 200
+        assert response.json()["title"] == "Polled"
+        assert response.headers["ETag"] != etag
+
+    # If-Modified-Since at or after Last-Modified → 304
+    def test_if_modified_since(self, client: TestClient, mock_repo):
+        mock_repo.get.return_value = self.note()
+        last_modified = client.get("/notes/1").headers["Last-Modified"]
+        mock_repo.get_version.return_value = self.note().updated_at
+
+        unchanged = client.get("/notes/1", headers={"If-Modified-Since": last_modified})
+        mock_repo.get_version.return_value = datetime(2026, 1, 3)
+        changed = client.get("/notes/1", headers={"If-Modified-Since": last_modified})
+
+        assert unchanged.status_code == 304
+        assert changed.status_code == 200
+
+    # revalidating a deleted note → 404
+    def test_conditional_get_of_missing_note_returns_404(
+        self, client: TestClient, mock_repo
+    ):
+        mock_repo.get_version.return_value = None
+
+        response = client.get("/notes/1", headers={"If-None-Match": '"1-x"'})
+
+        assert response.status_code == 404
+
+    # an unchanged page → 304 with the page ETag
+    def test_unchanged_page_returns_304(self, client: TestClient, mock_repo):
+        mock_repo.get_all.return_value = [self.note()]
+        etag = client.get("/notes").headers["ETag"]
+
+        response = client.get("/notes", headers={"If-None-Match": etag})
+
+        assert response.status_code == 304
+        assert response.content == b""
+
+    # editing a note on the page changes the page ETag
+    def test_page_etag_follows_updates(self, client: TestClient, mock_repo):
+        mock_repo.get_all.return_value = [self.note()]
+        etag = client.get("/notes").headers["ETag"]
+        mock_repo.get_all.return_value = [self.note(datetime(2026, 1, 3))]
+
+        response = client.get("/notes", headers={"If-None-Match": etag})
+
+        assert response.status_code == 200
+        assert response.headers["ETag"] != etag
+
+
+class TestFastJson:
+
+    @pytest.fixture()
+    def page(self) -> list[Note]:
+        return [
+            Note(
+                id=i,
+                title=f"Note {i}",
+                content="ü",
+                tags=["t"],
+                created_at=datetime(2026, 1, 1, 12, 0, i),
+                updated_at=datetime(2026, 1, 1, 12, 0, i),
+            )
+            for i in (1, 2)
+        ]
+
+    def get(self, client, monkeypatch, fast: bool, url: str, **kwargs):
+        monkeypatch.setattr(note_controller, "FAST_JSON", fast)
+        return client.get(url, **kwargs)
+
+    # the fast path sends the same body and headers as the default one
+    def test_list_matches_default_path(
+        self, client: TestClient, mock_repo, monkeypatch, page
+    ):
+        mock_repo.get_all.return_value = page
+
+        default = self.get(client, monkeypatch, False, "/notes", params={"limit": 2})
+        fast = self.get(client, monkeypatch, True, "/notes", params={"limit": 2})
+
+        assert fast.content == default.content
+        assert fast.headers["content-type"] == "application/json"
+        assert fast.headers["X-Next-Cursor"] == default.headers["X-Next-Cursor"]
+        assert fast.headers["ETag"] == default.headers["ETag"]
+
+    # single notes too, including their validators
+    def test_note_matches_default_path(
+        self, client: TestClient, mock_repo, monkeypatch, page
+    ):
+        mock_repo.get.return_value = page[0]
+
+        default = self.get(client, monkeypatch, False, "/notes/1")
+        fast = self.get(client, monkeypatch, True, "/notes/1")
+
+        assert fast.content == default.content
+        assert fast.headers["Last-Modified"] == default.headers["Last-Modified"]
+
+
+class TestGetNotesSearch:
+
+    # default search mode is the substring (ILIKE) path
+    def test_get_notes_defaults_to_substring_search(
+        self, client: TestClient, mock_repo
+    ):
+        mock_repo.get_all.return_value = []
+
+        response = client.get("/notes", params={"q": "milk"})
+
+        assert response.status_code == 200
+        assert mock_repo.get_all.await_args.kwargs["search"] == "substring"
+
+    # search=fulltext&sort=relevance is forwarded to the repository
+    def test_get_notes_fulltext_with_relevance(self, client: TestClient, mock_repo):
+        mock_repo.get_all.return_value = []
+
+        response = client.get(
+            "/notes", params={"q": "milk", "search": "fulltext", "sort": "relevance"}
+        )
+
+        assert response.status_code == 200
+        kwargs = mock_repo.get_all.await_args.kwargs
+        assert kwargs["search"] == "fulltext"
+        assert kwargs["sort"] == "relevance"
+
+    # relevance has nothing to rank without a full-text query → 422
+    def test_get_notes_relevance_without_fulltext_returns_422(
+        self, client: TestClient, mock_repo
+    ):
+        response = client.get("/notes", params={"q": "milk", "sort": "relevance"})
+
+        assert response.status_code == 422
+        mock_repo.get_all.assert_not_awaited()
+
+    # unknown search mode → 422
+    def test_get_notes_unknown_search_mode_returns_422(self, client: TestClient):
+        response = client.get("/notes", params={"q": "milk", "search": "regex"})
+
+        assert response.status_code == 422
+
+
+class TestGetNotesTagFilter:
+
+    # repeated tag params are passed as a list, matching all by default
+    def test_get_notes_multiple_tags(self, client: TestClient, mock_repo):
+        mock_repo.get_all.return_value = []
+
+        response = client.get("/notes", params=[("tag", "a"), ("tag", "b")])
+
+        assert response.status_code == 200
+        assert mock_repo.get_all.await_args.args[1] == ["a", "b"]
+        assert mock_repo.get_all.await_args.kwargs["tag_match"] == "all"
+
+    # tag_match=any is forwarded to the repository
+    def test_get_notes_tag_match_any(self, client: TestClient, mock_repo):
+        mock_repo.get_all.return_value = []
+
+        client.get("/notes", params=[("tag", "a"), ("tag", "b"), ("tag_match", "any")])
+
+        assert mock_repo.get_all.await_args.kwargs["tag_match"] == "any"
+
+    # unknown match mode → 422
+    def test_get_notes_unknown_tag_match_returns_422(self, client: TestClient):
+        response = client.get("/notes", params={"tag": "a", "tag_match": "none"})
+
+        assert response.status_code == 422
+
+
+class TestGetNotesCursorPagination:
+
+    @staticmethod
+    def page(*ids: int) -> list[Note]:
+        return [
+            Note(
+                id=i,
+                title=f"Note {i}",
+                created_at=datetime(2026, 1, 1, 12, 0, i),
+                updated_at=datetime(2026, 1, 1, 12, 0, i),
+            )
+            for i in ids
+        ]
+
+    # a full page carries the cursor of its last note
+    def test_full_page_returns_next_cursor(self, client: TestClient, mock_repo):
+        mock_repo.get_all.return_value = self.page(1, 2)
+
+        response = client.get("/notes", params={"limit": 2})
+
+        cursor = KeysetCursor.decode(response.headers["X-Next-Cursor"])
+        assert cursor.id == 2
+        assert cursor.position == datetime(2026, 1, 1, 12, 0, 2)
+
+    # a short page is the last one → no cursor
+    def test_last_page_has_no_cursor(self, client: TestClient, mock_repo):
+        mock_repo.get_all.return_value = self.page(1)
+
+        response = client.get("/notes", params={"limit": 2})
+
+        assert "X-Next-Cursor" not in response.headers
+
+    # the cursor is decoded and handed to the repository
+    def test_cursor_is_passed_to_repo(self, client: TestClient, mock_repo):
+        mock_repo.get_all.return_value = []
+        cursor = KeysetCursor(position=datetime(2026, 1, 1), id=7)
+
+        response = client.get("/notes", params={"limit": 2, "cursor": cursor.encode()})
+
+        assert response.status_code == 200
+        assert mock_repo.get_all.await_args.kwargs["cursor"] == cursor
+
+    # garbage cursor → 400
+    def test_invalid_cursor_returns_400(self, client: TestClient, mock_repo):
+        response = client.get("/notes", params={"cursor": "not-a-cursor"})
+
+        assert response.status_code == 400
+        mock_repo.get_all.assert_not_awaited()
+
+    # well-formed cursor the database could not compare with → 400
+    @pytest.mark.parametrize(
+        "raw",
+        [
+            '{"position": "2026-01-01T00:00:00Z", "id": 1}',
+            '{"position": "2026-01-01T00:00:00", "id": 2147483648}',
+            '{"position": "2026-01-01T00:00:00", "id": 0}',
+        ],
+    )
+    def test_out_of_range_cursor_returns_400(
+        self, client: TestClient, mock_repo, raw: str
+    ):
+        cursor = base64.urlsafe_b64encode(raw.encode()).decode()
+
+        response = client.get("/notes", params={"cursor": cursor})
+
+        assert response.status_code == 400
+        mock_repo.get_all.assert_not_awaited()
+
+    # cursor and offset are two different pagination modes → 422
+    def test_cursor_with_offset_returns_422(self, client: TestClient):
+        cursor = KeysetCursor(position=datetime(2026, 1, 1), id=7).encode()
+
+        response = client.get("/notes", params={"cursor": cursor, "offset": 3})
+
+        assert response.status_code == 422
+
+
+class TestGetNotesPageSize:
+
+    # no limit → one page of the configured maximum size
+    def test_default_limit_is_max_page_size(self, client: TestClient, mock_repo):
+        mock_repo.get_all.return_value = []
+
+        client.get("/notes")
+
+        assert mock_repo.get_all.await_args.args[2] == MAX_PAGE_SIZE
+
+    # limit above the maximum page size → 422
+    def test_limit_above_max_returns_422(self, client: TestClient):
+        response = client.get("/notes", params={"limit": MAX_PAGE_SIZE + 1})
+
+        assert response.status_code == 422
+
+    # limit=0 no longer means "everything" → 422
+    def test_zero_limit_returns_422(self, client: TestClient):
+        response = client.get("/notes", params={"limit": 0})
+
+        assert response.status_code == 422
+
+
+class TestExportNotes:
+
+    @pytest.fixture()
+    def export_client(self):
+        """TestClient over a real NoteRepository with a streaming fake session."""
+        state = {"closed": False, "open_while_streaming": []}
+        notes = [
+            Note(id=i, title=f"Note {i}", tags=["t"], created_at=datetime(2026, 1, 1))
+            for i in (1, 2)
+        ]
+
+        async def rows():
+            for note in notes:
+                state["open_while_streaming"].append(not state["closed"])
+                yield note
+
+        async def fake_session():
+            session = AsyncMock()
+            session.stream_scalars.return_value = rows()
+            yield session
+            state["closed"] = True
+
+        app.dependency_overrides[get_session] = fake_session
+        app.dependency_overrides[get_note_cache] = lambda: None
+        yield TestClient(app), state
+        app.dependency_overrides.clear()
+
+    # default format is one JSON document per line
+    def test_export_ndjson(self, export_client):
+        client, _ = export_client
+
+        response = client.get("/notes/export")
+
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/x-ndjson"
+        lines = response.text.splitlines()
+        assert [json.loads(line)["id"] for line in lines] == [1, 2]
+
+    # format=csv starts with a header row
+    def test_export_csv(self, export_client):
+        client, _ = export_client
+
+        response = client.get("/notes/export", params={"format": "csv"})
+
+        assert response.headers["content-type"].startswith("text/csv")
+        rows = list(csv.reader(io.StringIO(response.text)))
+        assert rows[0] == ["id", "title", "content", "tags", "created_at"]
+        assert [row[0] for row in rows[1:]] == ["1", "2"]
+        assert json.loads(rows[1][3]) == ["t"]
+
+    # the DB session must outlive the response body it streams from
+    def test_export_keeps_session_open_while_streaming(self, export_client):
+        client, state = export_client
+
+        client.get("/notes/export")
+
+        assert state["open_while_streaming"] == [True, True]
+        assert state["closed"] is True
+
+
+class TestCreateNotesBatch:
+
+    @pytest.fixture(autouse=True)
+    def fake_create_many(self, mock_repo):
+        async def create_many(notes):
+            return [
+                Note(
+                    id=i + 1,
+                    title=note.title,
+                    content=note.content,
+                    tags=note.tags,
+                    created_at=datetime(2026, 1, 1, 12, 0, 0),
+                    updated_at=datetime(2026, 1, 1, 12, 0, 0),
+                )
+                for i, note in enumerate(notes)
+            ]
+
+        mock_repo.create_many.side_effect = create_many
+
+    # all items valid → 201, one repository call for the whole batch
+    def test_batch_creates_all_notes(self, client: TestClient, mock_repo):
+        response = client.post(
+            "/notes/batch", json=[{"title": "A"}, {"title": "B", "tags": ["x"]}]
+        )
+
+        assert response.status_code == 201
+        results = response.json()
+        assert [r["note"]["title"] for r in results] == ["A", "B"]
+        assert all(r["errors"] is None for r in results)
+        mock_repo.create_many.assert_awaited_once()
+
+    # invalid items are reported by index without aborting the batch
+    def test_batch_reports_invalid_items(self, client: TestClient, mock_repo):
+        response = client.post(
+            "/notes/batch", json=[{"title": "A"}, {"title": ""}, "nope", {"title": "D"}]
+        )
+
+        assert response.status_code == 207
+        results = response.json()
+        assert [r["index"] for r in results] == [0, 1, 2, 3]
+        assert results[0]["note"]["title"] == "A"
+        assert results[1]["note"] is None
+        assert results[1]["errors"][0]["loc"] == ["title"]
+        assert results[2]["errors"]
+        assert results[3]["note"]["title"] == "D"
+        [valid] = mock_repo.create_many.await_args.args
+        assert [note.title for note in valid] == ["A", "D"]
+
+    # more items than NOTES_MAX_BATCH_SIZE → 422
+    def test_batch_too_large_returns_422(self, client: TestClient, mock_repo):
+        response = client.post(
+            "/notes/batch", json=[{"title": "A"}] * (MAX_BATCH_SIZE + 1)
+        )
+
+        assert response.status_code == 422
+        mock_repo.create_many.assert_not_awaited()
+
+    # body must be a JSON array → 422
+    def test_batch_requires_array(self, client: TestClient):
+        response = client.post("/notes/batch", json={"title": "A"})
+
+        assert response.status_code == 422
+
+
+class TestWriteRoundTrips:
+
+    @pytest.fixture()
+    def db_client(self, recording_session):
+        """TestClient over a real NoteRepository and a recording session."""
+        app.dependency_overrides[get_session] = lambda: recording_session
+        app.dependency_overrides[get_note_cache] = lambda: None
+        yield TestClient(app)
+        app.dependency_overrides.clear()
+
+    # POST /notes is a single INSERT ... RETURNING, no refresh
+    def test_create_is_one_statement(self, db_client, recording_session):
+        response = db_client.post("/notes", json={"title": "New"})
+
+        assert response.status_code == 201
+        assert recording_session.round_trips() == 1
+        recording_session.refresh.assert_not_awaited()
+
+    # POST /notes/{id} is a single UPDATE ... RETURNING, no lookup or refresh
+    def test_update_is_one_statement(self, db_client, recording_session):
+        response = db_client.post("/notes/1", json={"title": "Changed"})
+
+        assert response.status_code == 200
+        assert recording_session.round_trips() == 1
+        recording_session.get.assert_not_awaited()
+        recording_session.refresh.assert_not_awaited()
+
+    # a missing note is detected from the empty RETURNING → 404
+    def test_update_missing_note_returns_404(self, db_client, recording_session):
+        recording_session.scalars.return_value.one_or_none.return_value = None
+
+        response = db_client.post("/notes/999", json={"title": "Changed"})
+
+        assert response.status_code == 404
+        assert recording_session.round_trips() == 1
+
+    # DELETE /notes/{id} is a single DELETE ... RETURNING id
+    def test_delete_is_one_statement(self, db_client, recording_session):
+        response = db_client.delete("/notes/1")
+
+        assert response.status_code == 204
+        assert recording_session.round_trips() == 1
+        recording_session.get.assert_not_awaited()
+
+    # nothing deleted → 404
+    def test_delete_missing_note_returns_404(self, db_client, recording_session):
+        recording_session.scalar.return_value = None
+
+        response = db_client.delete("/notes/999")
+
+        assert response.status_code == 404
+        assert recording_session.round_trips() == 1
+
+
+class TestCreateNoteConcurrentRetries:
+
+    # a retry arriving while the first attempt is in flight shares its insert
+    @pytest.mark.asyncio
+    async def test_concurrent_retries_insert_once(self, mock_repo):
+        release = asyncio.Event()
+        created = mock_repo.create.return_value
+
+        async def slow_create(note):
+            await release.wait()
+            return created
+
+        mock_repo.create.side_effect = slow_create
+        app.dependency_overrides[get_note_repo] = lambda: mock_repo
+        headers = {"idempotency-key": "retry-storm"}
+        payload = {"title": "Test Note"}
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://t") as ac:
+            requests = [
+                asyncio.create_task(ac.post("/notes", json=payload, headers=headers))
+                for _ in range(3)
+            ]
+            await asyncio.sleep(0.05)
+            release.set()
+            responses = await asyncio.gather(*requests)
+
+        assert [r.status_code for r in responses] == [201, 201, 201]
+        assert len({r.content for r in responses}) == 1
+        mock_repo.create.assert_awaited_once()
@@ -0,0 +1,118 @@
+import asyncio
+
+import pytest
+
+from models.webhooks import WebhookNote
+from repositories.webhook_deduper import WebhookDeduper, dedupe_key
+
+
+class Timer:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def webhook(message: str = "disk full", source: str = "alerts", tags=("a", "b")):
+    return WebhookNote(source=source, message=message, tags=list(tags))
+
+
+class Creator:
+    """A create callable returning 1, 2, ... and counting its calls."""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def __call__(self) -> int:
+        self.calls += 1
+        return self.calls
+
+
+class TestDedupeKey:
+
+    # tag order does not matter, source, message and tags do
+    def test_key(self):
+        assert dedupe_key(webhook(tags=["a", "b"])) == dedupe_key(
+            webhook(tags=["b", "a"])
+        )
+        assert dedupe_key(webhook()) != dedupe_key(webhook(source="other"))
+        assert dedupe_key(webhook()) != dedupe_key(webhook(message="disk ok"))
+        assert dedupe_key(webhook()) != dedupe_key(webhook(tags=["a"]))
+
+
+class TestWebhookDeduper:
+
+    # a repeat within the window gets the first result and is counted
+    @pytest.mark.asyncio
+    async def test_suppresses_repeat(self):
+        deduper = WebhookDeduper(window=60)
+        create = Creator()
+
+        first = await deduper.get_or_create(webhook(), create)
+        repeat = await deduper.get_or_create(webhook(tags=["b", "a"]), create)
+
+        assert first == (1, False)
+        assert repeat == (1, True)
+        assert create.calls == 1
+        assert deduper.suppressed_count("alerts") == 1
+        assert deduper.suppressed_count("other") == 0
+        assert deduper.stats()["suppressed"] == 1
+
+    # once the window has passed the webhook is created again
+    @pytest.mark.asyncio
+    async def test_window_expires(self):
+        timer = Timer()
+        deduper = WebhookDeduper(window=60, timer=timer)
+        create = Creator()
+        await deduper.get_or_create(webhook(), create)
+
+        timer.now = 61
+
+        assert await deduper.get_or_create(webhook(), create) == (2, False)
+
+    # repeats arriving while the first is being created wait for its result
+    @pytest.mark.asyncio
+    async def test_concurrent_repeats_share_result(self):
+        deduper = WebhookDeduper(window=60)
+        release = asyncio.Event()
+        calls = 0
+
+        async def create() -> int:
+            nonlocal calls
+            calls += 1
+            await release.wait()
+            return 7
+
+        tasks = [
+            asyncio.create_task(deduper.get_or_create(webhook(), create))
+            for _ in range(3)
+        ]
+        await asyncio.sleep(0)
+        release.set()
+
+        assert [await task for task in tasks] == [(7, False), (7, True), (7, True)]
+        assert calls == 1
+
+    # a failed create is not remembered
+    @pytest.mark.asyncio
+    async def test_failure_is_not_remembered(self):
+        deduper = WebhookDeduper(window=60)
+
+        async def fail():
+            raise RuntimeError("insert failed")
+
+        with pytest.raises(RuntimeError):
+            await deduper.get_or_create(webhook(), fail)
+
+        assert await deduper.get_or_create(webhook(), Creator()) == (1, False)
+
+    # memory is bounded by maxsize
+    @pytest.mark.asyncio
+    async def test_bounded(self):
+        deduper = WebhookDeduper(window=60, maxsize=2)
+
+        for i in range(5):
+            await deduper.get_or_create(webhook(message=f"m{i}"), Creator())
+
+        assert deduper.stats()["entries"] == 2
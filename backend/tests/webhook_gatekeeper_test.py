@@ -0,0 +1,241 @@
+import hashlib
+import hmac
+import json
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from controllers.webhook_gatekeeper import WebhookGatekeeper
+from main import app
+
+TOKEN = "gate-token"
+SECRET = "signing-secret"
+
+
+async def echo(request: Request) -> JSONResponse:
+    return JSONResponse({"body": (await request.body()).decode()})
+
+
+@pytest.fixture()
+def calls():
+    return []
+
+
+@pytest.fixture()
+def client(calls):
+    """The gatekeeper in front of an app that records what reaches it."""
+    inner = Starlette(
+        routes=[
+            Route("/webhooks/note", echo, methods=["POST"]),
+            Route("/webhooks/log", echo, methods=["GET"]),
+        ]
+    )
+
+    async def recording(scope, receive, send):
+        calls.append(scope["path"])
+        await inner(scope, receive, send)
+
+    gatekeeper = WebhookGatekeeper(recording, max_body_bytes=32)
+    environ = {"WEBHOOK_TOKEN": TOKEN, "WEBHOOK_SIGNING_SECRET": SECRET}
+    with patch.dict("os.environ", environ):
+        yield TestClient(gatekeeper)
+
+
+def sign(body: bytes, secret: str = SECRET) -> str:
+    return "sha256=" + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+class TestWebhookGatekeeper:
+
+    # a valid token passes the body through unchanged
+    def test_valid_token_passes(self, client, calls):
+        response = client.post(
+            "/webhooks/note", content=b'{"a":1}', headers={"X-Webhook-Token": TOKEN}
+        )
+
+        assert response.status_code == 200
+        assert response.json() == {"body": '{"a":1}'}
+        assert calls == ["/webhooks/note"]
+
+    # missing or wrong tokens are rejected before the app is called
+    @pytest.mark.parametrize("headers", [{}, {"X-Webhook-Token": "wrong"}])
+    def test_bad_token_is_rejected(self, client, calls, headers):
+        response = client.post("/webhooks/note", content=b"{}", headers=headers)
+
+        assert response.status_code == 401
+        assert "detail" in response.json()
+        assert calls == []
+
+    # the token is re-read when the environment changes
+    def test_token_follows_environment(self, client):
+        with patch.dict("os.environ", {"WEBHOOK_TOKEN": "rotated"}):
+            old = client.post(
+                "/webhooks/note", content=b"{}", headers={"X-Webhook-Token": TOKEN}
+            )
+            new = client.post(
+                "/webhooks/note", content=b"{}", headers={"X-Webhook-Token": "rotated"}
+            )
+
+        assert old.status_code == 401
+        assert new.status_code == 200
+
+    # without WEBHOOK_TOKEN configured, no token is accepted
+    def test_unset_token_rejects_everything(self, client):
+        with patch.dict("os.environ", {"WEBHOOK_TOKEN": ""}):
+            response = client.post(
+                "/webhooks/note", content=b"{}", headers={"X-Webhook-Token": ""}
+            )
+
+        assert response.status_code == 401
+
+    # an HMAC signature of the raw body replaces the token
+    def test_valid_signature_passes(self, client):
+        body = b'{"source":"ci"}'
+
+        response = client.post(
+            "/webhooks/note", content=body, headers={"X-Webhook-Signature": sign(body)}
+        )
+
+        assert response.status_code == 200
+        assert response.json() == {"body": body.decode()}
+
+    # a signature over other bytes or with another secret is rejected
+    def test_bad_signature_is_rejected(self, client, calls):
+        body = b'{"source":"ci"}'
+        for signature in (sign(b"{}"), sign(body, "other"), "md5=abc"):
+            response = client.post(
+                "/webhooks/note",
+                content=body,
+                headers={"X-Webhook-Signature": signature},
+            )
+            assert response.status_code == 401
+        assert calls == []
+
+    # signatures are ignored unless WEBHOOK_SIGNING_SECRET is set
+    def test_signature_needs_secret(self, client):
+        body = b"{}"
+        with patch.dict("os.environ", {"WEBHOOK_SIGNING_SECRET": ""}):
+            response = client.post(
+                "/webhooks/note",
+                content=body,
+                headers={"X-Webhook-Signature": sign(body, "")},
+            )
+
+        assert response.status_code == 401
+
+    # a declared Content-Length over the limit is refused without reading
+    def test_large_content_length_is_rejected(self, client, calls):
+        response = client.post(
+            "/webhooks/note",
+            content=b"x" * 33,
+            headers={"X-Webhook-Token": TOKEN},
+        )
+
+        assert response.status_code == 413
+        assert calls == []
+
+    # a streamed body fails as soon as it passes the limit
+    def test_streamed_body_over_limit_is_rejected(self, client):
+        def chunks():
+            for _ in range(10):
+                yield b"x" * 8
+
+        response = client.post(
+            "/webhooks/note", content=chunks(), headers={"X-Webhook-Token": TOKEN}
+        )
+
+        assert response.status_code == 413
+
+    # a signed body over the limit is refused before the app is called
+    def test_signed_body_over_limit_is_rejected(self, client, calls):
+        def chunks():
+            for _ in range(10):
+                yield b"x" * 8
+
+        response = client.post(
+            "/webhooks/note",
+            content=chunks(),
+            headers={"X-Webhook-Signature": sign(b"x" * 80)},
+        )
+
+        assert response.status_code == 413
+        assert calls == []
+
+    # some paths may take larger bodies
+    def test_path_limits(self):
+        inner = Starlette(
+            routes=[
+                Route("/webhooks/note", echo, methods=["POST"]),
+                Route("/webhooks/bulk", echo, methods=["POST"]),
+            ]
+        )
+        gatekeeper = WebhookGatekeeper(
+            inner, max_body_bytes=8, path_limits={"/webhooks/bulk": 1024}
+        )
+        with patch.dict("os.environ", {"WEBHOOK_TOKEN": TOKEN}):
+            client = TestClient(gatekeeper)
+            small = client.post(
+                "/webhooks/note", content=b"x" * 9, headers={"X-Webhook-Token": TOKEN}
+            )
+            bulk = client.post(
+                "/webhooks/bulk", content=b"x" * 9, headers={"X-Webhook-Token": TOKEN}
+            )
+
+        assert small.status_code == 413
+        assert bulk.status_code == 200
+
+    # signed bodies are buffered, so they never get a larger path limit
+    def test_path_limits_do_not_apply_to_signed_bodies(self):
+        inner = Starlette(routes=[Route("/webhooks/bulk", echo, methods=["POST"])])
+        gatekeeper = WebhookGatekeeper(
+            inner, max_body_bytes=8, path_limits={"/webhooks/bulk": 1024}
+        )
+        body = b"x" * 9
+        with patch.dict("os.environ", {"WEBHOOK_SIGNING_SECRET": SECRET}):
+            response = TestClient(gatekeeper).post(
+                "/webhooks/bulk",
+                content=body,
+                headers={"X-Webhook-Signature": sign(body)},
+            )
+
+        assert response.status_code == 413
+
+    # reads and other paths are not gated
+    def test_other_requests_pass_untouched(self, client, calls):
+        assert client.get("/webhooks/log").status_code == 200
+        assert calls == ["/webhooks/log"]
+
+
+class TestGatekeeperInApp:
+
+    # the application rejects bad tokens before resolving any dependency
+    def test_rejects_before_dependencies(self):
+        with (
+            patch.dict("os.environ", {"WEBHOOK_TOKEN": TOKEN}),
+            patch("config.di.get_engine", side_effect=AssertionError("no session")),
+        ):
+            response = TestClient(app).post(
+                "/webhooks/note",
+                content=json.dumps({"source": "ci", "message": "hi"}),
+                headers={"X-Webhook-Token": "wrong"},
+            )
+
+        assert response.status_code == 401
+
+    # a streamed body over the limit fails with 413 inside the application
+    def test_streamed_body_over_limit(self):
+        def chunks():
+            for _ in range(100):
+                yield b"x" * 1024
+
+        with patch.dict("os.environ", {"WEBHOOK_TOKEN": TOKEN}):
+            response = TestClient(app).post(
+                "/webhooks/note", content=chunks(), headers={"X-Webhook-Token": TOKEN}
+            )
+
+        assert response.status_code == 413
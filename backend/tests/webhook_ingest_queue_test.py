@@ -0,0 +1,130 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from models.notes import CreateNote
+from repositories.webhook_ingest_queue import WebhookIngestQueue
+
+
+@pytest.fixture()
+def session():
+    """AsyncSession stand-in usable as `async with session_factory()`."""
+    session = AsyncMock()
+    session.__aenter__.return_value = session
+    result = MagicMock()
+    result.all.return_value = []
+    session.scalars.return_value = result
+    return session
+
+
+def inserted_batches(session) -> list[list[str]]:
+    """Titles of every multi-row INSERT issued so far, one list per batch."""
+    calls = session.scalars.await_args_list
+    return [[row["title"] for row in call.args[1]] for call in calls]
+
+
+class TestWebhookIngestQueue:
+
+    # notes arriving together are inserted with one statement
+    @pytest.mark.asyncio
+    async def test_batches_queued_notes(self, session):
+        queue = WebhookIngestQueue(lambda: session, flush_interval=0.01)
+        await queue.start()
+
+        ids = {await queue.submit(CreateNote(title=f"n{i}")) for i in range(3)}
+        await queue.stop()
+
+        assert len(ids) == 3
+        assert inserted_batches(session) == [["n0", "n1", "n2"]]
+        assert queue.stats()["inserted"] == 3
+        assert queue.stats()["batches"] == 1
+
+    # a batch never exceeds batch_size
+    @pytest.mark.asyncio
+    async def test_flushes_at_batch_size(self, session):
+        queue = WebhookIngestQueue(lambda: session, batch_size=2, flush_interval=0.01)
+        await queue.start()
+
+        for i in range(5):
+            await queue.submit(CreateNote(title=f"n{i}"))
+        await queue.stop()
+
+        assert inserted_batches(session) == [["n0", "n1"], ["n2", "n3"], ["n4"]]
+
+    # a lone note is flushed once flush_interval has passed
+    @pytest.mark.asyncio
+    async def test_flushes_after_interval(self, session):
+        queue = WebhookIngestQueue(lambda: session, flush_interval=0.01)
+        await queue.start()
+
+        await queue.submit(CreateNote(title="alone"))
+        await asyncio.sleep(0.1)
+
+        assert inserted_batches(session) == [["alone"]]
+        await queue.stop()
+
+    # a full queue pushes back instead of growing
+    @pytest.mark.asyncio
+    async def test_full_queue_rejects(self, session):
+        queue = WebhookIngestQueue(lambda: session, maxsize=1)
+        await queue.submit(CreateNote(title="first"))
+
+        with pytest.raises(asyncio.QueueFull):
+            await queue.submit(CreateNote(title="second"))
+
+        assert (queue.accepted, queue.rejected) == (1, 1)
+
+    # submit_many queues the notes that fit and rejects the rest
+    @pytest.mark.asyncio
+    async def test_submit_many_fills_remaining_capacity(self, session):
+        queue = WebhookIngestQueue(lambda: session, maxsize=3)
+        await queue.submit(CreateNote(title="first"))
+
+        ids = await queue.submit_many([CreateNote(title=f"n{i}") for i in range(4)])
+
+        assert len(ids) == 2
+        assert (queue.accepted, queue.rejected) == (3, 2)
+
+    # notes queued before shutdown are still inserted
+    @pytest.mark.asyncio
+    async def test_stop_drains_queue(self, session):
+        queue = WebhookIngestQueue(lambda: session, flush_interval=0.01)
+        for i in range(3):
+            await queue.submit(CreateNote(title=f"n{i}"))
+        await queue.start()
+
+        await queue.stop()
+
+        assert queue.stats()["depth"] == 0
+        assert queue.stats()["inserted"] == 3
+
+    # a failed insert is retried, and the worker keeps going
+    @pytest.mark.asyncio
+    async def test_failed_batch_is_retried(self, session):
+        result = session.scalars.return_value
+        session.scalars.side_effect = [RuntimeError("db down"), result, result]
+        queue = WebhookIngestQueue(
+            lambda: session, batch_size=1, flush_interval=0.01, retry_backoff=0.001
+        )
+        await queue.start()
+
+        await queue.submit(CreateNote(title="retried"))
+        await queue.submit(CreateNote(title="next"))
+        await queue.stop()
+
+        assert inserted_batches(session) == [["retried"], ["retried"], ["next"]]
+        assert (queue.retries, queue.failed, queue.inserted) == (1, 0, 2)
+
+    # after max_attempts the batch is dead-lettered in the log
+    @pytest.mark.asyncio
+    async def test_gives_up_after_max_attempts(self, session, caplog):
+        session.scalars.side_effect = RuntimeError("db down")
+        queue = WebhookIngestQueue(lambda: session, max_attempts=3, retry_backoff=0)
+
+        await queue.flush([("id-1", CreateNote(title="lost"))])
+
+        assert session.scalars.await_count == 3
+        assert (queue.retries, queue.failed, queue.inserted) == (2, 1, 0)
+        assert "Dropped webhook note id-1" in caplog.text
+        assert '"title":"lost"' in caplog.text
@@ -0,0 +1,206 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from models.notes import CreateNote
+from repositories.webhook_ingest_queue import WebhookIngestQueue
+from repositories.webhook_journal import WebhookJournal
+
+
+def segment_files(directory) -> list[str]:
+    return sorted(path.name for path in directory.glob("segment-*.log"))
+
+
+class TestWebhookJournal:
+
+    # unpersisted records survive a restart
+    @pytest.mark.asyncio
+    async def test_replays_unpersisted_records(self, tmp_path):
+        journal = WebhookJournal(tmp_path)
+        await journal.open()
+        await journal.append("a", CreateNote(title="first", tags=["x"]))
+        await journal.append("b", CreateNote(title="second"))
+        await journal.close()
+
+        recovered = await WebhookJournal(tmp_path).open()
+
+        assert [(i, note.title) for i, note in recovered] == [
+            ("a", "first"),
+            ("b", "second"),
+        ]
+        assert recovered[0][1].tags == ["x"]
+
+    # persisted records are not replayed
+    @pytest.mark.asyncio
+    async def test_skips_persisted_records(self, tmp_path):
+        journal = WebhookJournal(tmp_path, segment_bytes=1)
+        await journal.open()
+        await journal.append("a", CreateNote(title="first"))
+        await journal.append("b", CreateNote(title="second"))
+        journal.mark_persisted(["a"])
+        await journal.close()
+
+        recovered = await WebhookJournal(tmp_path).open()
+
+        assert [i for i, _ in recovered] == ["b"]
+
+    # a segment is deleted once all its records are persisted
+    @pytest.mark.asyncio
+    async def test_compacts_persisted_segments(self, tmp_path):
+        journal = WebhookJournal(tmp_path, segment_bytes=1)
+        await journal.open()
+        for ingestion_id in ("a", "b", "c"):
+            await journal.append(ingestion_id, CreateNote(title=ingestion_id))
+
+        journal.mark_persisted(["a", "b"])
+
+        # "c" and the segment being written remain
+        assert len(segment_files(tmp_path)) == 1
+        assert journal.stats()["unpersisted"] == 1
+        await journal.close()
+
+    # a record torn by a crash is ignored with everything after it
+    @pytest.mark.asyncio
+    async def test_ignores_torn_tail(self, tmp_path):
+        journal = WebhookJournal(tmp_path)
+        await journal.open()
+        await journal.append("a", CreateNote(title="whole"))
+        await journal.close()
+        (segment,) = tmp_path.glob("segment-*.log")
+        with open(segment, "ab") as file:
+            file.write(b'0badc0de {"id":"b","no')
+
+        recovered = await WebhookJournal(tmp_path).open()
+
+        assert [i for i, _ in recovered] == ["a"]
+
+    # records appended after a failed write are still replayed
+    @pytest.mark.asyncio
+    async def test_failed_write_rolls_segment(self, tmp_path):
+        journal = WebhookJournal(tmp_path)
+        await journal.open()
+        await journal.append("a", CreateNote(title="before"))
+        file = journal._file
+
+        class DiskFull:
+            """Writes half of the data, then fails like a full disk."""
+
+            def write(self, data):
+                file.write(data[: len(data) // 2])
+                raise OSError(28, "No space left on device")
+
+            def close(self):
+                file.close()
+
+        journal._file = DiskFull()
+        with pytest.raises(OSError):
+            await journal.append("b", CreateNote(title="failed"))
+        await journal.append("c", CreateNote(title="after"))
+        await journal.close()
+
+        recovered = await WebhookJournal(tmp_path).open()
+
+        assert [i for i, _ in recovered] == ["a", "c"]
+
+    # concurrent appends share fsyncs
+    @pytest.mark.asyncio
+    async def test_group_commits_concurrent_appends(self, tmp_path):
+        journal = WebhookJournal(tmp_path)
+        await journal.open()
+
+        await asyncio.gather(
+            *(journal.append(str(i), CreateNote(title=f"n{i}")) for i in range(50))
+        )
+
+        assert journal.stats()["appends"] == 50
+        assert journal.stats()["commits"] < 50
+        await journal.close()
+
+    # the records of one append_many are written with a single fsync
+    @pytest.mark.asyncio
+    async def test_append_many_commits_once(self, tmp_path):
+        journal = WebhookJournal(tmp_path)
+        await journal.open()
+
+        await journal.append_many(
+            [(str(i), CreateNote(title=f"n{i}")) for i in range(20)]
+        )
+
+        assert journal.stats()["appends"] == 20
+        assert journal.stats()["commits"] == 1
+        await journal.close()
+
+
+class TestJournaledQueue:
+
+    @pytest.fixture()
+    def session(self):
+        session = AsyncMock()
+        session.__aenter__.return_value = session
+        result = MagicMock()
+        result.all.return_value = []
+        session.scalars.return_value = result
+        return session
+
+    # notes accepted before a crash are inserted by the next process
+    @pytest.mark.asyncio
+    async def test_recovers_notes_lost_in_crash(self, tmp_path, session):
+        crashed = WebhookIngestQueue(AsyncMock(), journal=WebhookJournal(tmp_path))
+        await crashed.journal.open()
+        await crashed.submit(CreateNote(title="accepted"))
+        # the worker never ran: the process died with the note still queued
+
+        queue = WebhookIngestQueue(lambda: session, journal=WebhookJournal(tmp_path))
+
+        assert await queue.recover() == 1
+        (rows,) = [call.args[1] for call in session.scalars.await_args_list]
+        assert [row["title"] for row in rows] == ["accepted"]
+        assert queue.journal.stats()["unpersisted"] == 0
+        assert len(segment_files(tmp_path)) == 1
+        await queue.journal.close()
+
+    # a note inserted normally is not replayed
+    @pytest.mark.asyncio
+    async def test_inserted_notes_are_not_replayed(self, tmp_path, session):
+        queue = WebhookIngestQueue(
+            lambda: session, flush_interval=0.01, journal=WebhookJournal(tmp_path)
+        )
+        await queue.recover()
+        await queue.start()
+        await queue.submit(CreateNote(title="inserted"))
+        await queue.stop()
+
+        assert await WebhookJournal(tmp_path).open() == []
+
+    # notes given up on move to the dead-letter file and are not replayed
+    @pytest.mark.asyncio
+    async def test_dead_letters_are_not_replayed(self, tmp_path, session):
+        session.scalars.side_effect = RuntimeError("db down")
+        queue = WebhookIngestQueue(
+            lambda: session,
+            journal=WebhookJournal(tmp_path, segment_bytes=1),
+            max_attempts=2,
+            retry_backoff=0,
+        )
+        await queue.recover()
+        await queue.submit(CreateNote(title="poison"))
+
+        await queue.flush([queue._queue.get_nowait()])
+        await queue.journal.close()
+
+        assert queue.journal.stats()["dead_lettered"] == 1
+        assert b'"title":"poison"' in (tmp_path / "dead-letter.log").read_bytes()
+        assert await WebhookJournal(tmp_path).open() == []
+
+    # a chunk submitted together is journaled with one fsync and replayed
+    @pytest.mark.asyncio
+    async def test_submit_many_journals_chunk_once(self, tmp_path):
+        crashed = WebhookIngestQueue(AsyncMock(), journal=WebhookJournal(tmp_path))
+        await crashed.journal.open()
+
+        ids = await crashed.submit_many([CreateNote(title=f"n{i}") for i in range(5)])
+
+        assert crashed.journal.stats()["commits"] == 1
+        recovered = await WebhookJournal(tmp_path).open()
+        assert [i for i, _ in recovered] == ids
@@ -0,0 +1,77 @@
+from datetime import datetime
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from models.pagination import KeysetCursor
+from repositories.webhook_log_buffer import WebhookLogBuffer, WebhookLogRecord
+
+
+def record(record_id: int, source: str = "ci") -> WebhookLogRecord:
+    return WebhookLogRecord(
+        record_id,
+        source,
+        f"event {record_id} ✓",
+        ["deploy"],
+        datetime(2026, 1, 1, 12, 0, 0, record_id),
+    )
+
+
+def filled(capacity: int, count: int) -> WebhookLogBuffer:
+    buffer = WebhookLogBuffer(capacity)
+    for record_id in range(1, count + 1):
+        buffer.append(record(record_id))
+    return buffer
+
+
+class TestWebhookLogBuffer:
+
+    # a full buffer overwrites its oldest record
+    def test_overwrites_oldest(self):
+        buffer = filled(3, 5)
+
+        assert len(buffer) == 3
+        assert [r.id for r in buffer.newest_first()] == [5, 4, 3]
+
+    # timestamps round-trip exactly through their integer form
+    def test_keeps_microsecond_timestamps(self):
+        assert record(7).as_log()["datetime"] == datetime(2026, 1, 1, 12, 0, 0, 7)
+
+    # equal sources and tags share one string object
+    def test_interns_strings(self):
+        first = record(1, "".join(["n", "8", "n"]))
+        second = record(2, "".join(["n", "8", "n"]))
+
+        assert first.source is second.source
+        assert first.tags[0] is second.tags[0]
+
+    # a page is byte-identical to FastAPI's rendering of the same entries
+    def test_page_matches_fastapi_encoding(self):
+        buffer = filled(5, 3)
+        entries = [r.as_log() for r in buffer.newest_first()][:2]
+
+        page = buffer.page(2)
+
+        assert page.body == JSONResponse(jsonable_encoder(entries)).body
+        cursor = KeysetCursor.decode(page.next_cursor)
+        assert (cursor.id, cursor.position) == (2, entries[-1]["datetime"])
+
+    # a short page is the last one
+    def test_short_page_has_no_cursor(self):
+        assert filled(5, 1).page(2).next_cursor is None
+
+    # pages are serialized once until the next append
+    def test_page_cached_until_append(self):
+        buffer = filled(5, 3)
+        page = buffer.page(2)
+
+        assert buffer.page(2) is page
+        buffer.append(record(4))
+        assert buffer.page(2) is not page
+
+    # zero capacity keeps nothing
+    def test_zero_capacity(self):
+        buffer = filled(0, 2)
+
+        assert len(buffer) == 0
+        assert buffer.page(5).body == b"[]"
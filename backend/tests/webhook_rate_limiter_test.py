@@ -0,0 +1,218 @@
+import pytest
+
+from repositories import webhook_rate_limiter
+from repositories.webhook_rate_limiter import (
+    RateLimit,
+    RedisWebhookRateLimiter,
+    WebhookRateLimiter,
+    create_webhook_rate_limiter,
+    parse_limits,
+)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FakeRedis:
+    """
+    Local stand-in for EVAL of TAKE_SCRIPT: the same bucket arithmetic on
+    hashes kept here, with a clock the test controls.
+    """
+
+    def __init__(self, clock: Clock):
+        self.clock = clock
+        self.hashes: dict[str, dict[str, float]] = {}
+        self.scripts: set[str] = set()
+
+    async def eval(self, script: str, numkeys: int, *args):
+        self.scripts.add(script)
+        keys, limits = args[:numkeys], args[numkeys:]
+        now = self.clock()
+        levels = []
+        retry_after = 0
+        for i, key in enumerate(keys):
+            rate, burst = limits[2 * i], limits[2 * i + 1]
+            state = self.hashes.get(key, {"tokens": burst, "updated": now})
+            tokens = min(
+                burst, state["tokens"] + max(0, now - state["updated"]) * rate
+            )
+            if tokens < 1:
+                retry_after = max(retry_after, (1 - tokens) / rate)
+            levels.append(tokens)
+        result = [str(retry_after).encode()]
+        for key, tokens in zip(keys, levels):
+            if retry_after == 0:
+                tokens -= 1
+            self.hashes[key] = {"tokens": tokens, "updated": now}
+            result.append(str(tokens).encode())
+        return result
+
+    async def aclose(self) -> None:
+        pass
+
+
+@pytest.fixture()
+def clock():
+    return Clock()
+
+
+class TestWebhookRateLimiter:
+
+    # a burst is allowed, the next webhook waits for one token's refill
+    @pytest.mark.asyncio
+    async def test_burst_then_limited(self, clock):
+        limiter = WebhookRateLimiter(RateLimit(rate=2, burst=3), clock=clock)
+
+        results = [await limiter.check("ci", "t") for _ in range(4)]
+
+        assert results[:3] == [0, 0, 0]
+        assert results[3] == pytest.approx(0.5)
+        assert limiter.stats()["limited"] == 1
+
+    # tokens refill with time, up to the burst
+    @pytest.mark.asyncio
+    async def test_refills_over_time(self, clock):
+        limiter = WebhookRateLimiter(RateLimit(rate=1, burst=2), clock=clock)
+        for _ in range(2):
+            await limiter.check("ci", "t")
+
+        clock.now += 1
+        assert await limiter.check("ci", "t") == 0
+        assert await limiter.check("ci", "t") > 0
+        clock.now += 100
+        assert limiter.stats()["buckets"]["source:ci"]["tokens"] == 2
+
+    # sources have separate buckets, with per-source overrides
+    @pytest.mark.asyncio
+    async def test_buckets_per_source(self, clock):
+        limiter = WebhookRateLimiter(
+            RateLimit(1, 1), source_limits={"bulk": RateLimit(1, 5)}, clock=clock
+        )
+
+        assert await limiter.check("ci", "t") == 0
+        assert await limiter.check("ci", "t") > 0
+        assert await limiter.check("n8n", "t") == 0
+        assert [await limiter.check("bulk", "t") for _ in range(5)] == [0] * 5
+
+    # one credential is limited across all sources it sends for
+    @pytest.mark.asyncio
+    async def test_credential_bucket_spans_sources(self, clock):
+        limiter = WebhookRateLimiter(None, RateLimit(1, 2), clock=clock)
+
+        assert await limiter.check("a", "token-1") == 0
+        assert await limiter.check("b", "token-1") == 0
+        assert await limiter.check("c", "token-1") > 0
+        assert await limiter.check("c", "token-2") == 0
+        assert await limiter.check("c", None) == 0
+
+    # a webhook the credential limit turns away leaves the source's tokens
+    @pytest.mark.asyncio
+    async def test_credential_limit_keeps_source_tokens(self, clock):
+        limiter = WebhookRateLimiter(RateLimit(1, 5), RateLimit(1, 1), clock=clock)
+
+        results = [await limiter.check("ci", "tok") for _ in range(5)]
+
+        assert results == [0, 1, 1, 1, 1]
+        assert limiter.stats()["buckets"]["source:ci"]["tokens"] == 4
+
+    # credentials show up hashed, never in clear text
+    @pytest.mark.asyncio
+    async def test_stats_hide_tokens(self, clock):
+        limiter = WebhookRateLimiter(None, RateLimit(1, 2), clock=clock)
+
+        await limiter.check("ci", "secret-token")
+
+        [key] = limiter.stats()["buckets"]
+        assert key.startswith("credential:")
+        assert "secret" not in key
+
+    # only the most recently used buckets are kept
+    @pytest.mark.asyncio
+    async def test_buckets_are_bounded(self, clock):
+        limiter = WebhookRateLimiter(RateLimit(1, 1), max_buckets=2, clock=clock)
+
+        for source in ("a", "b", "a", "c"):
+            await limiter.check(source, "t")
+
+        assert list(limiter.stats()["buckets"]) == ["source:a", "source:c"]
+
+
+class TestRedisWebhookRateLimiter:
+
+    # workers sharing Redis share the buckets
+    @pytest.mark.asyncio
+    async def test_workers_share_buckets(self, clock):
+        redis = FakeRedis(clock)
+        worker_a = RedisWebhookRateLimiter(redis, RateLimit(1, 2), clock=clock)
+        worker_b = RedisWebhookRateLimiter(redis, RateLimit(1, 2), clock=clock)
+
+        assert await worker_a.check("ci", "t") == 0
+        assert await worker_b.check("ci", "t") == 0
+        assert await worker_a.check("ci", "t") == pytest.approx(1)
+        assert redis.scripts == {webhook_rate_limiter.TAKE_SCRIPT}
+        assert "webhook-rate:source:ci" in redis.hashes
+
+    # both buckets are checked in one script call, taking from neither
+    # when one is empty
+    @pytest.mark.asyncio
+    async def test_credential_limit_keeps_source_tokens(self, clock):
+        redis = FakeRedis(clock)
+        limiter = RedisWebhookRateLimiter(
+            redis, RateLimit(1, 5), RateLimit(1, 1), clock=clock
+        )
+
+        results = [await limiter.check("ci", "tok") for _ in range(5)]
+
+        assert results == [0, 1, 1, 1, 1]
+        assert redis.hashes["webhook-rate:source:ci"]["tokens"] == 4
+
+    # the local stats mirror the last level Redis reported
+    @pytest.mark.asyncio
+    async def test_stats_mirror_redis(self, clock):
+        redis = FakeRedis(clock)
+        limiter = RedisWebhookRateLimiter(redis, RateLimit(1, 3), clock=clock)
+
+        await limiter.check("ci", "t")
+
+        assert limiter.stats()["buckets"]["source:ci"]["tokens"] == 2
+
+
+class TestConfiguration:
+
+    # per-source limits are parsed as source=rate/burst, burst defaulting
+    def test_parse_limits(self):
+        assert parse_limits("ci=5/20, n8n=0.5,") == {
+            "ci": RateLimit(5, 20),
+            "n8n": RateLimit(0.5, 1),
+        }
+
+    # malformed or impossible limits fail at startup
+    @pytest.mark.parametrize("value", ["ci=fast", "ci=0/5", "ci"])
+    def test_parse_limits_rejects_invalid(self, value):
+        with pytest.raises(RuntimeError):
+            parse_limits(value)
+
+    # no limit configured → no limiter
+    def test_disabled_by_default(self, monkeypatch):
+        for name in ("WEBHOOK_SOURCE_RATE", "WEBHOOK_CREDENTIAL_RATE"):
+            monkeypatch.delenv(name, raising=False)
+        monkeypatch.delenv("WEBHOOK_SOURCE_LIMITS", raising=False)
+
+        assert create_webhook_rate_limiter() is None
+
+    # the memory backend is built from the environment
+    def test_builds_memory_limiter(self, monkeypatch):
+        monkeypatch.setenv("WEBHOOK_SOURCE_RATE", "10")
+        monkeypatch.setenv("WEBHOOK_SOURCE_LIMITS", "ci=1/2")
+        monkeypatch.delenv("WEBHOOK_RATE_BACKEND", raising=False)
+
+        limiter = create_webhook_rate_limiter()
+
+        assert type(limiter) is WebhookRateLimiter
+        assert limiter.source_limit == RateLimit(10, 10)
+        assert limiter.source_limits == {"ci": RateLimit(1, 2)}
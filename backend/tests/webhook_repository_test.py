@@ -0,0 +1,259 @@
+import json
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from sqlalchemy.dialects.postgresql.asyncpg import dialect as asyncpg_dialect
+
+from models.pagination import KeysetCursor
+from models.webhooks import WebhookLogEntry, WebhookNote
+from repositories import webhook_repository
+from repositories.webhook_log_buffer import WebhookLogRecord
+from repositories.webhook_repository import (
+    PostgresWebhookRepository,
+    WebhookRepository,
+)
+
+
+def entry(entry_id: int, source: str = "ci", tags: list[str] = ()) -> WebhookLogEntry:
+    return WebhookLogEntry(
+        id=entry_id,
+        source=source,
+        message=f"event {entry_id}",
+        tags=list(tags),
+        received_at=datetime(2026, 1, 1, 12, 0, entry_id),
+    )
+
+
+@pytest.fixture()
+def session():
+    """AsyncSession stand-in usable as `async with session_factory()`."""
+    session = AsyncMock()
+    session.__aenter__.return_value = session
+    result = MagicMock()
+    result.all.return_value = []
+    session.exec.return_value = result
+    return session
+
+
+def stored(session, *entries: WebhookLogEntry) -> None:
+    """Make every SELECT return `entries`, newest first."""
+    session.exec.return_value.all.return_value = sorted(
+        entries, key=lambda e: e.id, reverse=True
+    )
+
+
+def compiled_sql(session) -> str:
+    statement = session.exec.await_args.args[0]
+    return str(statement.compile(dialect=asyncpg_dialect()))
+
+
+class TestWebhookRepository:
+
+    @pytest.fixture()
+    def repo(self):
+        repo = WebhookRepository()
+        repo.logs.append(WebhookLogRecord.from_entry(entry(1, "ci", ["a"])))
+        repo.logs.append(WebhookLogRecord.from_entry(entry(2, "n8n", ["a", "b"])))
+        repo.logs.append(WebhookLogRecord.from_entry(entry(3, "ci", ["b"])))
+        return repo
+
+    # entries are listed newest first
+    @pytest.mark.asyncio
+    async def test_lists_newest_first(self, repo):
+        assert [e["id"] for e in await repo.get_all()] == [3, 2, 1]
+
+    # source and tag filters combine
+    @pytest.mark.asyncio
+    async def test_filters(self, repo):
+        assert [e["id"] for e in await repo.get_all(source="ci")] == [3, 1]
+        assert [e["id"] for e in await repo.get_all(tags=["a", "b"])] == [2]
+        assert await repo.get_all(source="n8n", tags=["x"]) == []
+
+    # a cursor continues after the last entry of the previous page
+    @pytest.mark.asyncio
+    async def test_cursor_pages(self, repo):
+        first = await repo.get_all(limit=2)
+        last = first[-1]
+        cursor = KeysetCursor(position=last["datetime"], id=last["id"])
+
+        second = await repo.get_all(limit=2, cursor=cursor)
+
+        assert [e["id"] for e in first] == [3, 2]
+        assert [e["id"] for e in second] == [1]
+
+    # only the most recent entries up to capacity are kept
+    @pytest.mark.asyncio
+    async def test_log_is_bounded(self):
+        repo = WebhookRepository(capacity=2)
+        for message in ("first", "second", "third"):
+            await repo.log(WebhookNote(source="ci", message=message))
+
+        assert [e["message"] for e in await repo.get_all()] == ["third", "second"]
+
+
+class TestPostgresWebhookRepository:
+
+    @pytest.fixture()
+    def repo(self, session):
+        return PostgresWebhookRepository(lambda: session, tail_size=3, tail_ttl=60)
+
+    # a recent listing is answered from the hot tail after the first load
+    @pytest.mark.asyncio
+    async def test_recent_listing_uses_tail(self, repo, session):
+        stored(session, entry(1), entry(2))
+
+        first = await repo.get_all(limit=2)
+        second = await repo.get_all(limit=2)
+
+        assert [e["id"] for e in first] == [e["id"] for e in second] == [2, 1]
+        session.exec.assert_awaited_once()
+
+    # the whole table fits in the tail → short filtered pages are final
+    @pytest.mark.asyncio
+    async def test_complete_tail_answers_short_page(self, repo, session):
+        stored(session, entry(1, "ci"), entry(2, "n8n"))
+
+        page = await repo.get_all(source="ci", limit=2)
+
+        assert [e["id"] for e in page] == [1]
+        session.exec.assert_awaited_once()
+
+    # a short page from a full tail may be missing older rows → database
+    @pytest.mark.asyncio
+    async def test_partial_tail_falls_back_to_query(self, repo, session):
+        stored(session, entry(2, "n8n"), entry(3, "n8n"), entry(4, "ci"))
+
+        await repo.get_all(source="ci", limit=2)
+
+        assert session.exec.await_count == 2
+        sql = compiled_sql(session)
+        assert "webhook_log.source = $1::VARCHAR" in sql
+        assert "ORDER BY webhook_log.received_at DESC, webhook_log.id DESC" in sql
+
+    # cursor pages always come from the table, through the keyset index
+    @pytest.mark.asyncio
+    async def test_cursor_queries_table(self, repo, session):
+        cursor = KeysetCursor(position=datetime(2026, 1, 1), id=7)
+        since = datetime(2025, 1, 1)
+
+        await repo.get_all(limit=2, cursor=cursor, tags=["a"], since=since)
+
+        session.exec.assert_awaited_once()
+        sql = compiled_sql(session)
+        assert "(webhook_log.received_at, webhook_log.id) < ($" in sql
+        assert "webhook_log.tags @>" in sql
+        assert "webhook_log.received_at >= $" in sql
+
+    # an unfiltered page is served serialized from the tail
+    @pytest.mark.asyncio
+    async def test_page_from_tail(self, repo, session):
+        stored(session, entry(1), entry(2))
+
+        page = await repo.get_page(2)
+
+        assert [e["id"] for e in json.loads(page.body)] == [2, 1]
+        assert await repo.get_page(2) is page
+        session.exec.assert_awaited_once()
+
+    # a page larger than the tail → no page, the caller queries instead
+    @pytest.mark.asyncio
+    async def test_no_page_larger_than_tail(self, repo, session):
+        stored(session, entry(1), entry(2), entry(3))
+
+        assert await repo.get_page(3) is not None
+        assert await repo.get_page(4) is None
+
+    # logging only buffers; the flush inserts and extends the tail, no reload
+    @pytest.mark.asyncio
+    async def test_log_is_buffered_until_flush(self, repo, session):
+        stored(session)
+        await repo.get_all(limit=2)
+        inserted = MagicMock()
+        inserted.all.return_value = [entry(1)]
+        session.scalars.return_value = inserted
+
+        await repo.log(WebhookNote(source="ci", message="new"))
+
+        session.scalars.assert_not_awaited()
+        await repo.flush()
+        assert [e["id"] for e in await repo.get_all(limit=2)] == [1]
+        session.exec.assert_awaited_once()
+        session.commit.assert_awaited_once()
+
+    # buffered entries are inserted with one multi-row INSERT per batch
+    @pytest.mark.asyncio
+    async def test_flush_is_one_statement_per_batch(self, repo, session):
+        stored(session)
+        await repo.get_all(limit=2)
+        inserted = MagicMock()
+        inserted.all.return_value = [entry(1), entry(2)]
+        session.scalars.return_value = inserted
+
+        await repo.log_many(
+            [WebhookNote(source="ci", message=m) for m in ("a", "b")]
+        )
+        await repo.flush()
+
+        statement, rows = session.scalars.await_args.args
+        assert [row["message"] for row in rows] == ["a", "b"]
+        assert "RETURNING" in str(statement.compile(dialect=asyncpg_dialect()))
+        assert [e["id"] for e in await repo.get_all(limit=2)] == [2, 1]
+        session.commit.assert_awaited_once()
+
+    # a failed insert keeps the entries, in order, for the next flush
+    @pytest.mark.asyncio
+    async def test_failed_flush_keeps_entries(self, repo, session):
+        inserted = MagicMock()
+        inserted.all.return_value = [entry(1), entry(2)]
+        session.scalars.side_effect = [RuntimeError("db down"), inserted]
+        await repo.log_many(
+            [WebhookNote(source="ci", message=m) for m in ("a", "b")]
+        )
+
+        with pytest.raises(RuntimeError):
+            await repo.flush()
+        await repo.flush()
+
+        _, rows = session.scalars.await_args.args
+        assert [row["message"] for row in rows] == ["a", "b"]
+        assert not repo._pending
+
+    # the buffer is bounded: the oldest entries are dropped and counted
+    @pytest.mark.asyncio
+    async def test_buffer_is_bounded(self, session):
+        repo = PostgresWebhookRepository(lambda: session, max_pending=2)
+
+        await repo.log_many(
+            [WebhookNote(source="ci", message=m) for m in ("a", "b", "c")]
+        )
+
+        assert [row["message"] for row in repo._pending] == ["b", "c"]
+        assert repo.dropped == 1
+
+    # stop writes what is still buffered
+    @pytest.mark.asyncio
+    async def test_stop_flushes(self, repo, session):
+        inserted = MagicMock()
+        inserted.all.return_value = [entry(1)]
+        session.scalars.return_value = inserted
+        await repo.start()
+        await repo.log(WebhookNote(source="ci", message="last"))
+
+        await repo.stop()
+
+        _, rows = session.scalars.await_args.args
+        assert [row["message"] for row in rows] == ["last"]
+
+    # the sweep deletes expired rows in batches until a batch comes up short
+    @pytest.mark.asyncio
+    async def test_sweep_deletes_in_batches(self, repo, session, monkeypatch):
+        monkeypatch.setattr(webhook_repository, "SWEEP_BATCH_SIZE", 2)
+        session.execute.side_effect = [MagicMock(rowcount=2), MagicMock(rowcount=1)]
+
+        assert await repo.sweep() == 3
+
+        sql = str(
+            session.execute.await_args.args[0].compile(dialect=asyncpg_dialect())
+        )
+        assert sql.startswith("DELETE FROM webhook_log WHERE webhook_log.id IN")
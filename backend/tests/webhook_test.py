@@ -1,12 +1,29 @@
+import base64
+import hashlib
+import hmac
+import json
 from datetime import datetime
 from unittest.mock import AsyncMock, patch
 
 import pytest
 from fastapi.testclient import TestClient
 
-from config.di import get_note_repo, get_webhook_repo
+from config.di import (
+    get_note_cache,
+    get_note_repo,
+    get_session,
+    get_webhook_deduper,
+    get_webhook_queue,
+    get_webhook_rate_limiter,
+    get_webhook_repo,
+)
+from controllers import webhook_controller
+from controllers.webhook_gatekeeper import WebhookGatekeeper
 from main import app
 from models.notes import CreateNote, Note
+from repositories.webhook_deduper import WebhookDeduper
+from repositories.webhook_ingest_queue import WebhookIngestQueue
+from repositories.webhook_rate_limiter import RateLimit, WebhookRateLimiter
 from repositories.webhook_repository import WebhookRepository
 
 WEBHOOK_TOKEN = "test-secret-token"
@@ -36,14 +53,19 @@ def mock_note_repo():
             content=note.content,
             tags=note.tags,
             created_at=datetime(2026, 1, 1, 12, 0, 0),
+            updated_at=datetime(2026, 1, 1, 12, 0, 0),
         )
         stored_notes.append(db_note)
         return db_note
 
-    async def fake_get_all(q=None, tag=None, limit=3, offset=0):
+    async def fake_get_all(q=None, tag=None, limit=3, offset=0, **kwargs):
         return stored_notes
 
+    async def fake_create_many(notes: list[CreateNote]) -> list[Note]:
+        return [await fake_create(note) for note in notes]
+
     repo.create.side_effect = fake_create
+    repo.create_many.side_effect = fake_create_many
     repo.get_all.side_effect = fake_get_all
     return repo
 
@@ -56,6 +78,9 @@ def client(mock_note_repo, webhook_repo):
     """
     app.dependency_overrides[get_note_repo] = lambda: mock_note_repo
     app.dependency_overrides[get_webhook_repo] = lambda: webhook_repo
+    app.dependency_overrides[get_webhook_queue] = lambda: None
+    app.dependency_overrides[get_webhook_rate_limiter] = lambda: None
+    app.dependency_overrides[get_webhook_deduper] = lambda: None
     with patch.dict("os.environ", {"WEBHOOK_TOKEN": WEBHOOK_TOKEN}):
         yield TestClient(app)
     app.dependency_overrides.clear()
@@ -152,7 +177,7 @@ class TestWebhookCreatesAndRetrievesNote:
         )
 
         assert len(webhook_repo.logs) == 1
-        assert webhook_repo.logs[0]["source"] == "ci"
+        assert next(webhook_repo.logs.newest_first()).source == "ci"
 
     def test_multiple_webhooks_all_retrievable(
         self,
@@ -284,3 +309,414 @@ class TestWebhookValidationMissingFields:
         assert "automated" in created["tags"]
         assert "test" in created["tags"]
         assert "source:api" in created["tags"]
+
+
+class TestWebhookLog:
+
+    def post(self, client, source: str, tags: list[str]):
+        client.post(
+            "/webhooks/note",
+            json={"source": source, "message": "event", "tags": tags},
+            headers={"X-Webhook-Token": WEBHOOK_TOKEN},
+        )
+
+    # the log lists newest first and filters by source and tag
+    def test_filters_by_source_and_tag(self, client: TestClient):
+        self.post(client, "ci", ["deploy"])
+        self.post(client, "n8n", ["deploy"])
+        self.post(client, "ci", ["build"])
+
+        entries = client.get(
+            "/webhooks/log", params={"source": "ci", "tag": "source:ci"}
+        ).json()
+
+        assert [e["tags"][0] for e in entries] == ["build", "deploy"]
+
+    # a full page carries a cursor to the next, older page
+    def test_pages_with_cursor(self, client: TestClient):
+        for tag in ("a", "b", "c"):
+            self.post(client, "ci", [tag])
+
+        first = client.get("/webhooks/log", params={"limit": 2})
+        second = client.get(
+            "/webhooks/log",
+            params={"limit": 2, "cursor": first.headers["X-Next-Cursor"]},
+        )
+
+        assert [e["tags"][0] for e in first.json()] == ["c", "b"]
+        assert [e["tags"][0] for e in second.json()] == ["a"]
+        assert "X-Next-Cursor" not in second.headers
+
+    # time bounds may carry a timezone
+    def test_accepts_aware_time_range(self, client: TestClient):
+        self.post(client, "ci", [])
+
+        response = client.get("/webhooks/log", params={"since": "2000-01-01T00:00:00Z"})
+
+        assert response.status_code == 200
+        assert len(response.json()) == 1
+
+    # garbage cursor → 400
+    def test_invalid_cursor_returns_400(self, client: TestClient):
+        response = client.get("/webhooks/log", params={"cursor": "nope"})
+
+        assert response.status_code == 400
+
+    # a cursor with a timezone is rejected, not compared with naive times
+    def test_aware_cursor_returns_400(self, client: TestClient):
+        raw = b'{"position": "2026-01-01T00:00:00Z", "id": 1}'
+        cursor = base64.urlsafe_b64encode(raw).decode()
+
+        response = client.get("/webhooks/log", params={"cursor": cursor})
+
+        assert response.status_code == 400
+
+
+class TestWebhookQueueMode:
+
+    @pytest.fixture()
+    def queue(self, client):
+        queue = WebhookIngestQueue(AsyncMock(), maxsize=1)
+        app.dependency_overrides[get_webhook_queue] = lambda: queue
+        return queue
+
+    # a queued webhook is acknowledged with 202 and an ingestion id
+    def test_queued_webhook_returns_202(
+        self, client: TestClient, queue, mock_note_repo, webhook_repo
+    ):
+        response = client.post(
+            "/webhooks/note",
+            json={"source": "ci", "message": "Build passed"},
+            headers={"X-Webhook-Token": WEBHOOK_TOKEN},
+        )
+
+        assert response.status_code == 202
+        assert response.json()["ingestion_id"]
+        assert queue.stats()["depth"] == 1
+        mock_note_repo.create.assert_not_awaited()
+        assert len(webhook_repo.logs) == 1
+
+    # a full queue → 429 with Retry-After
+    def test_full_queue_returns_429(self, client: TestClient, queue):
+        for _ in range(2):
+            response = client.post(
+                "/webhooks/note",
+                json={"source": "ci", "message": "Build passed"},
+                headers={"X-Webhook-Token": WEBHOOK_TOKEN},
+            )
+
+        assert response.status_code == 429
+        assert response.headers["Retry-After"] == "1"
+        assert queue.stats()["rejected"] == 1
+
+
+class TestWebhookBulk:
+
+    def post(self, client: TestClient, content, content_type="application/json"):
+        return client.post(
+            "/webhooks/notes",
+            content=content,
+            headers={"X-Webhook-Token": WEBHOOK_TOKEN, "Content-Type": content_type},
+        )
+
+    # a JSON array creates every note and reports each id in order
+    def test_array_creates_notes(
+        self, client: TestClient, mock_note_repo, webhook_repo
+    ):
+        items = [{"source": "ci", "message": f"event {i}"} for i in range(3)]
+
+        response = self.post(client, json.dumps(items))
+
+        assert response.status_code == 201
+        assert [(r["index"], r["id"]) for r in response.json()] == [
+            (0, 1),
+            (1, 2),
+            (2, 3),
+        ]
+        mock_note_repo.create_many.assert_awaited_once()
+        [notes] = mock_note_repo.create_many.await_args.args
+        assert notes[0].tags == ["source:ci"]
+        assert len(webhook_repo.logs) == 3
+
+    # a streamed NDJSON body is inserted in chunks of BULK_CHUNK_SIZE
+    def test_ndjson_stream_is_chunked(
+        self, client: TestClient, mock_note_repo, monkeypatch
+    ):
+        monkeypatch.setattr(webhook_controller, "BULK_CHUNK_SIZE", 2)
+
+        def lines():
+            for i in range(5):
+                yield json.dumps({"source": "ci", "message": f"m{i}"}).encode()
+                yield b"\n"
+
+        response = self.post(client, lines(), "application/x-ndjson")
+
+        assert response.status_code == 201
+        assert len(response.json()) == 5
+        calls = mock_note_repo.create_many.await_args_list
+        assert [len(call.args[0]) for call in calls] == [2, 2, 1]
+
+    # bad lines are reported by index and the others are still created
+    def test_invalid_items_return_207(self, client: TestClient):
+        body = '{"source": "ci", "message": "ok"}\n{"source": "ci"}\nnope\n'
+
+        response = self.post(client, body, "application/x-ndjson")
+
+        assert response.status_code == 207
+        results = response.json()
+        assert results[0]["id"] == 1
+        assert results[1]["errors"][0]["loc"] == ["message"]
+        assert results[2]["errors"][0]["type"] == "json_invalid"
+
+    # items over a source's rate limit are rejected one by one
+    def test_rate_limited_items(self, client: TestClient):
+        limiter = WebhookRateLimiter(RateLimit(rate=1, burst=2), clock=lambda: 0.0)
+        app.dependency_overrides[get_webhook_rate_limiter] = lambda: limiter
+        items = [{"source": "ci", "message": f"event {i}"} for i in range(3)]
+
+        results = self.post(client, json.dumps(items)).json()
+
+        assert [r["id"] for r in results] == [1, 2, None]
+        assert results[2]["errors"][0]["type"] == "rate_limited"
+        assert results[2]["errors"][0]["retry_after"] == 1
+
+    # a body over the limit still gets the results of what was stored
+    @pytest.mark.asyncio
+    async def test_body_over_limit_returns_stored_results(
+        self, client: TestClient, monkeypatch
+    ):
+        monkeypatch.setattr(webhook_controller, "BULK_CHUNK_SIZE", 1)
+        gatekeeper = WebhookGatekeeper(app, path_limits={"/webhooks/notes": 200})
+        # one line per ASGI message, as a client streaming the body sends it
+        messages = [
+            {
+                "type": "http.request",
+                "body": json.dumps({"source": "ci", "message": f"m{i}"}).encode()
+                + b"\n",
+                "more_body": True,
+            }
+            for i in range(10)
+        ]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {
+            "type": "http",
+            "method": "POST",
+            "path": "/webhooks/notes",
+            "raw_path": b"/webhooks/notes",
+            "query_string": b"",
+            "headers": [(b"x-webhook-token", WEBHOOK_TOKEN.encode())],
+        }
+        await gatekeeper(scope, receive, send)
+
+        assert sent[0]["status"] == 207
+        results = json.loads(sent[1]["body"])
+        assert [r["id"] for r in results[:-1]] == [1, 2, 3, 4, 5]
+        assert results[-1]["index"] == 5
+        assert results[-1]["errors"][0]["type"] == "body_too_large"
+
+    # a chunk that fails to insert is rejected; earlier chunks keep their ids
+    def test_failed_chunk_returns_stored_results(
+        self, client: TestClient, mock_note_repo, monkeypatch
+    ):
+        monkeypatch.setattr(webhook_controller, "BULK_CHUNK_SIZE", 2)
+        create_many = mock_note_repo.create_many.side_effect
+        calls = []
+
+        async def flaky(notes):
+            calls.append(len(notes))
+            if len(calls) > 1:
+                raise RuntimeError("db down")
+            return await create_many(notes)
+
+        mock_note_repo.create_many.side_effect = flaky
+        items = [{"source": "ci", "message": f"event {i}"} for i in range(5)]
+
+        response = self.post(client, json.dumps(items))
+
+        assert response.status_code == 207
+        results = response.json()
+        assert [r["id"] for r in results] == [1, 2, None, None, None]
+        assert [r["errors"][0]["type"] for r in results[2:]] == ["insert_failed"] * 3
+        assert "not read" in results[4]["errors"][0]["msg"]
+
+    # in queue mode the items are queued and get ingestion ids
+    def test_queue_mode(self, client: TestClient, mock_note_repo):
+        queue = WebhookIngestQueue(AsyncMock(), maxsize=1)
+        app.dependency_overrides[get_webhook_queue] = lambda: queue
+        items = [{"source": "ci", "message": f"event {i}"} for i in range(2)]
+
+        results = self.post(client, json.dumps(items)).json()
+
+        assert results[0]["ingestion_id"]
+        assert results[1]["errors"][0]["type"] == "queue_full"
+        mock_note_repo.create_many.assert_not_awaited()
+
+
+class TestWebhookRateLimit:
+
+    @pytest.fixture()
+    def limiter(self, client):
+        # a clock that never advances: no refill during the test
+        limiter = WebhookRateLimiter(RateLimit(rate=0.5, burst=1), clock=lambda: 0.0)
+        app.dependency_overrides[get_webhook_rate_limiter] = lambda: limiter
+        return limiter
+
+    def post(self, client: TestClient, source: str):
+        return client.post(
+            "/webhooks/note",
+            json={"source": source, "message": "Build passed"},
+            headers={"X-Webhook-Token": WEBHOOK_TOKEN},
+        )
+
+    # a source over its limit → 429 with Retry-After, nothing inserted
+    def test_source_over_limit_returns_429(
+        self, client: TestClient, limiter, mock_note_repo
+    ):
+        assert self.post(client, "ci").status_code == 201
+        response = self.post(client, "ci")
+
+        assert response.status_code == 429
+        assert response.headers["Retry-After"] == "2"
+        assert mock_note_repo.create.await_count == 1
+
+    # other sources keep their own allowance
+    def test_other_sources_unaffected(self, client: TestClient, limiter):
+        self.post(client, "ci")
+
+        assert self.post(client, "n8n").status_code == 201
+
+    # bucket levels are exposed for monitoring
+    def test_metrics_show_bucket_levels(self, client: TestClient, limiter):
+        self.post(client, "ci")
+        self.post(client, "ci")
+
+        stats = client.get("/metrics/webhook-rate-limits").json()
+
+        assert stats["enabled"] is True
+        assert stats["allowed"] == 1
+        assert stats["limited"] == 1
+        assert stats["buckets"]["source:ci"] == {
+            "tokens": 0,
+            "rate": 0.5,
+            "burst": 1,
+        }
+
+    # signed webhooks share one credential bucket, whatever token they send
+    def test_signed_requests_ignore_unverified_token(self, client: TestClient):
+        limiter = WebhookRateLimiter(None, RateLimit(rate=0.001, burst=1))
+        app.dependency_overrides[get_webhook_rate_limiter] = lambda: limiter
+        body = json.dumps({"source": "ci", "message": "Build passed"}).encode()
+        signature = hmac.new(b"signing-secret", body, hashlib.sha256).hexdigest()
+
+        with patch.dict("os.environ", {"WEBHOOK_SIGNING_SECRET": "signing-secret"}):
+            statuses = [
+                client.post(
+                    "/webhooks/note",
+                    content=body,
+                    headers={
+                        "X-Webhook-Signature": f"sha256={signature}",
+                        "X-Webhook-Token": f"bogus{i}",
+                    },
+                ).status_code
+                for i in range(3)
+            ]
+
+        assert statuses == [201, 429, 429]
+        assert list(limiter.stats()["buckets"]) == ["credential:signature"]
+
+    # without a configured limit the metrics say so
+    def test_metrics_when_disabled(self, client: TestClient):
+        response = client.get("/metrics/webhook-rate-limits")
+
+        assert response.json() == {"enabled": False}
+
+
+class TestWebhookDedupe:
+
+    @pytest.fixture()
+    def deduper(self, client):
+        deduper = WebhookDeduper(window=60)
+        app.dependency_overrides[get_webhook_deduper] = lambda: deduper
+        return deduper
+
+    def post(self, client: TestClient, tags: list[str]):
+        return client.post(
+            "/webhooks/note",
+            json={"source": "alerts", "message": "Disk full", "tags": tags},
+            headers={"X-Webhook-Token": WEBHOOK_TOKEN},
+        )
+
+    # a repeated webhook returns the original note without inserting it
+    def test_repeat_returns_original(
+        self, client: TestClient, deduper, mock_note_repo, webhook_repo
+    ):
+        first = self.post(client, ["disk", "prod"])
+        repeat = self.post(client, ["prod", "disk"])
+
+        assert first.status_code == 201
+        assert repeat.status_code == 200
+        assert repeat.headers["X-Webhook-Duplicate"] == "true"
+        assert repeat.json() == first.json()
+        assert mock_note_repo.create.await_count == 1
+        assert len(webhook_repo.logs) == 1
+
+    # the log reports how many webhooks were suppressed, per source
+    def test_log_reports_suppressed(self, client: TestClient, deduper):
+        for _ in range(3):
+            self.post(client, ["disk"])
+
+        assert client.get("/webhooks/log").headers["X-Webhooks-Suppressed"] == "2"
+        response = client.get("/webhooks/log", params={"source": "ci"})
+        assert response.headers["X-Webhooks-Suppressed"] == "0"
+
+    # in queue mode a repeat gets the original ingestion id
+    def test_repeat_in_queue_mode(self, client: TestClient, deduper):
+        queue = WebhookIngestQueue(AsyncMock())
+        app.dependency_overrides[get_webhook_queue] = lambda: queue
+
+        first = self.post(client, [])
+        repeat = self.post(client, [])
+
+        assert first.status_code == repeat.status_code == 202
+        assert repeat.json() == first.json()
+        assert queue.stats()["depth"] == 1
+
+    # without a dedupe window every webhook is created
+    def test_disabled(self, client: TestClient, mock_note_repo):
+        self.post(client, [])
+        response = self.post(client, [])
+
+        assert response.status_code == 201
+        assert "X-Webhook-Duplicate" not in response.headers
+        assert "X-Webhooks-Suppressed" not in client.get("/webhooks/log").headers
+        assert mock_note_repo.create.await_count == 2
+
+
+class TestWebhookRoundTrips:
+
+    # the webhook insert is a single INSERT ... RETURNING, no refresh
+    def test_webhook_create_is_one_statement(self, webhook_repo, recording_session):
+        app.dependency_overrides[get_session] = lambda: recording_session
+        app.dependency_overrides[get_note_cache] = lambda: None
+        app.dependency_overrides[get_webhook_repo] = lambda: webhook_repo
+        app.dependency_overrides[get_webhook_queue] = lambda: None
+        app.dependency_overrides[get_webhook_rate_limiter] = lambda: None
+        app.dependency_overrides[get_webhook_deduper] = lambda: None
+        with patch.dict("os.environ", {"WEBHOOK_TOKEN": WEBHOOK_TOKEN}):
+            response = TestClient(app).post(
+                "/webhooks/note",
+                json={"source": "ci", "message": "Build passed"},
+                headers={"X-Webhook-Token": WEBHOOK_TOKEN},
+            )
+        app.dependency_overrides.clear()
+
+        assert response.status_code == 201
+        assert recording_session.round_trips() == 1
+        recording_session.refresh.assert_not_awaited()